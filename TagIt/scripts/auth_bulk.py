@@ -0,0 +1,199 @@
+"""
+Bulk Firebase Authentication Helpers
+
+Shared helpers used by `set_dummy.py`, `delete_dummy.py` and `nuke_db.py` to create and delete
+Authentication users in bulk instead of one Admin API call per user.
+
+- `import_users` creates users with `auth.import_users`, 1000 users per call. Passwords are
+  imported pre-hashed with HMAC-SHA256 (`hash_password` / `password_import_hash`).
+- `delete_users` deletes users with `auth.delete_users`, 1000 UIDs per call.
+
+Both report every user that could not be created or deleted as a `UserError`, and retry calls that
+are rejected because of quota limits with exponential backoff.
+
+To run against the Auth emulator, set `FIREBASE_AUTH_EMULATOR_HOST` (e.g. `localhost:9099`) before
+running the scripts; the Admin SDK then sends every call to the emulator.
+
+Dependencies:
+- Firebase Admin SDK (`pip install firebase-admin`).
+"""
+
+import hashlib
+import hmac
+import random
+import time
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from firebase_admin import auth, exceptions
+
+from firestore_batch import chunked
+
+# Maximum number of users per `import_users` / `delete_users` call
+MAX_USERS_PER_CALL = 1000
+
+# Key of the HMAC-SHA256 used to hash the imported passwords
+PASSWORD_HASH_KEY = b"tagit-dummy-users"
+
+# Retries of a call rejected because of quota limits, and the first backoff delay in seconds
+MAX_RETRIES = 6
+INITIAL_BACKOFF = 1.0
+
+# `delete_users` is rate limited by the server, so consecutive calls are spaced out
+DELETE_INTERVAL = 1.0
+
+class UserError:
+    """
+    A single user that could not be imported or deleted.
+    """
+
+    def __init__(self, uid: str, message: str):
+        self.uid = uid
+        self.message = message
+
+    def __repr__(self) -> str:
+        return f"UserError({self.uid}: {self.message})"
+
+def hash_password(password: str, key: bytes = PASSWORD_HASH_KEY) -> bytes:
+    """
+    Hash a password the way `password_import_hash` tells Firebase to verify it.
+
+    Args:
+        password (str): The plain text password.
+        key (bytes): The HMAC key.
+
+    Returns:
+        bytes: The password hash.
+    """
+    return hmac.new(key, password.encode("utf-8"), hashlib.sha256).digest()
+
+def password_import_hash(key: bytes = PASSWORD_HASH_KEY) -> auth.UserImportHash:
+    """
+    Get the hash algorithm to pass to `auth.import_users` for passwords hashed with `hash_password`.
+
+    Args:
+        key (bytes): The HMAC key.
+
+    Returns:
+        auth.UserImportHash: The HMAC-SHA256 import hash.
+    """
+    return auth.UserImportHash.hmac_sha256(key=key)
+
+def with_backoff(call: Callable[[], Any], description: str) -> Any:
+    """
+    Run an Admin API call, retrying it with exponential backoff while it hits quota limits.
+
+    Args:
+        call (Callable[[], Any]): The call to run.
+        description (str): What the call does, used in log messages.
+
+    Returns:
+        Any: The result of the call.
+    """
+    delay = INITIAL_BACKOFF
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return call()
+        except exceptions.ResourceExhaustedError as e:
+            if attempt == MAX_RETRIES:
+                raise
+            # Jitter keeps parallel runs from retrying in lockstep
+            wait = delay * (1 + random.random())
+            print(f"Quota exceeded while {description} ({e}). Retrying in {wait:.1f}s...")
+            time.sleep(wait)
+            delay *= 2
+
+def import_users(users: Iterable[auth.ImportUserRecord], hash_alg: Optional[auth.UserImportHash] = None,
+                 chunk_size: int = MAX_USERS_PER_CALL,
+                 on_imported: Optional[Callable[[str], None]] = None) -> tuple[int, list[UserError]]:
+    """
+    Create or overwrite users in bulk.
+
+    Args:
+        users (Iterable[auth.ImportUserRecord]): The users to import.
+        hash_alg (Optional[auth.UserImportHash]): The algorithm the password hashes were made with,
+            required if any user has a `password_hash`.
+        chunk_size (int): The number of users per call (at most 1000).
+        on_imported (Optional[Callable[[str], None]]): Called with the UID of every imported user.
+
+    Returns:
+        tuple[int, list[UserError]]: The number of imported users and the users that failed.
+    """
+    imported = 0
+    errors: list[UserError] = []
+    for chunk in chunked(users, min(chunk_size, MAX_USERS_PER_CALL)):
+        try:
+            result = with_backoff(lambda: auth.import_users(chunk, hash_alg=hash_alg),
+                                  f"importing {len(chunk)} users")
+        except Exception as e:
+            print(f"Error importing {len(chunk)} users: {e}")
+            errors.extend(UserError(user.uid, str(e)) for user in chunk)
+            continue
+        imported += result.success_count
+        failed = set()
+        for error in result.errors:
+            uid = chunk[error.index].uid
+            print(f"Error importing user {uid}: {error.reason}")
+            errors.append(UserError(uid, error.reason))
+            failed.add(error.index)
+        if on_imported:
+            for position, user in enumerate(chunk):
+                if position not in failed:
+                    on_imported(user.uid)
+        print(f"Imported {result.success_count} of {len(chunk)} users.")
+    return imported, errors
+
+def delete_users(uids: Iterable[str], chunk_size: int = MAX_USERS_PER_CALL, interval: float = DELETE_INTERVAL,
+                 on_deleted: Optional[Callable[[str], None]] = None) -> tuple[int, list[UserError]]:
+    """
+    Delete users in bulk.
+
+    Args:
+        uids (Iterable[str]): The UIDs of the users to delete.
+        chunk_size (int): The number of UIDs per call (at most 1000).
+        interval (float): The minimum number of seconds between two calls.
+        on_deleted (Optional[Callable[[str], None]]): Called with the UID of every deleted user.
+
+    Returns:
+        tuple[int, list[UserError]]: The number of deleted users and the users that failed.
+    """
+    deleted = 0
+    errors: list[UserError] = []
+    last_call = 0.0
+    for chunk in chunked(uids, min(chunk_size, MAX_USERS_PER_CALL)):
+        wait = last_call + interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        last_call = time.monotonic()
+        try:
+            result = with_backoff(lambda: auth.delete_users(chunk), f"deleting {len(chunk)} users")
+        except Exception as e:
+            print(f"Error deleting {len(chunk)} users: {e}")
+            errors.extend(UserError(uid, str(e)) for uid in chunk)
+            continue
+        deleted += result.success_count
+        failed = set()
+        for error in result.errors:
+            uid = chunk[error.index]
+            print(f"Error deleting user {uid}: {error.reason}")
+            errors.append(UserError(uid, error.reason))
+            failed.add(error.index)
+        if on_deleted:
+            for position, uid in enumerate(chunk):
+                if position not in failed:
+                    on_deleted(uid)
+        print(f"Deleted {result.success_count} of {len(chunk)} users.")
+    return deleted, errors
+
+def list_user_ids(predicate: Optional[Callable[[auth.ExportedUserRecord], bool]] = None) -> Iterator[str]:
+    """
+    List the UIDs of all users, optionally only those matching a predicate.
+
+    Args:
+        predicate (Optional[Callable[[auth.ExportedUserRecord], bool]]): Selects the users to list.
+
+    Returns:
+        Iterator[str]: The UIDs, fetched page by page.
+    """
+    for user in auth.list_users().iterate_all():
+        if predicate is None or predicate(user):
+            yield user.uid
@@ -9,6 +9,9 @@ This script cleans up dummy data from Firebase services. Specifically, it:
 The dummy data being cleaned up is generated using the `set_dummy.py` script, which populates Firebase with data from `dummy_data.json`. 
 All dummy documents are identified by the "isDummy" field set to `True`, and dummy users are identified by a display name ending with "_dummy".
 
+If a run is interrupted, the images it already deleted are recorded in a run journal and skipped by
+the next run; documents and users are looked up again, so only the remaining ones are deleted.
+
 WARNING: This script will permanently delete data marked as dummy. Use it with caution.
 
 Dependencies:
@@ -18,13 +21,17 @@ Dependencies:
 """
 
 import firebase_admin
-from firebase_admin import credentials, firestore, storage, auth
+from firebase_admin import credentials, firestore, storage
 import os
 from typing import List, Optional
+from auth_bulk import delete_users, list_user_ids
+from image_cache import ImageCache
+from run_journal import RunJournal, journal_path
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 SERVICE_ACCOUNT_PATH = os.path.join(SCRIPT_DIR, "tagit-39035-firebase-adminsdk-hugo8-9c33455468.json")
 BUCKET_NAME = 'tagit-39035.appspot.com'
+IMAGE_CACHE_DIR = os.path.join(SCRIPT_DIR, ".image_cache")
 
 # Initialize Firebase Admin SDK
 cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
@@ -33,6 +40,12 @@ firebase_admin.initialize_app(cred, {'storageBucket': BUCKET_NAME})
 # Firestore database reference
 db: firestore.Client = firestore.client()
 
+# Uploads recorded by set_dummy.py; deleted blobs must not be reused by the next seeding run
+image_cache = ImageCache(IMAGE_CACHE_DIR)
+
+# Images deleted by an interrupted run
+journal = RunJournal(journal_path("delete_dummy"))
+
 # Enum-like structure for image folders
 class ImageFolder:
     AVATAR = "avatar"
@@ -47,6 +60,8 @@ def delete_image_from_storage(image_url: str) -> None:
     Args:
         image_url (str): The URL of the image to delete.
     """
+    if journal.done("image", image_url):
+        return
     try:
         bucket = storage.bucket()
         # Extract the blob name from the image URL
@@ -60,6 +75,8 @@ def delete_image_from_storage(image_url: str) -> None:
 
         blob = bucket.blob(blob_name)
         blob.delete()
+        journal.record("image", image_url)
+        image_cache.forget_uploads(image_url)
         print(f"Deleted image: {image_url}")
     except Exception as e:
         print(f"Error deleting image {image_url}: {e}")
@@ -102,6 +119,8 @@ def delete_dummy_images() -> None:
 
         print(f"Deleted images for {deleted_count} dummy documents from {collection_name}.\n")
 
+    image_cache.save()
+    journal.flush()
     print("Dummy data image cleanup completed.")
 
 def delete_dummy_data() -> None:
@@ -141,18 +160,13 @@ def delete_dummy_data() -> None:
 
 def delete_dummy_users() -> None:
     """
-    Deletes dummy users from Firebase Authentication.
+    Deletes dummy users from Firebase Authentication, in bulk.
     Dummy users are identified by a display name ending with "_dummy".
     """
     try:
-        users = auth.list_users().iterate_all()
-        for user in users:
-            if user.display_name and user.display_name.endswith("_dummy"):
-                try:
-                    auth.delete_user(user.uid)
-                    print(f"Deleted user: {user.uid}")
-                except Exception as e:
-                    print(f"Error deleting user {user.uid}: {e}")
+        uids = list_user_ids(lambda user: bool(user.display_name and user.display_name.endswith("_dummy")))
+        deleted, errors = delete_users(uids)
+        print(f"Deleted {deleted} dummy users, {len(errors)} failed.")
     except Exception as e:
         print(f"Error fetching users: {e}")
 
@@ -161,4 +175,5 @@ if __name__ == "__main__":
     delete_dummy_images()
     delete_dummy_data()
     delete_dummy_users()
+    journal.clear()
     print("Dummy data cleanup process completed.")
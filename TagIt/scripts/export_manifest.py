@@ -0,0 +1,159 @@
+"""
+Firestore Export Manifests
+
+Offline helpers for the multi-file exports written by `firestore_export.py --workers N` and
+`firestore_export.py --delta DIR`. They need no Firebase credentials.
+
+A parallel export is a directory of NDJSON partition files (one line per document, see
+`firestore_export.py`) and a `manifest.json` listing every partition file in order, with its
+collection, document count, size and export time. `combine` concatenates the partition files in
+manifest order into a single NDJSON file.
+
+A delta export directory holds `delta-NNNN.ndjson` files listed under `deltas` in its manifest; the
+first one is a full base export, and later ones contain changed documents and tombstone lines
+(`{"path": ..., "deleted": true}`). `merge` applies deltas to a base, in order, and writes the full
+snapshot. The base can also be any NDJSON export, e.g. a combined parallel export.
+
+Usage:
+
+    python export_manifest.py combine <export_dir> [--output firestore_export.ndjson]
+    python export_manifest.py merge <delta_dir> [--output firestore_snapshot.ndjson]
+    python export_manifest.py merge <base.ndjson> <delta.ndjson>... [--output firestore_snapshot.ndjson]
+"""
+
+import argparse
+import json
+import os
+import shutil
+from typing import Any, Dict, Iterator, List
+
+MANIFEST_FILE = "manifest.json"
+
+def write_manifest(export_dir: str, manifest: Dict[str, Any]) -> str:
+    """
+    Write the manifest of an export directory atomically.
+
+    Args:
+        export_dir (str): The export directory.
+        manifest (Dict[str, Any]): The manifest, with a `partitions` list.
+
+    Returns:
+        str: The path of the manifest file.
+    """
+    path = os.path.join(export_dir, MANIFEST_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_path, path)
+    return path
+
+def read_manifest(export_dir: str) -> Dict[str, Any]:
+    """
+    Read the manifest of an export directory.
+
+    Args:
+        export_dir (str): The export directory.
+
+    Returns:
+        Dict[str, Any]: The manifest.
+    """
+    with open(os.path.join(export_dir, MANIFEST_FILE), "r") as f:
+        return json.load(f)
+
+def iter_partition_files(export_dir: str) -> Iterator[str]:
+    """
+    List the partition files of an export in manifest order.
+
+    Args:
+        export_dir (str): The export directory.
+
+    Returns:
+        Iterator[str]: The paths of the partition files.
+    """
+    for partition in read_manifest(export_dir)["partitions"]:
+        yield os.path.join(export_dir, partition["file"])
+
+def combine_export(export_dir: str, output_file: str) -> int:
+    """
+    Concatenate the partition files of an export into one NDJSON file.
+
+    Args:
+        export_dir (str): The export directory.
+        output_file (str): The combined NDJSON file.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    written = 0
+    with open(output_file, "wb") as output:
+        for path in iter_partition_files(export_dir):
+            with open(path, "rb") as partition:
+                shutil.copyfileobj(partition, output)
+            written += os.path.getsize(path)
+    return written
+
+def iter_delta_files(export_dir: str) -> Iterator[str]:
+    """
+    List the files of a delta export in the order they were exported, base first.
+
+    Args:
+        export_dir (str): The delta export directory.
+
+    Returns:
+        Iterator[str]: The paths of the delta files.
+    """
+    for delta in read_manifest(export_dir)["deltas"]:
+        yield os.path.join(export_dir, delta["file"])
+
+def merge_exports(files: List[str], output_file: str) -> tuple[int, int]:
+    """
+    Apply NDJSON deltas to a base export and write the resulting snapshot.
+
+    Lines are kept as they are, keyed by document path; a later line for the same path replaces the
+    earlier one and a tombstone removes it.
+
+    Args:
+        files (List[str]): The base export followed by its deltas, in export order.
+        output_file (str): The snapshot NDJSON file.
+
+    Returns:
+        tuple[int, int]: The number of documents in the snapshot and the number of tombstones applied.
+    """
+    documents: Dict[str, str] = {}
+    deleted = 0
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get("deleted"):
+                    deleted += documents.pop(record["path"], None) is not None
+                    continue
+                documents[record["path"]] = line if line.endswith("\n") else f"{line}\n"
+    with open(output_file, "w", encoding="utf-8") as output:
+        for path in sorted(documents):
+            output.write(documents[path])
+    return len(documents), deleted
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Work with multi-file Firestore exports.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    combine_parser = subparsers.add_parser("combine", help="Concatenate the partition files of an export.")
+    combine_parser.add_argument("export_dir", help="The export directory with a manifest.json.")
+    combine_parser.add_argument("--output", default="firestore_export.ndjson", help="The combined NDJSON file.")
+    merge_parser = subparsers.add_parser("merge", help="Apply delta exports to a base export.")
+    merge_parser.add_argument("inputs", nargs="+", help="A delta export directory, or a base NDJSON file followed by delta files.")
+    merge_parser.add_argument("--output", default="firestore_snapshot.ndjson", help="The snapshot NDJSON file.")
+    args = parser.parse_args()
+
+    if args.command == "combine":
+        written = combine_export(args.export_dir, args.output)
+        print(f"Combined {args.export_dir} into {args.output} ({written} bytes).")
+    elif args.command == "merge":
+        if len(args.inputs) == 1 and os.path.isdir(args.inputs[0]):
+            files = list(iter_delta_files(args.inputs[0]))
+        else:
+            files = args.inputs
+        documents, deleted = merge_exports(files, args.output)
+        print(f"Merged {len(files)} exports into {args.output} ({documents} documents, {deleted} deletions applied).")
@@ -0,0 +1,362 @@
+"""
+Firestore Batch Helpers
+
+Shared helpers used by the seeding and maintenance scripts to talk to Firestore in bulk instead of
+one blocking round trip per document.
+
+- `BatchWriter` groups set/update/delete operations into Firestore write batches and commits them
+  from a small thread pool with a bounded number of batches in flight. If a batch is rejected, its
+  writes are retried one by one so a single bad document is reported on its own instead of failing
+  every other write in the batch.
+- `DocumentIndex` answers "does this document exist?" from a run-wide cache that is filled with
+  chunked multi-document reads (`get_all`) instead of one `get()` per document, or preloaded with
+  one projection query per collection for collections every record refers to.
+
+Dependencies:
+- Firebase Admin SDK (`pip install firebase-admin`).
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from firebase_admin import firestore
+
+# Firestore rejects write batches with more than 500 operations
+MAX_BATCH_SIZE = 500
+
+# Number of document references sent in one multi-document read
+READ_CHUNK_SIZE = 300
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    """
+    Split any iterable into lists of at most `size` items without materializing it.
+
+    Args:
+        items (Iterable[Any]): The items to split.
+        size (int): The maximum chunk size.
+
+    Returns:
+        Iterator[list[Any]]: The chunks, in order.
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class WriteError:
+    """
+    A single document write that could not be committed.
+    """
+
+    def __init__(self, collection: str, doc_id: str, message: str):
+        self.collection = collection
+        self.doc_id = doc_id
+        self.message = message
+
+    def __repr__(self) -> str:
+        return f"WriteError({self.collection}/{self.doc_id}: {self.message})"
+
+class BatchWriter:
+    """
+    Buffer Firestore writes and commit them as write batches with bounded concurrency.
+
+    Writes are queued with `set`, `update` and `delete`. Every `batch_size` queued writes are
+    committed in the background; at most `max_in_flight` batches are committed at the same time,
+    and queueing blocks while that limit is reached. Call `flush` (or leave the `with` block) to wait
+    until everything queued so far has been committed.
+
+    Args:
+        db (firestore.Client): The Firestore client.
+        batch_size (int): The number of writes per batch (at most 500).
+        max_in_flight (int): The maximum number of batches being committed at once.
+        on_committed (Callable[[str, str], None]): Optional callback called with the collection
+            name and document ID of every write that was committed successfully.
+    """
+
+    def __init__(self, db: firestore.Client, batch_size: int = MAX_BATCH_SIZE, max_in_flight: int = 4,
+                 on_committed: Optional[Callable[[str, str], None]] = None):
+        if not 1 <= batch_size <= MAX_BATCH_SIZE:
+            raise ValueError(f"batch_size must be between 1 and {MAX_BATCH_SIZE}, got {batch_size}")
+        if max_in_flight < 1:
+            raise ValueError(f"max_in_flight must be at least 1, got {max_in_flight}")
+        self.db = db
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.on_committed = on_committed
+        self.written = 0
+        self.errors: list[WriteError] = []
+        self._errors_reported = 0
+        self._pending: list[tuple[str, str, str, Any]] = []
+        self._futures: list[Future] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="batch-writer")
+
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def set(self, collection: str, doc_id: str, data: dict, merge: bool = False) -> None:
+        """
+        Queue a `set` of a document.
+
+        Args:
+            collection (str): The name of the collection.
+            doc_id (str): The ID of the document.
+            data (dict): The document data.
+            merge (bool): Whether to merge into an existing document instead of replacing it.
+        """
+        self._add(("set_merge" if merge else "set", collection, doc_id, data))
+
+    def update(self, collection: str, doc_id: str, data: dict) -> None:
+        """
+        Queue an `update` of an existing document.
+
+        Args:
+            collection (str): The name of the collection.
+            doc_id (str): The ID of the document.
+            data (dict): The fields to update.
+        """
+        self._add(("update", collection, doc_id, data))
+
+    def delete(self, collection: str, doc_id: str) -> None:
+        """
+        Queue the deletion of a document.
+
+        Args:
+            collection (str): The name of the collection.
+            doc_id (str): The ID of the document.
+        """
+        self._add(("delete", collection, doc_id, None))
+
+    def flush(self) -> list[WriteError]:
+        """
+        Commit every queued write and wait until all batches have finished.
+
+        Returns:
+            list[WriteError]: The write errors reported by the batches committed since the last flush.
+        """
+        with self._lock:
+            writes, self._pending = self._pending, []
+        if writes:
+            self._submit(writes)
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+        with self._lock:
+            new_errors = self.errors[self._errors_reported:]
+            self._errors_reported = len(self.errors)
+            return new_errors
+
+    def close(self) -> None:
+        """
+        Flush the remaining writes and shut down the commit threads.
+        """
+        self.flush()
+        self._executor.shutdown(wait=True)
+        print(f"Batch writer finished: {self.written} writes committed, {len(self.errors)} failed.")
+
+    def _add(self, write: tuple[str, str, str, Any]) -> None:
+        with self._lock:
+            self._pending.append(write)
+            if len(self._pending) < self.batch_size:
+                return
+            writes, self._pending = self._pending, []
+        self._submit(writes)
+
+    def _submit(self, writes: list[tuple[str, str, str, Any]]) -> None:
+        # Blocks the producer while max_in_flight batches are already being committed
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._commit, writes)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        with self._lock:
+            # Drop finished batches so long runs don't keep every future alive until the next flush
+            self._futures = [f for f in self._futures if not f.done()]
+            self._futures.append(future)
+
+    def _apply(self, batch: Any, write: tuple[str, str, str, Any]) -> None:
+        op, collection, doc_id, data = write
+        doc_ref = self.db.collection(collection).document(doc_id)
+        if op == "set":
+            batch.set(doc_ref, data)
+        elif op == "set_merge":
+            batch.set(doc_ref, data, merge=True)
+        elif op == "update":
+            batch.update(doc_ref, data)
+        else:
+            batch.delete(doc_ref)
+
+    def _commit(self, writes: list[tuple[str, str, str, Any]]) -> None:
+        batch = self.db.batch()
+        try:
+            for write in writes:
+                self._apply(batch, write)
+            batch.commit()
+        except Exception as e:
+            print(f"Batch of {len(writes)} writes failed ({e}). Retrying writes individually...")
+            for write in writes:
+                self._commit_single(write)
+            return
+        self._record_committed(writes)
+
+    def _commit_single(self, write: tuple[str, str, str, Any]) -> None:
+        _, collection, doc_id, _ = write
+        batch = self.db.batch()
+        try:
+            self._apply(batch, write)
+            batch.commit()
+        except Exception as e:
+            print(f"Error writing {collection}/{doc_id}: {e}")
+            with self._lock:
+                self.errors.append(WriteError(collection, doc_id, str(e)))
+            return
+        self._record_committed([write])
+
+    def _record_committed(self, writes: list[tuple[str, str, str, Any]]) -> None:
+        with self._lock:
+            self.written += len(writes)
+        if self.on_committed:
+            for _, collection, doc_id, _ in writes:
+                self.on_committed(collection, doc_id)
+
+class DocumentIndex:
+    """
+    Run-wide cache of which documents exist, filled with chunked multi-document reads.
+
+    Every document ID is read at most once per run: `prefetch` looks up all IDs that have not been
+    checked yet with `get_all` calls of `chunk_size` references each (requesting no fields), and
+    `exists` answers from the cache. Documents written during the run can be recorded with `add`,
+    which matches the `on_committed` callback of `BatchWriter`.
+
+    Small, heavily referenced collections can be preloaded with `load`, which reads every document
+    ID (and optionally a few fields) with one query. Lookups in a loaded collection never read.
+
+    `reads` counts the documents read, which is what Firestore bills, not the requests made.
+
+    Args:
+        db (firestore.Client): The Firestore client.
+        chunk_size (int): The number of document references per `get_all` call.
+    """
+
+    def __init__(self, db: firestore.Client, chunk_size: int = READ_CHUNK_SIZE):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.reads = 0
+        self._existing: dict[str, set[str]] = {}
+        self._checked: dict[str, set[str]] = {}
+        self._loaded: set[str] = set()
+        self._fields: dict[str, dict[str, dict]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, collection: str, fields: Iterable[str] = ()) -> int:
+        """
+        Read every document ID of a collection with one projection query.
+
+        Args:
+            collection (str): The name of the collection.
+            fields (Iterable[str]): The fields to keep for every document, available through `fields`.
+
+        Returns:
+            int: The number of documents in the collection.
+        """
+        fields = list(fields)
+        found: set[str] = set()
+        values: dict[str, dict] = {}
+        # An empty projection returns whole documents, so project the name when no field is kept
+        for snapshot in self.db.collection(collection).select(fields or ["__name__"]).stream():
+            found.add(snapshot.id)
+            if fields:
+                values[snapshot.id] = snapshot.to_dict()
+        with self._lock:
+            self.reads += len(found)
+            self._existing.setdefault(collection, set()).update(found)
+            self._checked.setdefault(collection, set()).update(found)
+            self._fields.setdefault(collection, {}).update(values)
+            self._loaded.add(collection)
+        print(f"Loaded {len(found)} {collection} document IDs in one query.")
+        return len(found)
+
+    def fields(self, collection: str) -> dict[str, dict]:
+        """
+        Get the fields kept by `load` for every document of a collection.
+
+        Args:
+            collection (str): The name of the collection.
+
+        Returns:
+            dict[str, dict]: The kept fields by document ID.
+        """
+        with self._lock:
+            return dict(self._fields.get(collection, {}))
+
+    def prefetch(self, collection: str, doc_ids: Iterable[str]) -> None:
+        """
+        Look up every not yet checked document ID of a collection.
+
+        Args:
+            collection (str): The name of the collection.
+            doc_ids (Iterable[str]): The candidate document IDs.
+        """
+        with self._lock:
+            if collection in self._loaded:
+                return
+            checked = self._checked.setdefault(collection, set())
+            existing = self._existing.setdefault(collection, set())
+            missing = list(dict.fromkeys(doc_id for doc_id in doc_ids if doc_id not in checked))
+        if not missing:
+            return
+
+        collection_ref = self.db.collection(collection)
+        for start in range(0, len(missing), self.chunk_size):
+            chunk = missing[start:start + self.chunk_size]
+            refs = [collection_ref.document(doc_id) for doc_id in chunk]
+            # An empty field mask returns only document metadata, which is all we need
+            found = {snapshot.id for snapshot in self.db.get_all(refs, field_paths=[]) if snapshot.exists}
+            with self._lock:
+                # Missing documents are billed like existing ones
+                self.reads += len(chunk)
+                existing.update(found)
+                checked.update(chunk)
+        print(f"Checked {len(missing)} {collection} documents in {-(-len(missing) // self.chunk_size)} requests.")
+
+    def exists(self, collection: str, doc_id: str) -> bool:
+        """
+        Check if a document exists, reading it only if it was not prefetched.
+
+        Args:
+            collection (str): The name of the collection.
+            doc_id (str): The ID of the document.
+
+        Returns:
+            bool: True if the document exists, False otherwise.
+        """
+        with self._lock:
+            checked = collection in self._loaded or doc_id in self._checked.get(collection, ())
+        if not checked:
+            self.prefetch(collection, [doc_id])
+        with self._lock:
+            return doc_id in self._existing.get(collection, ())
+
+    def add(self, collection: str, doc_id: str) -> None:
+        """
+        Record that a document exists, e.g. because it was just written.
+
+        Args:
+            collection (str): The name of the collection.
+            doc_id (str): The ID of the document.
+        """
+        with self._lock:
+            self._existing.setdefault(collection, set()).add(doc_id)
+            self._checked.setdefault(collection, set()).add(doc_id)
@@ -7,6 +7,44 @@ into JSON-friendly formats.
 
 The exported data is written to `firestore_export.json` in the current directory.
 
+With `--format ndjson`, documents are instead streamed to `firestore_export.ndjson` as they are
+read, one JSON line per document (`path`, `fields`, `update_time`), so memory stays constant
+whatever the database size and a crash keeps everything exported so far:
+
+    python firestore_export.py --format ndjson [--output export.ndjson] [--page-size 500]
+
+NDJSON exports read every collection in pages (`order_by(__name__)` + `start_after`) instead of
+one long-lived stream, and checkpoint the last exported document and the output size after each
+page in a run journal (`scripts/.journal/`). Rerunning an interrupted export with the same output
+truncates the output to the last checkpoint and continues after it, so no document is written
+twice; `--restart` starts over.
+
+With `--delta DIR`, every run writes only the documents created or changed since the previous run
+(by `update_time`) and tombstones for deleted documents to a new `DIR/delta-NNNN.ndjson`; the first
+run exports everything. `python export_manifest.py merge DIR` combines the base and its deltas into
+a full snapshot offline:
+
+    python firestore_export.py --delta firestore_deltas/
+
+With `--workers N`, root collections are exported concurrently by a pool of N threads, and
+collections with more than `PARTITION_THRESHOLD` documents are split into document-name ranges
+with partition queries. Every range is written to its own NDJSON file in the output directory, and
+`manifest.json` lists the files in order (see `export_manifest.py` to combine them):
+
+    python firestore_export.py --workers 8 [--output firestore_export/]
+    python firestore_export.py --workers 8 --benchmark
+
+`--benchmark` runs the parallel export at 1 and N workers into temporary directories and compares
+their throughput, e.g. against the emulator (`FIRESTORE_EMULATOR_HOST=localhost:8080`).
+
+By default the subcollections of every exported document are listed, which finds all of them but
+costs one list call per document. With `--subcollections group`, they are found once instead: the
+IDs in `KNOWN_SUBCOLLECTIONS`, plus whatever the first `DISCOVERY_SAMPLE` documents of every
+collection have. Each subcollection ID is then read with a single collection group query, and its
+documents are attached to their parents by path. This is lossy: subcollections that only appear
+beyond the sample are not exported unless they are added to `KNOWN_SUBCOLLECTIONS`. Delta exports
+take the same option.
+
 WARNING: This script fetches all Firestore data, which could be time-consuming for large databases.
 
 Dependencies:
@@ -17,9 +55,21 @@ Dependencies:
 
 import firebase_admin
 from firebase_admin import credentials, firestore
+import argparse
+import base64
+import hashlib
 import json
-from datetime import datetime
-from typing import Any, Dict
+import math
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from export_manifest import MANIFEST_FILE, read_manifest, write_manifest
+from firestore_batch import READ_CHUNK_SIZE, chunked
+from run_journal import RunJournal, journal_path
 
 # Path to your Firebase service account JSON file
 SERVICE_ACCOUNT_PATH = (
@@ -33,32 +83,67 @@ firebase_admin.initialize_app(cred)
 # Firestore database client
 db: firestore.Client = firestore.client()
 
-def export_firestore_data() -> Dict[str, Any]:
+# Documents per page of an NDJSON export; every page is one short query and one checkpoint
+PAGE_SIZE = 500
+
+# State a delta export keeps for the next one, in the delta export directory
+DELTA_STATE_FILE = "delta_state.json"
+
+# Documents written up to this long before a delta export started are exported again by the next
+# one, so slow commits and clock skew around the high-water mark are not missed
+DELTA_OVERLAP = timedelta(minutes=5)
+
+# Collections with more documents than this are split into ranges for a parallel export
+PARTITION_THRESHOLD = 20000
+
+# Most ranges per worker a collection is split into
+PARTITIONS_PER_WORKER = 4
+
+# Subcollection IDs used by the app (barcodes/{barcode}/reviews), exported even if the sample misses them
+KNOWN_SUBCOLLECTIONS = ("reviews",)
+
+# Documents per collection whose subcollections are listed to discover subcollection IDs
+DISCOVERY_SAMPLE = 20
+
+def export_firestore_data(subcollections: str = "per-document") -> Dict[str, Any]:
     """
     Recursively exports all collections and documents from the root of Firestore.
 
+    Args:
+        subcollections (str): `per-document` to list the subcollections of every document, or
+            `group` to read subcollections with collection group queries (see
+            `discover_subcollection_ids`).
+
     Returns:
         Dict[str, Any]: A dictionary representing the entire Firestore database,
                         where keys are collection names and values are their documents and subcollections.
     """
     export_data: Dict[str, Any] = {}
-    root_collections = db.collections()  # Retrieve all top-level collections
+    root_collections = list(db.collections())  # Retrieve all top-level collections
+    recursive = subcollections == "per-document"
 
     print("Exporting top-level collections...")
     # Iterate over all root collections and export their data
     for collection in root_collections:
         print(f"Exporting collection: {collection.id}")
-        export_data[collection.id] = export_collection(collection)
+        export_data[collection.id] = export_collection(collection, recursive)
+
+    if not recursive:
+        for collection_id in discover_subcollection_ids(root_collections):
+            print(f"Exporting subcollection group: {collection_id}")
+            for doc in iter_subcollection_documents(collection_id):
+                attach_document(export_data, doc.reference.path, doc.to_dict())
 
     return export_data
 
 
-def export_collection(collection: firestore.CollectionReference) -> Dict[str, Any]:
+def export_collection(collection: firestore.CollectionReference, recursive: bool = True) -> Dict[str, Any]:
     """
     Exports all documents and subcollections in a given Firestore collection.
 
     Args:
         collection (firestore.CollectionReference): The Firestore collection to export.
+        recursive (bool): Whether to list and export the subcollections of every document.
 
     Returns:
         Dict[str, Any]: A dictionary containing document data and nested subcollection data.
@@ -70,7 +155,7 @@ def export_collection(collection: firestore.CollectionReference) -> Dict[str, An
     for doc in documents:
         print(f"Exporting document: {doc.id}")
         document_data = doc.to_dict()  # Convert Firestore document to a dictionary
-        subcollections = doc.reference.collections()  # Retrieve subcollections
+        subcollections = doc.reference.collections() if recursive else []  # Retrieve subcollections
 
         # Recursively export each subcollection
         for subcollection in subcollections:
@@ -83,6 +168,69 @@ def export_collection(collection: firestore.CollectionReference) -> Dict[str, An
     return collection_data
 
 
+def discover_subcollection_ids(root_collections: List[firestore.CollectionReference]) -> List[str]:
+    """
+    Find the IDs of the subcollections in the database by sampling documents at every level.
+
+    Subcollections that only appear beyond the first `DISCOVERY_SAMPLE` documents of a collection
+    are missed unless they are in `KNOWN_SUBCOLLECTIONS`.
+
+    Args:
+        root_collections (List[firestore.CollectionReference]): The root collections.
+
+    Returns:
+        List[str]: The subcollection IDs, known ones included, sorted.
+    """
+    found = set(KNOWN_SUBCOLLECTIONS)
+    queue: List[firestore.Query] = [collection for collection in root_collections]
+    queue.extend(db.collection_group(collection_id) for collection_id in KNOWN_SUBCOLLECTIONS)
+    while queue:
+        query = queue.pop()
+        for doc in query.select(["__name__"]).limit(DISCOVERY_SAMPLE).stream():
+            for subcollection in doc.reference.collections():
+                if subcollection.id not in found:
+                    found.add(subcollection.id)
+                    queue.append(db.collection_group(subcollection.id))
+    print(f"Found subcollections: {', '.join(sorted(found)) or 'none'}")
+    print(f"WARNING: subcollections were discovered from the first {DISCOVERY_SAMPLE} documents of every "
+          f"collection; ones that only appear beyond them are not exported. Add them to KNOWN_SUBCOLLECTIONS, "
+          f"or use --subcollections per-document.")
+    return sorted(found)
+
+
+def iter_subcollection_documents(collection_id: str) -> Iterator[firestore.DocumentSnapshot]:
+    """
+    Stream every document of every subcollection with an ID, at any depth, with one collection group query.
+
+    Args:
+        collection_id (str): The subcollection ID.
+
+    Returns:
+        Iterator[firestore.DocumentSnapshot]: The documents.
+    """
+    for doc in db.collection_group(collection_id).stream():
+        # A root collection with the same ID is exported on its own
+        if doc.reference.parent.parent is not None:
+            yield doc
+
+
+def attach_document(export_data: Dict[str, Any], path: str, document_data: Dict[str, Any]) -> None:
+    """
+    Put a subcollection document into the nested export under its parent documents.
+
+    Args:
+        export_data (Dict[str, Any]): The nested export, keyed by collection ID then document ID.
+        path (str): The document path, e.g. `barcodes/123/reviews/abc`.
+        document_data (Dict[str, Any]): The document fields.
+    """
+    segments = path.split("/")
+    node = export_data
+    # Parents missing from the export (e.g. deleted documents with subcollections) become empty
+    for index in range(0, len(segments) - 2, 2):
+        node = node.setdefault(segments[index], {}).setdefault(segments[index + 1], {})
+    node.setdefault(segments[-2], {}).setdefault(segments[-1], {}).update(document_data)
+
+
 def serialize_firestore_data(data: Any) -> Any:
     """
     Custom serialization for Firestore data to handle non-serializable types like `datetime`.
@@ -104,22 +252,631 @@ def serialize_firestore_data(data: Any) -> Any:
     return data  # Return data as-is for other types
 
 
+def encode_firestore_value(value: Any) -> Any:
+    """
+    Encode a Firestore value that `json` cannot serialize; used as the `default` hook of the encoder.
+
+    Args:
+        value (Any): The value found in a document.
+
+    Returns:
+        Any: A JSON-friendly representation of the value.
+    """
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, firestore.DocumentReference):
+        return value.path
+    if isinstance(value, firestore.GeoPoint):
+        return {"latitude": value.latitude, "longitude": value.longitude}
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"Cannot export value of type {type(value).__name__}")
+
+
+# Encodes Firestore values while serializing, so documents are never copied before they are written
+NDJSON_ENCODER = json.JSONEncoder(default=encode_firestore_value, separators=(",", ":"), ensure_ascii=False)
+
+
+def iter_collection_documents(collection: firestore.CollectionReference, recursive: bool = True,
+                              fields: Optional[List[str]] = None) -> Iterator[firestore.DocumentSnapshot]:
+    """
+    Stream all documents of a collection and, after each document, the documents of its subcollections.
+
+    Args:
+        collection (firestore.CollectionReference): The Firestore collection to export.
+        recursive (bool): Whether to list and export the subcollections of every document.
+        fields (Optional[List[str]]): The fields to read, None for whole documents.
+
+    Returns:
+        Iterator[firestore.DocumentSnapshot]: The documents, depth-first.
+    """
+    query = collection.select(fields) if fields is not None else collection
+    for doc in query.stream():
+        yield doc
+        if not recursive:
+            continue
+        for subcollection in doc.reference.collections():
+            yield from iter_collection_documents(subcollection, fields=fields)
+
+
+def write_ndjson_document(doc: firestore.DocumentSnapshot, output: TextIO) -> None:
+    """
+    Write one document as an NDJSON line.
+
+    Args:
+        doc (firestore.DocumentSnapshot): The exported document.
+        output (TextIO): The NDJSON output file.
+    """
+    record = {"path": doc.reference.path, "fields": doc.to_dict(), "update_time": doc.update_time}
+    output.write(NDJSON_ENCODER.encode(record))
+    output.write("\n")
+
+
+class ExportPartition:
+    """
+    One unit of an NDJSON export: a whole root collection or subcollection group, or a
+    document-name range of it.
+
+    Args:
+        collection_id (str): The root collection, or the subcollection ID if `group` is set.
+        index (int): The position of the range in the collection.
+        start (Optional[str]): The path of the first document of the range, None for the first range.
+        end (Optional[str]): The path of the first document after the range, None for the last range.
+        group (bool): Whether this is a range of every subcollection with the ID, at any depth.
+        recursive (bool): Whether to list and export the subcollections of every document.
+    """
+
+    def __init__(self, collection_id: str, index: int = 0, start: Optional[str] = None, end: Optional[str] = None,
+                 group: bool = False, recursive: bool = False):
+        self.collection_id = collection_id
+        self.index = index
+        self.start = start
+        self.end = end
+        self.group = group
+        self.recursive = recursive
+
+    @property
+    def name(self) -> str:
+        kind = "group-" if self.group else ""
+        return f"{self.collection_id}-{kind}{self.index:04d}"
+
+    @property
+    def file_name(self) -> str:
+        return f"{self.name}.ndjson"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"collection": self.collection_id, "index": self.index, "start": self.start, "end": self.end,
+                "group": self.group, "recursive": self.recursive}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ExportPartition":
+        return cls(data["collection"], data["index"], data["start"], data["end"], data["group"], data["recursive"])
+
+    def query(self, fields: Optional[List[str]] = None) -> firestore.Query:
+        """
+        Build the query of the range, ordered by document name so it can be paginated.
+
+        Args:
+            fields (Optional[List[str]]): The fields to read, None for whole documents.
+
+        Returns:
+            firestore.Query: The query.
+        """
+        if not self.group and self.start is None and self.end is None:
+            query = db.collection(self.collection_id)
+            return (query.select(fields) if fields is not None else query).order_by("__name__")
+        # Partition cursors only work on collection group queries ordered by name
+        query = db.collection_group(self.collection_id)
+        query = (query.select(fields) if fields is not None else query).order_by("__name__")
+        if self.start:
+            query = query.start_at([db.document(self.start)])
+        if self.end:
+            query = query.end_before([db.document(self.end)])
+        return query
+
+    def pages(self, page_size: int, start_after: Optional[str] = None,
+              fields: Optional[List[str]] = None) -> Iterator[Tuple[str, List[firestore.DocumentSnapshot]]]:
+        """
+        Read the range page by page with `start_after` cursors.
+
+        Args:
+            page_size (int): The number of documents per page.
+            start_after (Optional[str]): The path of the last document already exported, to resume after it.
+            fields (Optional[List[str]]): The fields to read, None for whole documents.
+
+        Returns:
+            Iterator[Tuple[str, List[firestore.DocumentSnapshot]]]: For every page, the path of its last
+                document (the cursor to resume from) and the documents to export, with their
+                subcollections if `recursive`.
+        """
+        whole_collection = not self.group and self.start is None and self.end is None
+        for page in iter_document_pages(self.query(fields), page_size, start_after):
+            documents = []
+            for doc in page:
+                # Root documents belong to root partitions and subcollection documents to group partitions
+                if not whole_collection and (doc.reference.parent.parent is not None) != self.group:
+                    continue
+                documents.append(doc)
+                if self.recursive:
+                    for subcollection in doc.reference.collections():
+                        documents.extend(iter_collection_documents(subcollection, fields=fields))
+            yield page[-1].reference.path, documents
+
+
+def iter_document_pages(query: firestore.Query, page_size: int,
+                        start_after: Optional[str] = None) -> Iterator[List[firestore.DocumentSnapshot]]:
+    """
+    Run a query ordered by document name in pages, each page a short request starting after the last.
+
+    Args:
+        query (firestore.Query): The query, ordered by `__name__`.
+        page_size (int): The number of documents per page.
+        start_after (Optional[str]): The path of the document to start after.
+
+    Returns:
+        Iterator[List[firestore.DocumentSnapshot]]: The pages.
+    """
+    while True:
+        page_query = query.limit(page_size)
+        if start_after:
+            page_query = page_query.start_after([db.document(start_after)])
+        page = list(page_query.stream())
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        start_after = page[-1].reference.path
+
+
+def plan_export_partitions(workers: int, subcollections: str = "per-document") -> List[ExportPartition]:
+    """
+    List the units of an NDJSON export, splitting large collections and subcollection groups into ranges.
+
+    Args:
+        workers (int): The number of export threads; with one, nothing is split.
+        subcollections (str): `group` or `per-document`, see `export_firestore_data`.
+
+    Returns:
+        List[ExportPartition]: The partitions, in export order.
+    """
+    root_collections = list(db.collections())
+    recursive = subcollections == "per-document"
+    sources = [(collection.id, collection, False) for collection in root_collections]
+    if not recursive:
+        sources.extend((collection_id, db.collection_group(collection_id), True)
+                       for collection_id in discover_subcollection_ids(root_collections))
+
+    partitions: List[ExportPartition] = []
+    for collection_id, query, group in sources:
+        if workers <= 1:
+            partitions.append(ExportPartition(collection_id, group=group, recursive=recursive))
+            continue
+        size = query.count().get()[0][0].value
+        count = min(math.ceil(size / PARTITION_THRESHOLD), workers * PARTITIONS_PER_WORKER)
+        if count <= 1:
+            partitions.append(ExportPartition(collection_id, group=group, recursive=recursive))
+            continue
+        ranges = list(db.collection_group(collection_id).get_partitions(count))
+        for index, partition in enumerate(ranges):
+            start = partition.start_at.path if partition.start_at else None
+            end = partition.end_at.path if partition.end_at else None
+            partitions.append(ExportPartition(collection_id, index, start, end, group, recursive))
+        print(f"Split {collection_id} ({size} documents) into {len(ranges)} ranges.")
+    return partitions
+
+
+def open_checkpoint(output: str, restart: bool) -> RunJournal:
+    """
+    Open the checkpoint journal of an NDJSON export.
+
+    Args:
+        output (str): The output file or directory of the export.
+        restart (bool): Whether to discard the checkpoints of an earlier run.
+
+    Returns:
+        RunJournal: The journal; `partition` units hold the plan, `page` units the last exported
+            document and output size of every partition, `done` units the finished partitions.
+    """
+    path = os.path.normpath(os.path.abspath(output))
+    # Outputs with the same name in different directories must not share checkpoints
+    digest = hashlib.sha1(path.encode("utf-8")).hexdigest()[:12]
+    journal = RunJournal(journal_path(f"firestore_export-{os.path.basename(path)}-{digest}"))
+    if restart or not os.path.exists(output):
+        journal.clear()
+    return journal
+
+
+def load_or_plan_partitions(journal: Optional[RunJournal], workers: int, subcollections: str) -> List[ExportPartition]:
+    """
+    Get the partitions of an export: from the checkpoint when resuming, so ranges and file offsets
+    still match, or from a new plan.
+
+    Args:
+        journal (Optional[RunJournal]): The checkpoint journal, None to always plan.
+        workers (int): The number of export threads.
+        subcollections (str): `group` or `per-document`, see `export_firestore_data`.
+
+    Returns:
+        List[ExportPartition]: The partitions, in export order.
+    """
+    if journal is not None:
+        planned = [json.loads(journal.get("partition", key)) for key in journal.keys("partition")]
+        if planned:
+            planned.sort(key=lambda data: data["order"])
+            print(f"Resuming export of {len(planned)} partitions from checkpoint {journal.path}.")
+            return [ExportPartition.from_dict(data) for data in planned]
+
+    partitions = plan_export_partitions(workers, subcollections)
+    if journal is not None:
+        for order, partition in enumerate(partitions):
+            journal.record("partition", partition.file_name, json.dumps({**partition.to_dict(), "order": order}))
+        journal.flush()
+    return partitions
+
+
+def open_output(path: str, offset: int) -> TextIO:
+    """
+    Open an NDJSON output for appending after `offset` bytes, dropping anything written after the
+    last checkpoint so no document is exported twice.
+
+    Args:
+        path (str): The NDJSON file.
+        offset (int): The size of the file at the last checkpoint, 0 to start over.
+
+    Returns:
+        TextIO: The file, positioned at `offset`.
+    """
+    if offset <= 0 or not os.path.exists(path):
+        return open(path, "w", encoding="utf-8")
+    if os.path.getsize(path) < offset:
+        raise RuntimeError(f"{path} is shorter than its checkpoint; restart the export with --restart.")
+    with open(path, "r+b") as f:
+        f.truncate(offset)
+    return open(path, "a", encoding="utf-8")
+
+
+def export_partition_pages(partition: ExportPartition, output: TextIO, page_size: int,
+                           journal: Optional[RunJournal] = None) -> int:
+    """
+    Export a partition page by page, checkpointing the last document and output size after each page.
+
+    Args:
+        partition (ExportPartition): The partition.
+        output (TextIO): The NDJSON output, positioned after the last checkpoint.
+        page_size (int): The number of documents per page.
+        journal (Optional[RunJournal]): The checkpoint journal, None to export without checkpoints.
+
+    Returns:
+        int: The number of documents of the partition in the output, including earlier runs.
+    """
+    key = partition.file_name
+    state = json.loads(journal.get("page", key)) if journal and journal.done("page", key) else {}
+    exported = state.get("documents", 0)
+    if journal and journal.done("done", key):
+        return exported
+
+    for last, documents in partition.pages(page_size, state.get("last")):
+        for doc in documents:
+            write_ndjson_document(doc, output)
+        exported += len(documents)
+        output.flush()
+        if journal is None:
+            continue
+        # The page must be on disk before the checkpoint says so
+        os.fsync(output.fileno())
+        offset = os.fstat(output.fileno()).st_size
+        journal.record("page", key, json.dumps({"last": last, "offset": offset, "documents": exported}))
+        journal.flush()
+    if journal is not None:
+        journal.record("done", key)
+        journal.flush()
+    return exported
+
+
+def export_firestore_ndjson(output_file: str, subcollections: str = "per-document", page_size: int = PAGE_SIZE,
+                            restart: bool = False) -> int:
+    """
+    Stream every document of the database to an NDJSON file as it is read, resuming an interrupted
+    export of the same file.
+
+    Args:
+        output_file (str): The path of the NDJSON file.
+        subcollections (str): `group` or `per-document`, see `export_firestore_data`.
+        page_size (int): The number of documents per page.
+        restart (bool): Whether to ignore the checkpoint of an interrupted export.
+
+    Returns:
+        int: The number of exported documents.
+    """
+    journal = open_checkpoint(output_file, restart)
+    partitions = load_or_plan_partitions(journal, 1, subcollections)
+    # Partitions are written one after another, so the last checkpoint is the largest offset
+    offset = max((json.loads(journal.get("page", key))["offset"] for key in journal.keys("page")), default=0)
+
+    exported = 0
+    with open_output(output_file, offset) as output:
+        for partition in partitions:
+            print(f"Exporting collection: {partition.collection_id}")
+            exported += export_partition_pages(partition, output, page_size, journal)
+            print(f"Exported {exported} documents...")
+    journal.clear()
+    return exported
+
+
+def export_partition(partition: ExportPartition, output_dir: str, page_size: int = PAGE_SIZE,
+                     journal: Optional[RunJournal] = None) -> Dict[str, Any]:
+    """
+    Export one partition to its own NDJSON file.
+
+    Args:
+        partition (ExportPartition): The partition to export.
+        output_dir (str): The export directory.
+        page_size (int): The number of documents per page.
+        journal (Optional[RunJournal]): The checkpoint journal, None to export without checkpoints.
+
+    Returns:
+        Dict[str, Any]: The manifest entry of the partition file.
+    """
+    started = time.perf_counter()
+    path = os.path.join(output_dir, partition.file_name)
+    state = journal.get("page", partition.file_name) if journal else None
+    offset = json.loads(state)["offset"] if state else 0
+    with open_output(path, offset) as output:
+        exported = export_partition_pages(partition, output, page_size, journal)
+    elapsed = time.perf_counter() - started
+    print(f"Exported {partition.file_name}: {exported} documents in {elapsed:.2f}s.")
+    return {
+        "file": partition.file_name,
+        "collection": partition.collection_id,
+        "group": partition.group,
+        "start": partition.start,
+        "end": partition.end,
+        "documents": exported,
+        "bytes": os.path.getsize(path),
+        "seconds": round(elapsed, 3),
+    }
+
+
+def export_firestore_parallel(output_dir: str, workers: int, subcollections: str = "per-document", page_size: int = PAGE_SIZE,
+                              restart: bool = False, checkpoint: bool = True) -> Dict[str, Any]:
+    """
+    Export every collection to per-partition NDJSON files with a pool of threads, resuming an
+    interrupted export of the same directory.
+
+    Args:
+        output_dir (str): The export directory; the partition files and `manifest.json` are written to it.
+        workers (int): The number of export threads.
+        subcollections (str): `group` or `per-document`, see `export_firestore_data`.
+        page_size (int): The number of documents per page.
+        restart (bool): Whether to ignore the checkpoint of an interrupted export.
+        checkpoint (bool): Whether to checkpoint the export so it can be resumed.
+
+    Returns:
+        Dict[str, Any]: The manifest of the export.
+    """
+    journal = open_checkpoint(output_dir, restart) if checkpoint else None
+    os.makedirs(output_dir, exist_ok=True)
+    started = time.perf_counter()
+    partitions = load_or_plan_partitions(journal, workers, subcollections)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export") as pool:
+        # map keeps the manifest in partition order whatever order the partitions finish in
+        entries = list(pool.map(lambda partition: export_partition(partition, output_dir, page_size, journal), partitions))
+    elapsed = time.perf_counter() - started
+    manifest = {
+        "exportedAt": datetime.now(timezone.utc).isoformat(),
+        "workers": workers,
+        "documents": sum(entry["documents"] for entry in entries),
+        "bytes": sum(entry["bytes"] for entry in entries),
+        "seconds": round(elapsed, 3),
+        "partitions": entries,
+    }
+    write_manifest(output_dir, manifest)
+    if journal is not None:
+        journal.clear()
+    return manifest
+
+
+def benchmark_export(workers: int, subcollections: str = "per-document", page_size: int = PAGE_SIZE) -> None:
+    """
+    Compare the throughput of the parallel export at 1 and `workers` threads.
+
+    Args:
+        workers (int): The number of export threads to compare with a single thread.
+        subcollections (str): `group` or `per-document`, see `export_firestore_data`.
+        page_size (int): The number of documents per page.
+    """
+    results = {}
+    for count in sorted({1, workers}):
+        with tempfile.TemporaryDirectory() as output_dir:
+            manifest = export_firestore_parallel(output_dir, count, subcollections, page_size, checkpoint=False)
+        rate = manifest["documents"] / manifest["seconds"] if manifest["seconds"] else 0
+        results[count] = manifest["seconds"]
+        print(f"{count} worker(s): {manifest['documents']} documents in {manifest['seconds']:.2f}s "
+              f"({rate:.0f} docs/s, {len(manifest['partitions'])} partitions).")
+    if workers > 1 and results[workers]:
+        print(f"Speedup with {workers} workers: {results[1] / results[workers]:.2f}x")
+
+
+def load_delta_state(export_dir: str) -> Optional[Dict[str, Any]]:
+    """
+    Read the state a delta export left for the next one.
+
+    Args:
+        export_dir (str): The delta export directory.
+
+    Returns:
+        Optional[Dict[str, Any]]: The high-water mark and exported paths of every source, or None
+            before the first delta export.
+    """
+    path = os.path.join(export_dir, DELTA_STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_delta_state(export_dir: str, state: Dict[str, Any]) -> None:
+    """
+    Write the state of a delta export atomically.
+
+    Args:
+        export_dir (str): The delta export directory.
+        state (Dict[str, Any]): The high-water mark and exported paths of every source.
+    """
+    path = os.path.join(export_dir, DELTA_STATE_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def export_firestore_delta(export_dir: str, page_size: int = PAGE_SIZE,
+                           subcollections: str = "per-document") -> Dict[str, Any]:
+    """
+    Export the documents created or changed since the last delta export, and tombstones for the
+    documents deleted since then. The first run exports everything and is the base of later deltas.
+
+    Every collection, with the subcollections of every document or as subcollection groups, is
+    listed by name only (no fields). Documents whose
+    `update_time` is after the high-water mark of the last run, or that it did not export, are then
+    read with multi-document reads; documents it exported that are no longer listed get a
+    tombstone line `{"path": ..., "deleted": true}` after the documents. Sources of the last run
+    that are no longer planned (an emptied root collection, or with `group` a subcollection the
+    discovery sample missed this time) are listed again, so their deleted documents get tombstones
+    too.
+
+    Args:
+        export_dir (str): The delta export directory; every run adds `delta-NNNN.ndjson` and updates
+            `manifest.json` and the state for the next run.
+        page_size (int): The number of document names per listing page.
+        subcollections (str): `per-document` or `group`, see `export_firestore_data`; `group` can
+            miss subcollections, which then never reach the merged snapshot.
+
+    Returns:
+        Dict[str, Any]: The manifest entry of the delta file.
+    """
+    os.makedirs(export_dir, exist_ok=True)
+    state = load_delta_state(export_dir) or {"sources": {}}
+    manifest = read_manifest(export_dir) if os.path.exists(os.path.join(export_dir, MANIFEST_FILE)) else {"deltas": []}
+    # Writes committed while the listing runs are after this mark, so the next run sees them
+    started = datetime.now(timezone.utc)
+    high_water = (started - DELTA_OVERLAP).isoformat()
+
+    file_name = f"delta-{len(manifest['deltas']):04d}.ndjson"
+    written = 0
+    tombstones = 0
+    sources: Dict[str, Any] = {}
+    with open(os.path.join(export_dir, file_name), "w", encoding="utf-8") as output:
+        partitions = plan_export_partitions(1, subcollections)
+        planned = {partition.name for partition in partitions}
+        for name, source in state["sources"].items():
+            if name in planned:
+                continue
+            if "partition" in source:
+                partitions.append(ExportPartition.from_dict(source["partition"]))
+                continue
+            # A state without the source's partition cannot list it again; every path it had is gone
+            for path in source.get("paths", []):
+                output.write(NDJSON_ENCODER.encode({"path": path, "deleted": True}))
+                output.write("\n")
+            tombstones += len(source.get("paths", []))
+            print(f"{name}: no longer found, {len(source.get('paths', []))} deleted.")
+
+        for partition in partitions:
+            source = state["sources"].get(partition.name, {})
+            since = datetime.fromisoformat(source["highWater"]) if "highWater" in source else None
+            previous = set(source.get("paths", []))
+            current: List[str] = []
+            changed: List[str] = []
+            for _, page in partition.pages(page_size, fields=["__name__"]):
+                for doc in page:
+                    path = doc.reference.path
+                    current.append(path)
+                    if since is None or path not in previous or doc.update_time > since:
+                        changed.append(path)
+
+            for chunk in chunked(changed, READ_CHUNK_SIZE):
+                for doc in db.get_all([db.document(path) for path in chunk]):
+                    # Deleted between the listing and the read; the next run writes its tombstone
+                    if doc.exists:
+                        write_ndjson_document(doc, output)
+                        written += 1
+
+            current_paths = set(current)
+            deleted = sorted(previous - current_paths)
+            for path in deleted:
+                output.write(NDJSON_ENCODER.encode({"path": path, "deleted": True}))
+                output.write("\n")
+            tombstones += len(deleted)
+            # An emptied source has nothing left to delete, so the next run can forget it
+            if current:
+                sources[partition.name] = {"highWater": high_water, "paths": current, "partition": partition.to_dict()}
+            print(f"{partition.name}: {len(changed)} new or changed, {len(deleted)} deleted of {len(current)} documents.")
+
+    entry = {
+        "file": file_name,
+        "base": not state["sources"],
+        "documents": written,
+        "tombstones": tombstones,
+        "highWater": high_water,
+        "exportedAt": started.isoformat(),
+    }
+    manifest["deltas"].append(entry)
+    # The state is saved last: if the run dies, the next one redoes this delta under the same name
+    write_manifest(export_dir, manifest)
+    save_delta_state(export_dir, {"sources": sources})
+    return entry
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export all Firestore collections and documents.")
+    parser.add_argument("--format", choices=["json", "ndjson"], default="json",
+                        help="A single nested JSON file, or one streamed NDJSON line per document.")
+    parser.add_argument("--output", help="The output file (default: firestore_export.json / firestore_export.ndjson), "
+                                         "or with --workers the output directory (default: firestore_export/).")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Export NDJSON partition files with this many threads.")
+    parser.add_argument("--subcollections", choices=["per-document", "group"], default="per-document",
+                        help="List the subcollections of every document (default), or read them with collection "
+                             "group queries after discovering them from a sample (faster, may miss some).")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="Documents per page of an NDJSON export.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint of an interrupted NDJSON export.")
+    parser.add_argument("--delta", metavar="DIR",
+                        help="Export only documents changed since the last delta export to DIR, with tombstones for deleted ones.")
+    parser.add_argument("--benchmark", action="store_true", help="With --workers, compare 1 and N workers without keeping the output.")
+    args = parser.parse_args()
+
     try:
         print("Starting Firestore export...")
-        # Export all Firestore data
-        data = export_firestore_data()
+        output_file = args.output or f"firestore_export.{args.format}"
+        if args.delta:
+            entry = export_firestore_delta(args.delta, args.page_size, args.subcollections)
+            print(f"Firestore delta exported successfully to {os.path.join(args.delta, entry['file'])} "
+                  f"({entry['documents']} documents, {entry['tombstones']} tombstones).")
+        elif args.workers and args.benchmark:
+            benchmark_export(args.workers, args.subcollections, args.page_size)
+        elif args.workers:
+            output_dir = args.output or "firestore_export"
+            manifest = export_firestore_parallel(output_dir, args.workers, args.subcollections, args.page_size, args.restart)
+            print(f"Firestore data exported successfully to {output_dir} ({manifest['documents']} documents "
+                  f"in {len(manifest['partitions'])} files, {manifest['seconds']:.2f}s).")
+        elif args.format == "ndjson":
+            exported = export_firestore_ndjson(output_file, args.subcollections, args.page_size, args.restart)
+            print(f"Firestore data exported successfully to {output_file} ({exported} documents).")
+        else:
+            # Export all Firestore data
+            data = export_firestore_data(args.subcollections)
 
-        print("Serializing Firestore data for JSON output...")
-        # Serialize data for JSON output
-        serialized_data = serialize_firestore_data(data)
+            print("Serializing Firestore data for JSON output...")
+            # Serialize data for JSON output
+            serialized_data = serialize_firestore_data(data)
 
-        output_file = "firestore_export.json"
-        # Write serialized data to a JSON file
-        with open(output_file, "w") as json_file:
-            json.dump(serialized_data, json_file, indent=4)
+            # Write serialized data to a JSON file
+            with open(output_file, "w") as json_file:
+                json.dump(serialized_data, json_file, indent=4)
 
-        print(f"Firestore data exported successfully to {output_file}.")
+            print(f"Firestore data exported successfully to {output_file}.")
     except Exception as e:
         # Print error message if an exception occurs
         print(f"An error occurred during export: {e}")
@@ -0,0 +1,342 @@
+"""
+Synthetic Seed Dataset Generator
+
+Generates a large, internally consistent dataset in the same shape as `dummy_data.json` to load-test
+the feeds and rankings of the app. The size is controlled by a scale factor (scale 1 is about
+1,000 users, 50 stores, 2,000 deals, 10,000 comments and 70,000 votes) and, for a given end of the
+time window, the output is fully determined by the seed.
+
+The data is skewed like real usage:
+- A few power users post most deals and comments (Zipf-distributed authors).
+- A few deals get most of the votes and comments (Pareto-distributed popularity).
+- Deals are spread over the last days like `replace_timestamps`, and comments follow their deal by
+  1-12 hours like `replace_comment_timestamps`.
+
+Every record is derived from the seed and its own index, so records are streamed one at a time and
+memory stays bounded by the number of users, whatever the number of deals, comments and votes.
+Texts, prices and image URLs are sampled from `dummy_data.json`.
+
+Usage:
+    python generate_dataset.py --scale 10 --seed 42 --out seed_data/   # one NDJSON file per collection
+    python generate_dataset.py --scale 10 --seed 42 --write            # write through set_dummy.py's pipeline
+
+WARNING: `--write` modifies Firebase Firestore. Use with caution.
+"""
+
+import argparse
+import bisect
+import itertools
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Any, Iterator, Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_JSON_PATH = os.path.join(SCRIPT_DIR, "dummy_data.json")
+
+# Collection sizes at scale 1
+BASE_USERS = 1000
+BASE_STORES = 50
+BASE_DEALS = 2000
+
+# Skew parameters: Zipf exponent of user activity and Pareto shape of deal popularity
+USER_ACTIVITY_EXPONENT = 1.1
+DEAL_POPULARITY_SHAPE = 1.5
+
+# Average votes and comments of a deal with popularity 1, and votes of a comment
+DEAL_VOTES_PER_POPULARITY = 10
+DEAL_COMMENTS_PER_POPULARITY = 2
+MEAN_COMMENT_VOTES = 2
+UPVOTE_RATIO = 0.85
+
+# Deals are spread over this many days before the generation time
+DAYS_OF_HISTORY = 7
+
+# Center of the generated stores (Calgary)
+STORE_CENTER = (51.05, -114.07)
+
+class DatasetGenerator:
+    """
+    Deterministic, streaming generator of seed records.
+
+    Args:
+        scale (float): The size multiplier applied to the base collection sizes.
+        seed (int): The random seed; the same scale and seed always produce the same data.
+        now (Optional[datetime]): The end of the generated time window. Defaults to the current time.
+    """
+
+    def __init__(self, scale: float = 1.0, seed: int = 0, now: Optional[datetime] = None):
+        self.seed = seed
+        self.n_users = max(2, round(BASE_USERS * scale))
+        self.n_stores = max(1, round(BASE_STORES * scale))
+        self.n_deals = max(1, round(BASE_DEALS * scale))
+        self.now = (now or datetime.now()).replace(microsecond=0)
+
+        with open(TEMPLATE_JSON_PATH, "r") as f:
+            templates = json.load(f)
+        self.avatar_urls = [profile["avatarURL"] for profile in templates["UserProfile"]]
+        self.deal_templates = [
+            {key: deal[key] for key in ("photoURL", "productText", "postText", "price")}
+            for deal in templates["Deals"]
+        ]
+        self.comment_texts = [comment["commentText"] for comment in templates["UserComments"]]
+        self.store_names = [store["name"] for store in templates["Stores"]]
+
+        # Cumulative Zipf weights of users, the only per-user state kept
+        self._activity = list(itertools.accumulate(
+            1 / (rank + 1) ** USER_ACTIVITY_EXPONENT for rank in range(self.n_users)
+        ))
+
+    def counts(self) -> dict[str, int]:
+        """
+        Get the number of users, stores and deals that will be generated.
+
+        Returns:
+            dict[str, int]: The record counts by collection; comments and votes depend on the draws.
+        """
+        return {"UserProfile": self.n_users, "Stores": self.n_stores, "Deals": self.n_deals}
+
+    def user_profiles(self) -> Iterator[dict]:
+        """
+        Stream the UserProfile records.
+
+        Returns:
+            Iterator[dict]: The user profiles.
+        """
+        for index in range(self.n_users):
+            rng = self._rng("user", index)
+            yield {
+                "id": self._user_id(index),
+                "username": self._username(index),
+                "email": f"{self._user_id(index)}@example.com",
+                "displayName": f"Shopper {index + 1}",
+                "avatarURL": rng.choice(self.avatar_urls),
+                "score": 0,
+                "savedDeals": [],
+                "totalUpvotes": 0,
+                "totalDownvotes": 0,
+                "totalDeals": 0,
+                "totalComments": 0,
+                "rankingPoints": 0,
+                "isDummy": True
+            }
+
+    def stores(self) -> Iterator[dict]:
+        """
+        Stream the Stores records.
+
+        Returns:
+            Iterator[dict]: The stores.
+        """
+        for index in range(self.n_stores):
+            yield self._store(index)
+
+    def deals(self) -> Iterator[dict]:
+        """
+        Stream the Deals records.
+
+        Returns:
+            Iterator[dict]: The deals, with `userID` holding the author's username like `dummy_data.json`.
+        """
+        for index in range(self.n_deals):
+            yield self._deal(index)
+
+    def user_comments(self) -> Iterator[dict]:
+        """
+        Stream the UserComments records, grouped by deal.
+
+        Returns:
+            Iterator[dict]: The comments, with `userID` holding the author's username.
+        """
+        for deal_index in range(self.n_deals):
+            deal = self._deal(deal_index)
+            for comment_index in range(len(deal["commentIDs"])):
+                yield self._comment(deal_index, comment_index, deal)
+
+    def votes(self) -> Iterator[dict]:
+        """
+        Stream the Votes records matching the `upvote`/`downvote` counts of every deal and comment.
+
+        Returns:
+            Iterator[dict]: The votes in the format read by `populate_votes`.
+        """
+        for deal_index in range(self.n_deals):
+            deal = self._deal(deal_index)
+            yield from self._item_votes(("deal", deal_index), deal["id"], "deal", deal, self._owner(deal_index))
+            for comment_index in range(len(deal["commentIDs"])):
+                comment = self._comment(deal_index, comment_index, deal)
+                yield from self._item_votes(("comment", deal_index, comment_index), comment["id"], "comment",
+                                            comment, self._comment_owner(deal_index, comment_index))
+
+    def collections(self) -> dict[str, Iterator[dict]]:
+        """
+        Get a stream for every collection, in the order they have to be written.
+
+        Returns:
+            dict[str, Iterator[dict]]: The record streams by collection name.
+        """
+        return {
+            "UserProfile": self.user_profiles(),
+            "Stores": self.stores(),
+            "Deals": self.deals(),
+            "UserComments": self.user_comments(),
+            "Votes": self.votes(),
+        }
+
+    def _rng(self, *key: Any) -> random.Random:
+        # One independent generator per record, so any record can be regenerated on its own
+        return random.Random(":".join(map(str, (self.seed,) + key)))
+
+    def _user_id(self, index: int) -> str:
+        return f"gen_user{index + 1}"
+
+    def _username(self, index: int) -> str:
+        return f"gen_shopper_{index + 1}"
+
+    def _pick_user(self, rng: random.Random) -> int:
+        return bisect.bisect_left(self._activity, rng.random() * self._activity[-1])
+
+    def _owner(self, deal_index: int) -> int:
+        return self._pick_user(self._rng("deal-owner", deal_index))
+
+    def _comment_owner(self, deal_index: int, comment_index: int) -> int:
+        return self._pick_user(self._rng("comment-owner", deal_index, comment_index))
+
+    def _upvotes(self, rng: random.Random, total_votes: int) -> int:
+        ratio = min(1.0, max(0.0, rng.gauss(UPVOTE_RATIO, 0.1)))
+        return round(total_votes * ratio)
+
+    def _store(self, index: int) -> dict:
+        rng = self._rng("store", index)
+        return {
+            "id": f"gen_loc{index + 1}",
+            "latitude": round(STORE_CENTER[0] + rng.uniform(-0.15, 0.15), 5),
+            "longitude": round(STORE_CENTER[1] + rng.uniform(-0.25, 0.25), 5),
+            "name": f"{rng.choice(self.store_names)} #{index + 1}",
+            "isDummy": True
+        }
+
+    def _deal(self, index: int) -> dict:
+        rng = self._rng("deal", index)
+        template = rng.choice(self.deal_templates)
+        store = self._store(rng.randrange(self.n_stores))
+        popularity = rng.paretovariate(DEAL_POPULARITY_SHAPE)
+        total_votes = min(self.n_users - 1, int(popularity * DEAL_VOTES_PER_POPULARITY * rng.random() * 2))
+        upvotes = self._upvotes(rng, total_votes)
+        n_comments = int(popularity * DEAL_COMMENTS_PER_POPULARITY * rng.random() * 2)
+        date_time = self.now - timedelta(seconds=rng.randrange(DAYS_OF_HISTORY * 24 * 3600))
+        return {
+            "id": f"gen_deal{index + 1}",
+            "userID": self._username(self._owner(index)),
+            "photoURL": template["photoURL"],
+            "productText": template["productText"],
+            "postText": template["postText"],
+            "price": round(template["price"] * rng.uniform(0.7, 1.3), 2),
+            "location": store["name"],
+            "locationId": store["id"],
+            "date": date_time.date().isoformat(),
+            "commentIDs": [f"gen_comment{index + 1}_{j + 1}" for j in range(n_comments)],
+            "upvote": upvotes,
+            "downvote": total_votes - upvotes,
+            "dateTime": date_time,
+            "isDummy": True
+        }
+
+    def _comment(self, deal_index: int, comment_index: int, deal: dict) -> dict:
+        rng = self._rng("comment", deal_index, comment_index)
+        total_votes = min(self.n_users - 1, int(rng.expovariate(1 / MEAN_COMMENT_VOTES)))
+        upvotes = self._upvotes(rng, total_votes)
+        date_time = deal["dateTime"] + timedelta(hours=rng.randint(1, 12))
+        return {
+            "id": deal["commentIDs"][comment_index],
+            "commentText": rng.choice(self.comment_texts),
+            "downvote": total_votes - upvotes,
+            "commentType": "deal",
+            "upvote": upvotes,
+            "date": date_time.date().isoformat(),
+            "dateTime": date_time,
+            "itemID": deal["id"],
+            "userID": self._username(self._comment_owner(deal_index, comment_index)),
+            "isDummy": True
+        }
+
+    def _item_votes(self, key: tuple, item_id: str, item_type: str, item: dict, owner: int) -> Iterator[dict]:
+        rng = self._rng("votes", *key)
+        total = item["upvote"] + item["downvote"]
+        # Sample from the users other than the owner without materializing the user list
+        for position, voter in enumerate(rng.sample(range(self.n_users - 1), total)):
+            voter += voter >= owner
+            yield {
+                "userId": self._user_id(voter),
+                "itemId": item_id,
+                "itemType": item_type,
+                "voteType": "upvote" if position < item["upvote"] else "downvote",
+                "isDummy": True
+            }
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def write_ndjson(generator: DatasetGenerator, out_dir: str) -> None:
+    """
+    Write every collection to `<out_dir>/<Collection>.ndjson`, one record per line.
+
+    Args:
+        generator (DatasetGenerator): The dataset generator.
+        out_dir (str): The output directory.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    for collection, records in generator.collections().items():
+        path = os.path.join(out_dir, f"{collection}.ndjson")
+        count = 0
+        with open(path, "w") as f:
+            for record in records:
+                f.write(json.dumps(record, default=_json_default))
+                f.write("\n")
+                count += 1
+        print(f"Wrote {count} {collection} records to {path}")
+
+def seed_firestore(generator: DatasetGenerator) -> None:
+    """
+    Write the generated dataset to Firestore through the `set_dummy.py` write pipeline.
+
+    Images are kept as their source URLs and no Authentication users are created.
+
+    Args:
+        generator (DatasetGenerator): The dataset generator.
+    """
+    # set_dummy initializes the Firebase Admin SDK on import
+    import set_dummy
+    from firestore_batch import BatchWriter, DocumentIndex
+
+    db = set_dummy.db
+    index = DocumentIndex(db)
+    set_dummy.preload_index(index)
+    writer = BatchWriter(db, batch_size=set_dummy.WRITE_BATCH_SIZE, max_in_flight=set_dummy.WRITE_MAX_IN_FLIGHT,
+                         on_committed=index.add)
+    user_map_username, user_map_id, _ = set_dummy.populate_user_profiles(generator.user_profiles(), db, writer, index)
+    set_dummy.populate_stores(generator.stores(), db, writer, index)
+    set_dummy.populate_deals(generator.deals(), db, user_map_username, writer, index)
+    set_dummy.populate_user_comments(generator.user_comments(), db, user_map_username, writer, index)
+    set_dummy.populate_votes(generator.votes(), db, user_map_id, writer)
+    writer.close()
+    print("Generated data written to Firestore.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a large synthetic seed dataset.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Size multiplier (1 = ~1,000 users and 2,000 deals).")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--out", help="Directory to write one NDJSON file per collection to.")
+    target.add_argument("--write", action="store_true", help="Write the data straight to Firestore.")
+    args = parser.parse_args()
+
+    dataset = DatasetGenerator(args.scale, args.seed)
+    print(f"Generating dataset at scale {args.scale} with seed {args.seed}: {dataset.counts()}")
+    if args.write:
+        seed_firestore(dataset)
+    else:
+        write_ndjson(dataset, args.out)
\ No newline at end of file
@@ -0,0 +1,224 @@
+"""
+Content-Addressed Image Cache
+
+Local cache used by the image pipeline so reruns of `set_dummy.py` don't download and upload the same
+images again. It keeps:
+
+1. Downloaded image bytes on disk, named by their SHA-256 hash and evicted least-recently-used first
+   once the cache grows past its size limit.
+2. A manifest mapping source URLs to content hashes, and content hashes (per Storage folder) to the
+   blob they were uploaded as and its public URL.
+
+A source URL that was already uploaded resolves straight to its public URL without any network
+traffic, and two URLs serving the same bytes share one upload.
+
+The manifest is written to `manifest.json` in the cache directory when `save` is called.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Default limit for the bytes kept on disk
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+def content_hash(content: bytes) -> str:
+    """
+    Compute the content address of an image.
+
+    Args:
+        content (bytes): The image bytes.
+
+    Returns:
+        str: The hex SHA-256 digest of the bytes.
+    """
+    return hashlib.sha256(content).hexdigest()
+
+class ImageCache:
+    """
+    On-disk LRU cache of downloaded images plus a manifest of uploaded blobs.
+
+    Args:
+        cache_dir (str): The directory holding the cached images and the manifest.
+        max_bytes (int): The maximum number of image bytes kept on disk.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.manifest_path = os.path.join(cache_dir, "manifest.json")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._urls: dict[str, str] = {}
+        self._uploads: dict[str, dict[str, str]] = {}
+        # Cached files by hash, least recently used first
+        self._lru: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        self._load()
+
+    def lookup_url(self, url: str) -> Optional[str]:
+        """
+        Get the content hash of a source URL downloaded before.
+
+        Args:
+            url (str): The source URL.
+
+        Returns:
+            Optional[str]: The content hash, or None if the URL is unknown.
+        """
+        with self._lock:
+            return self._urls.get(url)
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """
+        Read cached image bytes and mark them as recently used.
+
+        Args:
+            digest (str): The content hash.
+
+        Returns:
+            Optional[bytes]: The image bytes, or None if they are not cached.
+        """
+        with self._lock:
+            if digest not in self._lru:
+                self.misses += 1
+                return None
+            self._lru.move_to_end(digest)
+        try:
+            with open(self._object_path(digest), "rb") as f:
+                content = f.read()
+        except OSError:
+            with self._lock:
+                self._drop(digest)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return content
+
+    def put(self, url: str, content: bytes) -> str:
+        """
+        Store downloaded image bytes and remember which URL they came from.
+
+        Args:
+            url (str): The source URL.
+            content (bytes): The image bytes.
+
+        Returns:
+            str: The content hash of the image.
+        """
+        digest = content_hash(content)
+        path = self._object_path(digest)
+        with self._lock:
+            self._urls[url] = digest
+            known = digest in self._lru
+        if not known:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        with self._lock:
+            if digest not in self._lru:
+                self._lru[digest] = len(content)
+                self._size += len(content)
+            self._lru.move_to_end(digest)
+            self._evict()
+        return digest
+
+    def uploaded_url(self, digest: str, folder: str) -> Optional[str]:
+        """
+        Get the public URL of an image already uploaded to a folder.
+
+        Args:
+            digest (str): The content hash.
+            folder (str): The Storage folder.
+
+        Returns:
+            Optional[str]: The public URL, or None if the image was not uploaded there.
+        """
+        with self._lock:
+            upload = self._uploads.get(f"{folder}/{digest}")
+            return upload["url"] if upload else None
+
+    def record_upload(self, digest: str, folder: str, blob_name: str, url: str) -> None:
+        """
+        Remember that an image was uploaded.
+
+        Args:
+            digest (str): The content hash.
+            folder (str): The Storage folder.
+            blob_name (str): The name of the uploaded blob.
+            url (str): The public URL of the uploaded blob.
+        """
+        with self._lock:
+            self._uploads[f"{folder}/{digest}"] = {"blob": blob_name, "url": url}
+
+    def forget_uploads(self, url: Optional[str] = None) -> None:
+        """
+        Forget uploaded blobs, e.g. after they were deleted from Storage.
+
+        Args:
+            url (Optional[str]): The public URL of the deleted blob, or None to forget every upload.
+        """
+        with self._lock:
+            if url is None:
+                self._uploads.clear()
+            else:
+                self._uploads = {key: upload for key, upload in self._uploads.items() if upload["url"] != url}
+
+    def save(self) -> None:
+        """
+        Write the manifest to disk.
+        """
+        with self._lock:
+            manifest = {
+                "urls": self._urls,
+                "uploads": self._uploads,
+                "objects": [[digest, size] for digest, size in self._lru.items()],
+                "savedAt": time.time(),
+            }
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, self.manifest_path)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable image cache manifest {self.manifest_path}: {e}")
+            return
+        self._urls = manifest.get("urls", {})
+        self._uploads = manifest.get("uploads", {})
+        for digest, size in manifest.get("objects", []):
+            if os.path.exists(self._object_path(digest)):
+                self._lru[digest] = size
+                self._size += size
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, "objects", digest[:2], digest)
+
+    def _evict(self) -> None:
+        # Caller holds the lock. Upload records are kept: the blobs still exist in Storage.
+        while self._size > self.max_bytes and len(self._lru) > 1:
+            digest = next(iter(self._lru))
+            try:
+                os.remove(self._object_path(digest))
+            except OSError:
+                pass
+            self._drop(digest)
+
+    def _drop(self, digest: str) -> None:
+        size = self._lru.pop(digest, None)
+        if size is not None:
+            self._size -= size
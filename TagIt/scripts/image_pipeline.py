@@ -0,0 +1,484 @@
+"""
+Image Ingest Pipeline
+
+Downloads images from their source URLs and uploads them to Firebase Storage with bounded
+concurrency. Every image goes through three stages, each backed by its own thread pool:
+
+1. Download: fetch the source image with a pooled HTTP session.
+2. Upload: upload the original bytes to `{folder}/{fileName}.jpg`.
+3. Resize wait: poll until the Resize Images extension has written `{folder}/{fileName}_1080x1080.jpeg`
+   and return its public URL, or fall back to a signed URL of the original.
+
+With `local_resize=True` the cloud resize is skipped entirely: the downloaded image is resized to fit
+1080x1080 in a process pool, only that final `{folder}/{fileName}_1080x1080.jpeg` variant is uploaded,
+and its public URL is returned without any polling.
+
+With an `ImageCache`, images are content-addressed: the SHA-256 of the downloaded bytes is used as the
+file name, source URLs that were uploaded on an earlier run resolve to the recorded public URL with no
+network traffic, and jobs whose images have identical bytes share a single upload.
+
+Because the stages run in separate pools, one image can be downloading while another is uploading and
+a third is waiting for its resize, so the slow resize polling no longer serializes the whole run.
+Per-stage throughput and latency are collected in `StageStats` and printed with `print_stats`.
+
+The bucket and HTTP session are passed in, so the pipeline can be pointed at a local HTTP server and
+any object that implements the small part of the `google.cloud.storage.Bucket` API used here
+(`name`, `blob(name)` and the blob's `upload_from_string`, `exists` and `generate_signed_url`).
+
+Dependencies:
+- requests (`pip install requests`).
+- Pillow (`pip install Pillow`), only for local resizing.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from typing import Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from image_cache import ImageCache
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# Bounding box used by the Resize Images extension for the variant the app displays
+RESIZED_SIZE = 1080
+
+def public_url(bucket_name: str, blob_name: str) -> str:
+    """
+    Build the Firebase public download URL of a blob.
+
+    Args:
+        bucket_name (str): The name of the Storage bucket.
+        blob_name (str): The full name of the blob, including its folder.
+
+    Returns:
+        str: The `firebasestorage.googleapis.com` URL of the blob.
+    """
+    return f"https://firebasestorage.googleapis.com/v0/b/{bucket_name}/o/{blob_name.replace('/', '%2F')}?alt=media"
+
+def create_session(pool_size: int) -> requests.Session:
+    """
+    Create an HTTP session whose connection pool can serve `pool_size` concurrent downloads.
+
+    Args:
+        pool_size (int): The number of connections kept per host.
+
+    Returns:
+        requests.Session: The pooled session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def download_image(url: str, session: requests.Session, timeout: int = 30) -> Optional[bytes]:
+    """
+    Download an image from a given URL.
+
+    Args:
+        url (str): The URL of the image to download.
+        session (requests.Session): The HTTP session to download with.
+        timeout (int): The request timeout in seconds.
+
+    Returns:
+        bytes: The content of the image if downloaded successfully, otherwise None.
+    """
+    print(f"Downloading image from URL: {url}")
+    try:
+        response = session.get(url, timeout=timeout)
+    except requests.RequestException as e:
+        print(f"Error downloading image from URL: {url}: {e}")
+        return None
+    if response.status_code != 200:
+        print(f"Error downloading image from URL: {url}")
+        return None
+    return response.content
+
+def upload_image(bucket: Any, image_content: bytes, folder: str, fileName: str) -> Any:
+    """
+    Upload the original image to Firebase Storage.
+
+    Args:
+        bucket (Any): The Storage bucket.
+        image_content (bytes): The content of the image to upload.
+        folder (str): The folder in Firebase Storage to upload the image to.
+        fileName (str): The name of the file to upload, without extension.
+
+    Returns:
+        Any: The uploaded blob.
+    """
+    print(f"Uploading image to folder: {folder}, file name: {fileName}")
+    original_blob = bucket.blob(f"{folder}/{fileName}.jpg")
+    original_blob.upload_from_string(image_content, content_type='image/jpeg')
+    return original_blob
+
+def wait_for_resized_image(bucket: Any, original_blob: Any, folder: str, fileName: str,
+                           timeout: int = 30, interval: float = 2) -> str:
+    """
+    Poll for the resized image written by the Resize Images extension.
+
+    Args:
+        bucket (Any): The Storage bucket.
+        original_blob (Any): The uploaded original blob, used for the fallback URL.
+        folder (str): The folder the image was uploaded to.
+        fileName (str): The name of the uploaded file, without extension.
+        timeout (int): The timeout for polling the resized image.
+        interval (float): The number of seconds between two checks.
+
+    Returns:
+        str: The public URL of the resized image, or a signed URL of the original on timeout.
+    """
+    resized_name = f"{folder}/{fileName}_1080x1080.jpeg"
+    resized_blob = bucket.blob(resized_name)
+    elapsed_time = 0
+    while elapsed_time < timeout:
+        if resized_blob.exists():
+            # Use Firebase public URL for resized image
+            resized_url = public_url(bucket.name, resized_name)
+            print(f"Resized image found. Public URL: {resized_url}")
+            return resized_url
+        time.sleep(interval)
+        elapsed_time += interval
+
+    # Fallback to original image signed URL
+    original_url = original_blob.generate_signed_url(timedelta(seconds=300))
+    print(f"Resized image not found after {timeout} seconds. Using original image URL: {original_url}")
+    return original_url
+
+def resize_image(image_content: bytes, size: int = RESIZED_SIZE) -> bytes:
+    """
+    Resize an image to fit in a `size`x`size` box and encode it as JPEG.
+
+    Like the Resize Images extension, the aspect ratio is kept and smaller images are not enlarged.
+
+    Args:
+        image_content (bytes): The content of the source image.
+        size (int): The width and height of the bounding box.
+
+    Returns:
+        bytes: The resized JPEG image.
+    """
+    with Image.open(BytesIO(image_content)) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image.thumbnail((size, size), Image.LANCZOS)
+        output = BytesIO()
+        image.save(output, format="JPEG", quality=90, optimize=True)
+    return output.getvalue()
+
+def upload_resized_image(bucket: Any, resized_content: bytes, folder: str, fileName: str) -> str:
+    """
+    Upload a locally resized image under the name the Resize Images extension would have used.
+
+    The blob is marked with `resizedImage: true` metadata so the extension does not resize it again.
+
+    Args:
+        bucket (Any): The Storage bucket.
+        resized_content (bytes): The resized JPEG image.
+        folder (str): The folder in Firebase Storage to upload the image to.
+        fileName (str): The name of the file to upload, without suffix and extension.
+
+    Returns:
+        str: The public URL of the uploaded image.
+    """
+    resized_name = f"{folder}/{fileName}_{RESIZED_SIZE}x{RESIZED_SIZE}.jpeg"
+    print(f"Uploading resized image to folder: {folder}, file name: {fileName}")
+    resized_blob = bucket.blob(resized_name)
+    resized_blob.metadata = {"resizedImage": "true"}
+    resized_blob.upload_from_string(resized_content, content_type='image/jpeg')
+    return public_url(bucket.name, resized_name)
+
+class StageStats:
+    """
+    Throughput and latency counters of one pipeline stage.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.failures = 0
+        self.bytes = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.first_start: Optional[float] = None
+        self.last_end: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, started: float, ok: bool, nbytes: int = 0) -> None:
+        """
+        Record one finished item.
+
+        Args:
+            started (float): The `time.perf_counter()` value when the item entered the stage.
+            ok (bool): Whether the stage succeeded for the item.
+            nbytes (int): The number of bytes the stage moved for the item.
+        """
+        ended = time.perf_counter()
+        elapsed = ended - started
+        with self._lock:
+            self.count += 1
+            self.failures += 0 if ok else 1
+            self.bytes += nbytes
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+            self.first_start = started if self.first_start is None else min(self.first_start, started)
+            self.last_end = ended if self.last_end is None else max(self.last_end, ended)
+
+    def summary(self) -> str:
+        """
+        Format the counters as a single line.
+
+        Returns:
+            str: The stage summary.
+        """
+        if not self.count:
+            return f"{self.name}: no items"
+        wall = max(self.last_end - self.first_start, 1e-9)
+        return (f"{self.name}: {self.count} items ({self.failures} failed), "
+                f"{self.count / wall:.2f} items/s, {self.bytes / wall / 1e6:.2f} MB/s, "
+                f"avg {self.total_seconds / self.count:.2f}s, max {self.max_seconds:.2f}s")
+
+class ImageJob:
+    """
+    One image to ingest.
+
+    Args:
+        key (Any): Caller-defined key the result is returned under.
+        url (str): The source URL of the image.
+        folder (str): The Storage folder to upload the image to.
+        fileName (str): The name of the file to upload, without extension.
+    """
+
+    def __init__(self, key: Any, url: str, folder: str, fileName: str):
+        self.key = key
+        self.url = url
+        self.folder = folder
+        self.fileName = fileName
+        self.content_hash: Optional[str] = None
+
+class _SameImageAs:
+    """
+    Result marker for a job whose image is uploaded by another job of the same run.
+    """
+
+    def __init__(self, key: Any):
+        self.key = key
+
+class ImagePipeline:
+    """
+    Bounded-concurrency download → upload → resize-wait pipeline.
+
+    With `local_resize` the stages become download → resize (process pool) → upload of the final variant.
+
+    Args:
+        bucket (Any): The Storage bucket to upload to.
+        session (requests.Session): Optional HTTP session; a pooled one is created if omitted.
+        download_workers (int): The number of concurrent downloads.
+        upload_workers (int): The number of concurrent uploads.
+        resize_workers (int): The number of images polled for their resize at the same time.
+        max_buffered (int): The maximum number of downloaded images held in memory before upload.
+        resize_timeout (int): The timeout for polling one resized image.
+        poll_interval (float): The number of seconds between two resize checks.
+        local_resize (bool): Whether to resize locally instead of waiting for the Resize Images extension.
+        resize_processes (int): The number of worker processes used for local resizing.
+        cache (ImageCache): Optional content-addressed cache used to skip downloads and uploads.
+    """
+
+    def __init__(self, bucket: Any, session: Optional[requests.Session] = None, download_workers: int = 8,
+                 upload_workers: int = 4, resize_workers: int = 16, max_buffered: int = 32,
+                 resize_timeout: int = 30, poll_interval: float = 2, local_resize: bool = False,
+                 resize_processes: Optional[int] = None, cache: Optional[ImageCache] = None):
+        if local_resize and Image is None:
+            raise RuntimeError("Local resizing requires Pillow. Install it with `pip install Pillow`.")
+        self.bucket = bucket
+        self.session = session or create_session(download_workers)
+        self.download_workers = download_workers
+        self.upload_workers = upload_workers
+        self.resize_workers = resize_workers
+        self.resize_timeout = resize_timeout
+        self.poll_interval = poll_interval
+        self.local_resize = local_resize
+        self.resize_processes = resize_processes or os.cpu_count() or 1
+        self.cache = cache
+        self.stats = {stage: StageStats(stage) for stage in ("cache", "download", "upload", "resize")}
+        self._buffered = threading.BoundedSemaphore(max_buffered)
+        # Job key responsible for uploading each (content hash, folder) in this run
+        self._uploaders: dict[tuple[str, str], Any] = {}
+        self._uploaders_lock = threading.Lock()
+        # The stage pools belong to one run at a time
+        self._run_lock = threading.Lock()
+
+    def run(self, jobs: list[ImageJob]) -> dict[Any, Optional[str]]:
+        """
+        Ingest all images and wait for the results.
+
+        Concurrent calls, e.g. from phases running in parallel, are served one after another.
+
+        Args:
+            jobs (list[ImageJob]): The images to ingest.
+
+        Returns:
+            dict[Any, Optional[str]]: The final URL of every job by key, or None if it failed.
+        """
+        with self._run_lock:
+            return self._run(jobs)
+
+    def _run(self, jobs: list[ImageJob]) -> dict[Any, Optional[str]]:
+        results: dict[Any, Optional[str]] = {}
+        started = time.perf_counter()
+        # Images shared with an earlier run are reused through the cache, not through its job keys
+        with self._uploaders_lock:
+            self._uploaders.clear()
+        # In local mode every resize thread just waits for one worker process
+        resize_threads = self.resize_processes if self.local_resize else self.resize_workers
+        processes = ProcessPoolExecutor(self.resize_processes) if self.local_resize else None
+        with ThreadPoolExecutor(self.download_workers, thread_name_prefix="image-download") as downloads, \
+                ThreadPoolExecutor(self.upload_workers, thread_name_prefix="image-upload") as uploads, \
+                ThreadPoolExecutor(resize_threads, thread_name_prefix="image-resize") as resizes:
+            self._uploads = uploads
+            self._resizes = resizes
+            self._processes = processes
+            futures = [(job, downloads.submit(self._download_stage, job)) for job in jobs]
+            for job, future in futures:
+                results[job.key] = self._resolve(future)
+        if processes:
+            processes.shutdown()
+        for key, result in results.items():
+            if isinstance(result, _SameImageAs):
+                results[key] = results.get(result.key)
+        print(f"Processed {len(jobs)} images in {time.perf_counter() - started:.2f}s.")
+        return results
+
+    def print_stats(self) -> None:
+        """
+        Print the throughput and latency of every stage.
+        """
+        for stats in self.stats.values():
+            print(stats.summary())
+
+    def _resolve(self, future: Future) -> Optional[str]:
+        # Each stage returns the future of the next one, or the final URL / None
+        try:
+            result = future.result()
+            while isinstance(result, Future):
+                result = result.result()
+        except Exception as e:
+            print(f"Error processing image: {e}")
+            return None
+        return result
+
+    def _reuse(self, job: ImageJob, digest: str) -> Any:
+        # An uploaded URL or a marker if the image is already handled, None if this job uploads it
+        url = self.cache.uploaded_url(digest, job.folder)
+        if url:
+            return url
+        with self._uploaders_lock:
+            uploader = self._uploaders.setdefault((digest, job.folder), job.key)
+        return None if uploader == job.key else _SameImageAs(uploader)
+
+    def _download_stage(self, job: ImageJob) -> Any:
+        started = time.perf_counter()
+        content = None
+        digest = None
+        if self.cache:
+            digest = self.cache.lookup_url(job.url)
+            if digest:
+                reused = self._reuse(job, digest)
+                if reused is not None:
+                    self.stats["cache"].record(started, True)
+                    return reused
+                content = self.cache.get(digest)
+                if content is not None:
+                    self.stats["cache"].record(started, True, len(content))
+
+        self._buffered.acquire()
+        if content is None:
+            started = time.perf_counter()
+            try:
+                content = download_image(job.url, self.session)
+            except Exception:
+                self._buffered.release()
+                raise
+            self.stats["download"].record(started, content is not None, len(content or b""))
+            if content is None:
+                self._buffered.release()
+                return None
+            if self.cache:
+                digest = self.cache.put(job.url, content)
+                reused = self._reuse(job, digest)
+                if reused is not None:
+                    self._buffered.release()
+                    return reused
+
+        if digest:
+            # Content-addressed names make reruns overwrite instead of duplicating blobs
+            job.content_hash = digest
+            job.fileName = digest
+        if self.local_resize:
+            return self._resizes.submit(self._local_resize_stage, job, content)
+        return self._uploads.submit(self._upload_stage, job, content)
+
+    def _upload_stage(self, job: ImageJob, content: bytes) -> Optional[Future]:
+        started = time.perf_counter()
+        try:
+            blob = upload_image(self.bucket, content, job.folder, job.fileName)
+        except Exception as e:
+            print(f"Error uploading image {job.folder}/{job.fileName}: {e}")
+            self.stats["upload"].record(started, False)
+            return None
+        finally:
+            self._buffered.release()
+        self.stats["upload"].record(started, True, len(content))
+        return self._resizes.submit(self._resize_stage, job, blob)
+
+    def _resize_stage(self, job: ImageJob, blob: Any) -> Optional[str]:
+        started = time.perf_counter()
+        try:
+            url = wait_for_resized_image(self.bucket, blob, job.folder, job.fileName,
+                                         self.resize_timeout, self.poll_interval)
+        except Exception as e:
+            print(f"Error resolving URL for image {job.folder}/{job.fileName}: {e}")
+            self.stats["resize"].record(started, False)
+            return None
+        self.stats["resize"].record(started, True)
+        self._record_upload(job, f"{job.folder}/{job.fileName}_{RESIZED_SIZE}x{RESIZED_SIZE}.jpeg", url)
+        return url
+
+    def _local_resize_stage(self, job: ImageJob, content: bytes) -> Optional[Future]:
+        started = time.perf_counter()
+        try:
+            resized = self._processes.submit(resize_image, content).result()
+        except Exception as e:
+            print(f"Error resizing image {job.folder}/{job.fileName}: {e}")
+            self.stats["resize"].record(started, False)
+            self._buffered.release()
+            return None
+        self.stats["resize"].record(started, True, len(content))
+        return self._uploads.submit(self._upload_resized_stage, job, resized)
+
+    def _upload_resized_stage(self, job: ImageJob, resized: bytes) -> Optional[str]:
+        started = time.perf_counter()
+        try:
+            url = upload_resized_image(self.bucket, resized, job.folder, job.fileName)
+        except Exception as e:
+            print(f"Error uploading image {job.folder}/{job.fileName}: {e}")
+            self.stats["upload"].record(started, False)
+            return None
+        finally:
+            self._buffered.release()
+        self.stats["upload"].record(started, True, len(resized))
+        self._record_upload(job, f"{job.folder}/{job.fileName}_{RESIZED_SIZE}x{RESIZED_SIZE}.jpeg", url)
+        return url
+
+    def _record_upload(self, job: ImageJob, blob_name: str, url: str) -> None:
+        # Signed fallback URLs expire, so only public URLs are worth reusing
+        if self.cache and job.content_hash and url == public_url(self.bucket.name, blob_name):
+            self.cache.record_upload(job.content_hash, job.folder, blob_name, url)
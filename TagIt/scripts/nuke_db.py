@@ -6,6 +6,9 @@ This script performs a cleanup operation on Firebase services. Specifically, it:
 2. Deletes all files in specified Firebase Storage folders.
 3. Deletes all users from Firebase Authentication.
 
+Every collection, folder and the user deletion are recorded in a run journal once they are done, so
+an interrupted run can be restarted and continues with the remaining ones.
+
 WARNING: This script will permanently delete data. Use it with caution.
 
 Prerequisites:
@@ -14,8 +17,15 @@ Prerequisites:
 """
 
 import firebase_admin
-from firebase_admin import credentials, firestore, storage, auth
+from firebase_admin import credentials, firestore, storage
+import os
 from typing import List
+from auth_bulk import delete_users, list_user_ids
+from image_cache import ImageCache
+from run_journal import RunJournal, journal_path
+
+SCRIPT_DIR: str = os.path.dirname(os.path.abspath(__file__))
+IMAGE_CACHE_DIR: str = os.path.join(SCRIPT_DIR, ".image_cache")
 
 # Initialize Firebase Admin SDK
 SERVICE_ACCOUNT_PATH: str = "/Users/petertran/Downloads/tagit-39035-firebase-adminsdk-hugo8-9c33455468.json"
@@ -25,6 +35,9 @@ firebase_admin.initialize_app(cred, {'storageBucket': 'tagit-39035.appspot.com'}
 # Firestore database reference
 db = firestore.client()
 
+# Collections, folders and users already cleared by an interrupted run
+journal = RunJournal(journal_path("nuke_db"))
+
 # List of collections to clear
 collections_to_clear: List[str] = [
     "BarcodeItemReview",
@@ -44,13 +57,16 @@ folders_to_clear: List[str] = [
     "reviewImage/"
 ]
 
-def delete_collection(collection_name: str, batch_size: int = 500) -> None:
+def delete_collection(collection_name: str, batch_size: int = 500) -> bool:
     """
     Deletes all documents in a specified Firestore collection.
 
     Args:
         collection_name (str): The name of the Firestore collection to delete.
         batch_size (int): Number of documents to delete per batch. Defaults to 500.
+
+    Returns:
+        bool: True if every document was deleted, False if an error stopped the deletion.
     """
     collection_ref = db.collection(collection_name)
     try:
@@ -69,6 +85,8 @@ def delete_collection(collection_name: str, batch_size: int = 500) -> None:
                 break
     except Exception as e:
         print(f"Error deleting documents in {collection_name}: {e}")
+        return False
+    return True
 
 def delete_files_in_folders() -> None:
     """
@@ -77,6 +95,9 @@ def delete_files_in_folders() -> None:
     bucket = storage.bucket()
     try:
         for folder in folders_to_clear:
+            if journal.done("folder", folder):
+                print(f"Skipping folder {folder} (cleared by an earlier run)")
+                continue
             print(f"Deleting files in folder: {folder}")
             blobs = bucket.list_blobs(prefix=folder)
             deleted_count = 0
@@ -85,41 +106,55 @@ def delete_files_in_folders() -> None:
                 blob.delete()
                 deleted_count += 1
             print(f"Deleted {deleted_count} files from folder: {folder}")
+            journal.record("folder", folder)
     except Exception as e:
         print(f"Error deleting files in folders: {e}")
 
-def delete_all_users() -> None:
+    # Uploads recorded by set_dummy.py no longer exist
+    image_cache = ImageCache(IMAGE_CACHE_DIR)
+    image_cache.forget_uploads()
+    image_cache.save()
+
+def delete_all_users() -> bool:
     """
     Deletes all users from Firebase Authentication.
+
+    Returns:
+        bool: True if the users could be listed and deleted, False otherwise.
     """
     try:
         print("Fetching users from Firebase Authentication...")
-        users = auth.list_users().iterate_all()
-        deleted_count = 0
-        for user in users:
-            try:
-                print(f"Deleting user: {user.uid}")
-                auth.delete_user(user.uid)
-                deleted_count += 1
-            except Exception as e:
-                print(f"Error deleting user {user.uid}: {e}")
-        print(f"Deleted {deleted_count} users from Firebase Authentication.")
+        deleted_count, errors = delete_users(list_user_ids())
+        print(f"Deleted {deleted_count} users from Firebase Authentication, {len(errors)} failed.")
+        return not errors
     except Exception as e:
         print(f"Error fetching users from Firebase Authentication: {e}")
+        return False
 
 if __name__ == "__main__":
     print("WARNING: THIS WILL DELETE ALL DOCUMENTS, FILES, AND USERS IN THE TAG IT DB AND STORAGE.")
     confirmation: str = input("Are you sure you want to proceed? Type 'yes' to confirm: ").strip().lower()
     if confirmation == 'yes':
         for collection in collections_to_clear:
+            if journal.done("collection", collection):
+                print(f"Skipping collection {collection} (cleared by an earlier run)")
+                continue
             print(f"Clearing collection: {collection}")
-            delete_collection(collection)
+            if delete_collection(collection):
+                journal.record("collection", collection)
+            journal.flush()
         
         print("Clearing storage folders...")
         delete_files_in_folders()
+        journal.flush()
 
         print("Deleting users from Firebase Authentication...")
-        delete_all_users()
+        users_deleted = delete_all_users()
+
+        # Keep the journal while anything is left to resume
+        if (users_deleted and all(journal.done("collection", c) for c in collections_to_clear)
+                and all(journal.done("folder", f) for f in folders_to_clear)):
+            journal.clear()
 
         print("All specified collections, storage folders, and users have been cleared.")
     else:
@@ -0,0 +1,291 @@
+"""
+Phase Scheduler
+
+Small dependency-aware scheduler used by `set_dummy.py` to run the phases of a seeding run
+concurrently instead of one after another.
+
+Every phase is a function registered with the phases it depends on:
+
+- `after`: phases that must have finished; their return values are passed to the phase function
+  as positional arguments, in order.
+- `streams_from`: phases that only need to have started; records flow from them through a
+  `RecordChannel` while both run, so e.g. comments are written as soon as the deal they belong to
+  has been published instead of after the last deal.
+
+A phase that publishes to channels registers them with `channels`; the scheduler closes them when
+the phase finishes, fails or is skipped, so a consumer never waits forever for a record that will
+not come.
+
+Each phase runs in its own thread as soon as its dependencies allow. After the run, `print_timeline`
+prints when every phase started and finished and the critical path: the chain of phases that
+determined the total run time.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+# Width of the timeline bars in characters
+TIMELINE_WIDTH = 50
+
+class RecordChannel:
+    """
+    Thread-safe mapping of records published by a running phase to the phases streaming from it.
+
+    Args:
+        name (str): The name of the channel, used in log messages.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._records: dict[str, Any] = {}
+        self._closed = False
+        self._changed = threading.Condition()
+
+    def publish(self, key: str, value: Any = True) -> None:
+        """
+        Publish a record, waking up every consumer waiting for it.
+
+        Args:
+            key (str): The key consumers wait for, e.g. a document ID.
+            value (Any): The record or the part of it consumers need.
+        """
+        with self._changed:
+            self._records[key] = value
+            self._changed.notify_all()
+
+    def close(self) -> None:
+        """
+        Mark the channel as complete; waiting for an unpublished key returns None from now on.
+        """
+        with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+
+    def wait_for(self, key: str) -> Optional[Any]:
+        """
+        Wait until a record is published or the channel is closed.
+
+        Args:
+            key (str): The key to wait for.
+
+        Returns:
+            Optional[Any]: The published value, or None if the channel was closed without it.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: key in self._records or self._closed)
+            return self._records.get(key)
+
+    def publish_all(self, records: Iterable[dict], key: Callable[[dict], str],
+                    value: Callable[[dict], Any] = lambda record: True) -> Iterator[dict]:
+        """
+        Publish records while passing them on, closing the channel when the stream ends or fails.
+
+        Args:
+            records (Iterable[dict]): The records.
+            key (Callable[[dict], str]): Returns the key of a record.
+            value (Callable[[dict], Any]): Returns the value published for a record.
+
+        Returns:
+            Iterator[dict]: The unchanged records.
+        """
+        try:
+            for record in records:
+                self.publish(key(record), value(record))
+                yield record
+        finally:
+            self.close()
+
+    def gate(self, records: Iterable[dict], key: Callable[[dict], str]) -> Iterator[dict]:
+        """
+        Pass records on only once the record they depend on has been published.
+
+        Args:
+            records (Iterable[dict]): The dependent records.
+            key (Callable[[dict], str]): Returns the key a record depends on.
+
+        Returns:
+            Iterator[dict]: The records, in order.
+        """
+        for record in records:
+            self.wait_for(key(record))
+            yield record
+
+class Phase:
+    """
+    A unit of work of a scheduled run and its timing.
+    """
+
+    def __init__(self, name: str, func: Callable[..., Any], after: list[str], streams_from: list[str],
+                 channels: list[RecordChannel]):
+        self.name = name
+        self.func = func
+        self.after = after
+        self.streams_from = streams_from
+        self.channels = channels
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.skipped = False
+
+class PhaseScheduler:
+    """
+    Run phases in threads as soon as their dependencies allow.
+    """
+
+    def __init__(self):
+        self.phases: dict[str, Phase] = {}
+        self._origin = 0.0
+        self._changed = threading.Condition()
+
+    def add(self, name: str, func: Callable[..., Any], after: Iterable[str] = (),
+            streams_from: Iterable[str] = (), channels: Iterable[RecordChannel] = ()) -> None:
+        """
+        Register a phase.
+
+        Args:
+            name (str): The unique name of the phase.
+            func (Callable[..., Any]): The phase function, called with the results of `after`.
+            after (Iterable[str]): The phases that must finish before this one starts.
+            streams_from (Iterable[str]): The phases that must have started before this one starts.
+            channels (Iterable[RecordChannel]): The channels the phase publishes to, closed when it
+                finishes, fails or is skipped.
+        """
+        if name in self.phases:
+            raise ValueError(f"Phase {name} is already registered.")
+        self.phases[name] = Phase(name, func, list(after), list(streams_from), list(channels))
+
+    def run(self) -> dict[str, Any]:
+        """
+        Run every phase and wait for all of them.
+
+        Phases depending on a failed phase are skipped. The first error is raised once every other
+        phase has finished.
+
+        Returns:
+            dict[str, Any]: The result of every phase by name.
+        """
+        self._check()
+        self._origin = time.perf_counter()
+        threads: dict[str, threading.Thread] = {}
+        with self._changed:
+            while True:
+                for phase in self.phases.values():
+                    if phase.name in threads or phase.skipped:
+                        continue
+                    if any(self._failed(dep) for dep in phase.after + phase.streams_from):
+                        phase.skipped = True
+                        print(f"Skipping phase {phase.name}: a phase it depends on failed.")
+                        self._close_channels(phase)
+                        self._changed.notify_all()
+                    elif self._ready(phase):
+                        phase.started = time.perf_counter()
+                        thread = threading.Thread(target=self._run_phase, args=(phase,), name=f"phase-{phase.name}")
+                        threads[phase.name] = thread
+                        thread.start()
+                if all(phase.finished is not None or phase.skipped for phase in self.phases.values()):
+                    break
+                self._changed.wait()
+        for thread in threads.values():
+            thread.join()
+
+        errors = [phase.error for phase in self.phases.values() if phase.error]
+        if errors:
+            raise errors[0]
+        return {name: phase.result for name, phase in self.phases.items()}
+
+    def print_timeline(self) -> None:
+        """
+        Print when every phase ran and the critical path of the run.
+        """
+        ran = [phase for phase in self.phases.values() if phase.started is not None]
+        if not ran:
+            return
+        total = max(phase.finished for phase in ran) - self._origin
+        scale = TIMELINE_WIDTH / total if total > 0 else 0
+        width = max(len(phase.name) for phase in ran)
+        print("Phase timeline:")
+        for phase in sorted(ran, key=lambda p: p.started):
+            start = phase.started - self._origin
+            end = phase.finished - self._origin
+            offset = int(start * scale)
+            bar = "#" * max(1, int(end * scale) - offset)
+            status = "failed" if phase.error else f"{end - start:.2f}s"
+            print(f"  {phase.name:<{width}} |{' ' * offset}{bar:<{TIMELINE_WIDTH - offset}}| "
+                  f"{start:7.2f}s -> {end:7.2f}s ({status})")
+        path = self.critical_path()
+        print(f"Critical path ({total:.2f}s): {' -> '.join(path)}")
+
+    def critical_path(self) -> list[str]:
+        """
+        Get the chain of phases that determined the run time.
+
+        Starting from the phase that finished last, each step goes to the dependency that released
+        it: the last `after` phase to finish, or the last `streams_from` phase to finish before it.
+
+        Returns:
+            list[str]: The phase names, first to last.
+        """
+        ran = [phase for phase in self.phases.values() if phase.finished is not None]
+        if not ran:
+            return []
+        phase = max(ran, key=lambda p: p.finished)
+        path = [phase.name]
+        while True:
+            deps = [self.phases[name] for name in phase.after + phase.streams_from]
+            deps = [dep for dep in deps if dep.finished is not None and dep.finished <= phase.finished]
+            if not deps:
+                break
+            phase = max(deps, key=lambda p: p.finished)
+            path.append(phase.name)
+        return path[::-1]
+
+    def _check(self) -> None:
+        # Unknown names and cycles would leave phases waiting forever
+        for phase in self.phases.values():
+            for dep in phase.after + phase.streams_from:
+                if dep not in self.phases:
+                    raise ValueError(f"Phase {phase.name} depends on unknown phase {dep}.")
+        visiting: set[str] = set()
+        done: set[str] = set()
+
+        def visit(name: str) -> None:
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Phase dependencies form a cycle through {name}.")
+            visiting.add(name)
+            phase = self.phases[name]
+            for dep in phase.after + phase.streams_from:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.phases:
+            visit(name)
+
+    def _ready(self, phase: Phase) -> bool:
+        # Caller holds the condition
+        return (all(self.phases[dep].finished is not None for dep in phase.after)
+                and all(self.phases[dep].started is not None for dep in phase.streams_from))
+
+    def _close_channels(self, phase: Phase) -> None:
+        for channel in phase.channels:
+            channel.close()
+
+    def _failed(self, name: str) -> bool:
+        dep = self.phases[name]
+        return dep.error is not None or dep.skipped
+
+    def _run_phase(self, phase: Phase) -> None:
+        try:
+            phase.result = phase.func(*(self.phases[dep].result for dep in phase.after))
+        except BaseException as e:
+            print(f"Phase {phase.name} failed: {e}")
+            phase.error = e
+        # Consumers still waiting for records of a failed phase must wake up to fail or finish too
+        self._close_channels(phase)
+        with self._changed:
+            phase.finished = time.perf_counter()
+            self._changed.notify_all()
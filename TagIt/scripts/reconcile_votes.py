@@ -0,0 +1,188 @@
+"""
+Vote Counter Reconciliation
+
+Deals and UserComments keep denormalized `upvote` / `downvote` counters that the app updates
+separately from the Votes documents, so the two drift apart over time (failed or duplicated counter
+updates, votes changed from another device, ...). This job recounts the votes and fixes the counters.
+
+1. Streams Votes once, projecting only `itemId`, `itemType` and `voteType`, and counts the upvotes
+   and downvotes of every (itemType, itemId).
+2. Streams Deals and UserComments, projecting only the counters, and compares them with the counts.
+3. Prints drift statistics and, unless `--dry-run` is given, writes the correct counters of the
+   drifted items in batches.
+
+The counters are set to absolute values, so votes cast while the job runs can cause a small new
+drift; run it when traffic is low, or run it again.
+
+Usage:
+
+    python reconcile_votes.py [--dry-run] [--report drift_report.json]
+
+Dependencies:
+- Firebase Admin SDK service account JSON file.
+- Permissions to access Firestore.
+"""
+
+import argparse
+import json
+import os
+from collections import defaultdict
+from typing import Optional
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from firestore_batch import BatchWriter
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_ACCOUNT_PATH = os.path.join(SCRIPT_DIR, "tagit-39035-firebase-adminsdk-hugo8-9c33455468.json")
+
+# Initialize Firebase Admin SDK
+cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
+firebase_admin.initialize_app(cred)
+
+# Firestore database reference
+db: firestore.Client = firestore.client()
+
+# Collections with vote counters, by vote itemType
+COUNTER_COLLECTIONS = {
+    1: "Deals",
+    0: "UserComments",
+}
+
+# Number of the most drifted items printed and reported
+TOP_DRIFTED = 10
+
+def count_votes(db: firestore.Client) -> tuple[dict[int, dict[str, list[int]]], int]:
+    """
+    Count the upvotes and downvotes of every item in one pass over Votes.
+
+    Args:
+        db (firestore.Client): The Firestore client.
+
+    Returns:
+        tuple[dict[int, dict[str, list[int]]], int]: The [upvotes, downvotes] by item ID for every
+            itemType with counters, and the number of votes read.
+    """
+    counts = {item_type: defaultdict(lambda: [0, 0]) for item_type in COUNTER_COLLECTIONS}
+    read = 0
+    for doc in db.collection("Votes").select(["itemId", "itemType", "voteType"]).stream():
+        read += 1
+        vote = doc.to_dict()
+        item_counts = counts.get(vote.get("itemType"))
+        if item_counts is None:
+            continue
+        if vote.get("voteType") == "upvote":
+            item_counts[vote.get("itemId")][0] += 1
+        elif vote.get("voteType") == "downvote":
+            item_counts[vote.get("itemId")][1] += 1
+    print(f"Counted {read} Votes.")
+    return counts, read
+
+def find_drift(db: firestore.Client, collection: str, counts: dict[str, list[int]]) -> dict:
+    """
+    Compare the stored counters of a collection with the vote counts.
+
+    Args:
+        db (firestore.Client): The Firestore client.
+        collection (str): The collection with `upvote` / `downvote` counters.
+        counts (dict[str, list[int]]): The [upvotes, downvotes] by item ID.
+
+    Returns:
+        dict: The drift statistics of the collection, with the correct counters of every drifted
+            item under `fixes`.
+    """
+    seen = set()
+    fixes = {}
+    drifts = []
+    upvote_drift = 0
+    downvote_drift = 0
+    for doc in db.collection(collection).select(["upvote", "downvote"]).stream():
+        seen.add(doc.id)
+        stored = doc.to_dict()
+        upvotes, downvotes = counts.get(doc.id, (0, 0))
+        up_diff = (stored.get("upvote") or 0) - upvotes
+        down_diff = (stored.get("downvote") or 0) - downvotes
+        # A missing counter is drift even if the count is 0
+        if up_diff or down_diff or "upvote" not in stored or "downvote" not in stored:
+            fixes[doc.id] = {"upvote": upvotes, "downvote": downvotes}
+            drifts.append((abs(up_diff) + abs(down_diff), doc.id, up_diff, down_diff))
+            upvote_drift += abs(up_diff)
+            downvote_drift += abs(down_diff)
+
+    # Votes on items that no longer exist cannot be reconciled here
+    orphaned = sum(1 for item_id in counts if item_id not in seen)
+    drifts.sort(reverse=True)
+    return {
+        "collection": collection,
+        "checked": len(seen),
+        "drifted": len(fixes),
+        "upvoteDrift": upvote_drift,
+        "downvoteDrift": downvote_drift,
+        "maxDrift": drifts[0][0] if drifts else 0,
+        "orphanedVoteItems": orphaned,
+        "top": [
+            {"id": item_id, "upvoteDiff": up_diff, "downvoteDiff": down_diff}
+            for _, item_id, up_diff, down_diff in drifts[:TOP_DRIFTED]
+        ],
+        "fixes": fixes,
+    }
+
+def print_drift(stats: dict) -> None:
+    """
+    Print the drift statistics of a collection.
+
+    Args:
+        stats (dict): The statistics from `find_drift`.
+    """
+    checked = stats["checked"]
+    share = stats["drifted"] / checked * 100 if checked else 0
+    print(f"{stats['collection']}: {stats['drifted']} of {checked} items drifted ({share:.1f}%), "
+          f"upvote drift {stats['upvoteDrift']}, downvote drift {stats['downvoteDrift']}, "
+          f"max drift {stats['maxDrift']}, {stats['orphanedVoteItems']} voted items missing.")
+    for item in stats["top"]:
+        print(f"  {item['id']}: upvote {item['upvoteDiff']:+d}, downvote {item['downvoteDiff']:+d}")
+
+def reconcile_votes(db: firestore.Client, dry_run: bool = False, report_path: Optional[str] = None) -> list[dict]:
+    """
+    Recount the votes of every deal and comment and fix the counters that drifted.
+
+    Args:
+        db (firestore.Client): The Firestore client.
+        dry_run (bool): Only measure the drift, without writing.
+        report_path (Optional[str]): Optional path of a JSON report of the drift statistics.
+
+    Returns:
+        list[dict]: The drift statistics of every collection.
+    """
+    counts, _ = count_votes(db)
+    all_stats = []
+    for item_type, collection in COUNTER_COLLECTIONS.items():
+        stats = find_drift(db, collection, counts[item_type])
+        print_drift(stats)
+        all_stats.append(stats)
+
+    if report_path:
+        with open(report_path, "w") as f:
+            json.dump([{key: value for key, value in stats.items() if key != "fixes"} for stats in all_stats], f, indent=4)
+        print(f"Wrote drift report to {report_path}")
+
+    if dry_run:
+        print("Dry run: no counters were written.")
+        return all_stats
+
+    with BatchWriter(db) as writer:
+        for stats in all_stats:
+            for item_id, counters in stats["fixes"].items():
+                writer.update(stats["collection"], item_id, counters)
+        failed = writer.flush()
+    fixed = sum(stats["drifted"] for stats in all_stats) - len(failed)
+    print(f"Fixed the counters of {fixed} items, {len(failed)} failed.")
+    return all_stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile the upvote/downvote counters of deals and comments with Votes.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report the drift, without writing.")
+    parser.add_argument("--report", help="Write the drift statistics to this JSON file.")
+    args = parser.parse_args()
+    reconcile_votes(db, dry_run=args.dry_run, report_path=args.report)
@@ -0,0 +1,218 @@
+"""
+Run Journal
+
+Append-only local journal of the units of work a script has finished, shared by `set_dummy.py`,
+`delete_dummy.py` and `nuke_db.py` so a run that dies halfway (quota error, dropped connection) can
+be rerun and skip everything that was already done.
+
+Every unit has a kind (e.g. `doc`, `image`, `auth`, `phase`), a key (e.g. `Deals/deal1`) and an
+optional value (e.g. the URL an image was uploaded as). Units are appended to the journal file as
+tab-separated lines and kept in memory as a hash map, so checking a unit is O(1).
+
+Appends are buffered and written every `flush_every` units or on `flush`. A crash can lose at most
+the unflushed tail, whose units are simply redone on the next run; a half-written last line is
+ignored when the journal is loaded. Once the file holds `compact_every` lines more than the last
+compaction left, it is rewritten with one line per unit. Scripts `clear` their journal after a run
+completed successfully.
+
+Journals are stored in `scripts/.journal/`.
+"""
+
+import os
+import threading
+from typing import Iterator, Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+JOURNAL_DIR = os.path.join(SCRIPT_DIR, ".journal")
+
+# Units buffered in memory before they are appended to the file
+FLUSH_EVERY = 500
+
+# Lines appended since the last compaction that trigger a rewrite of the file
+COMPACT_EVERY = 100_000
+
+def journal_path(name: str) -> str:
+    """
+    Get the path of a script's journal.
+
+    Args:
+        name (str): The name of the journal, usually the script name.
+
+    Returns:
+        str: The path of the journal file.
+    """
+    return os.path.join(JOURNAL_DIR, f"{name}.journal")
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+def _unescape(text: str) -> str:
+    if "\\" not in text:
+        return text
+    return text.replace("\\\\", "\0").replace("\\t", "\t").replace("\\n", "\n").replace("\0", "\\")
+
+class RunJournal:
+    """
+    Append-only, periodically compacted journal of completed units of work.
+
+    Args:
+        path (str): The journal file.
+        flush_every (int): The number of buffered units that triggers a write.
+        compact_every (int): The number of appended lines that triggers a compaction.
+    """
+
+    def __init__(self, path: str, flush_every: int = FLUSH_EVERY, compact_every: int = COMPACT_EVERY):
+        self.path = path
+        self.flush_every = flush_every
+        self.compact_every = compact_every
+        self._units: dict[tuple[str, str], str] = {}
+        self._pending: list[str] = []
+        self._appended = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._units)
+
+    def __enter__(self) -> "RunJournal":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.flush()
+
+    def done(self, kind: str, key: str) -> bool:
+        """
+        Check if a unit was completed by this or an earlier run.
+
+        Args:
+            kind (str): The kind of unit.
+            key (str): The key of the unit.
+
+        Returns:
+            bool: True if the unit is in the journal.
+        """
+        with self._lock:
+            return (kind, key) in self._units
+
+    def get(self, kind: str, key: str) -> Optional[str]:
+        """
+        Get the value recorded with a completed unit.
+
+        Args:
+            kind (str): The kind of unit.
+            key (str): The key of the unit.
+
+        Returns:
+            Optional[str]: The value, or None if the unit is not in the journal.
+        """
+        with self._lock:
+            return self._units.get((kind, key))
+
+    def keys(self, kind: str) -> Iterator[str]:
+        """
+        List the keys of every completed unit of a kind.
+
+        Args:
+            kind (str): The kind of unit.
+
+        Returns:
+            Iterator[str]: The keys.
+        """
+        with self._lock:
+            keys = [key for unit_kind, key in self._units if unit_kind == kind]
+        return iter(keys)
+
+    def record(self, kind: str, key: str, value: str = "") -> None:
+        """
+        Record a completed unit.
+
+        Args:
+            kind (str): The kind of unit.
+            key (str): The key of the unit.
+            value (str): An optional value to remember with the unit.
+        """
+        with self._lock:
+            if self._units.get((kind, key)) == value:
+                return
+            self._units[(kind, key)] = value
+            self._pending.append(f"{_escape(kind)}\t{_escape(key)}\t{_escape(value)}\n")
+            if len(self._pending) < self.flush_every:
+                return
+            self._write_pending()
+
+    def flush(self) -> None:
+        """
+        Append every buffered unit to the journal file.
+        """
+        with self._lock:
+            self._write_pending()
+
+    def compact(self) -> None:
+        """
+        Rewrite the journal file with exactly one line per unit.
+        """
+        with self._lock:
+            self._compact()
+
+    def clear(self) -> None:
+        """
+        Forget every unit and delete the journal file, e.g. after a successful run.
+        """
+        with self._lock:
+            self._units.clear()
+            self._pending.clear()
+            self._appended = 0
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        torn = False
+        with open(self.path, "r") as f:
+            for line in f:
+                # A line without its newline was cut off by a crash
+                if not line.endswith("\n"):
+                    torn = True
+                    break
+                parts = line[:-1].split("\t")
+                if len(parts) != 3:
+                    continue
+                kind, key, value = (_unescape(part) for part in parts)
+                self._units[(kind, key)] = value
+                lines += 1
+        self._appended = lines - len(self._units)
+        if torn:
+            # Appending after the cut-off line would corrupt the next unit
+            self._compact()
+        if lines:
+            print(f"Loaded {len(self._units)} completed units from journal {self.path}.")
+
+    def _write_pending(self) -> None:
+        # Caller holds the lock
+        if not self._pending:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a") as f:
+            f.writelines(self._pending)
+            f.flush()
+            os.fsync(f.fileno())
+        self._appended += len(self._pending)
+        self._pending = []
+        if self._appended >= self.compact_every:
+            self._compact()
+
+    def _compact(self) -> None:
+        # Caller holds the lock
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            for (kind, key), value in self._units.items():
+                f.write(f"{_escape(kind)}\t{_escape(key)}\t{_escape(value)}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._pending = []
+        self._appended = 0
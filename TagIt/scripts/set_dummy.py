@@ -90,17 +90,45 @@ import json
 from datetime import datetime, timedelta
 import os
 import random
-import requests
+import sys
 from io import BytesIO
 import uuid
-import time
 from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+from typing import Iterable, Iterator, Optional
+from auth_bulk import hash_password, import_users, password_import_hash
+from firestore_batch import READ_CHUNK_SIZE, BatchWriter, DocumentIndex, chunked
+from image_cache import ImageCache
+from image_pipeline import ImageJob, ImagePipeline
+from phase_scheduler import PhaseScheduler, RecordChannel
+from run_journal import RunJournal, journal_path
+from validate_seed import validate_seed, write_report
+from vote_sampler import SampledVotes, sample_votes
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 SERVICE_ACCOUNT_PATH = os.path.join(SCRIPT_DIR, "tagit-39035-firebase-adminsdk-hugo8-9c33455468.json")
 JSON_FILE_PATH = os.path.join(SCRIPT_DIR, "dummy_data.json")
+VALIDATION_REPORT_PATH = os.path.join(SCRIPT_DIR, "seed_validation_report.json")
 BUCKET_NAME = 'tagit-39035.appspot.com'
 
+# Write pipeline settings: documents per Firestore write batch and batches committed concurrently
+WRITE_BATCH_SIZE = 500
+WRITE_MAX_IN_FLIGHT = 4
+
+# Image pipeline settings: concurrent downloads, uploads and images waiting for their resize
+IMAGE_DOWNLOAD_WORKERS = 8
+IMAGE_UPLOAD_WORKERS = 4
+IMAGE_RESIZE_WORKERS = 16
+
+# Worker processes used when images are resized locally instead of by the Resize Images extension
+IMAGE_RESIZE_PROCESSES = os.cpu_count()
+
+# Local content-addressed cache of downloaded and uploaded images, shared by reruns
+IMAGE_CACHE_DIR = os.path.join(SCRIPT_DIR, ".image_cache")
+IMAGE_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# Records whose images are processed together when streaming NDJSON input
+STREAM_IMAGE_CHUNK_SIZE = 200
+
 # Initialize Firebase Admin SDK
 cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
 firebase_admin.initialize_app(cred, {'storageBucket': BUCKET_NAME})
@@ -115,59 +143,6 @@ class ImageFolder:
     PRODUCT_IMAGE = "productImage"
     REVIEW_IMAGE = "reviewImage"
 
-def download_image(url: str) -> bytes:
-    """
-    Download an image from a given URL.
-
-    Args:
-        url (str): The URL of the image to download.
-
-    Returns:
-        bytes: The content of the image if downloaded successfully, otherwise None.
-    """
-    print(f"Downloading image from URL: {url}")
-    response = requests.get(url)
-    if response.status_code != 200:
-        print(f"Error downloading image from URL: {url}")
-        return None
-    return response.content
-
-def upload_image_to_storage(image_content: bytes, folder: str, fileName: str, timeout: int = 30) -> str:
-    """
-    Upload an image to Firebase Storage and return the public URL of the resized image.
-
-    Args:
-        image_content (bytes): The content of the image to upload.
-        folder (str): The folder in Firebase Storage to upload the image to.
-        fileName (str): The name of the file to upload.
-        timeout (int): The timeout for polling the resized image.
-
-    Returns:
-        str: The public URL of the resized image.
-    """
-    print(f"Uploading image to folder: {folder}, file name: {fileName}")
-    bucket = storage.bucket()
-    original_blob = bucket.blob(f"{folder}/{fileName}.jpg")
-    original_blob.upload_from_string(image_content, content_type='image/jpeg')
-
-    # Poll for resized image
-    resized_blob = bucket.blob(f"{folder}/{fileName}_1080x1080.jpeg")
-    elapsed_time = 0
-    interval = 2  # Check every 2 seconds
-    while elapsed_time < timeout:
-        if resized_blob.exists():
-            # Use Firebase public URL for resized image
-            resized_url = f"https://firebasestorage.googleapis.com/v0/b/{BUCKET_NAME}/o/{folder}%2F{fileName}_1080x1080.jpeg?alt=media"
-            print(f"Resized image found. Public URL: {resized_url}")
-            return resized_url
-        time.sleep(interval)
-        elapsed_time += interval
-
-    # Fallback to original image signed URL
-    original_url = original_blob.generate_signed_url(timedelta(seconds=300))
-    print(f"Resized image not found after {timeout} seconds. Using original image URL: {original_url}")
-    return original_url
-
 def generate_date_range() -> list[str]:
     """
     Generate a date range from the current date to 6 days ago.
@@ -190,7 +165,7 @@ def generate_date_range() -> list[str]:
 
     return date_range
 
-def load_and_replace_json(file_path: str, update_existing: bool, process_images: bool, db: firestore.Client) -> dict:
+def load_and_replace_json(file_path: str, update_existing: bool, process_images: bool, db: firestore.Client, index: DocumentIndex, pipeline: Optional[ImagePipeline] = None, journal: Optional[RunJournal] = None) -> dict:
     """
     Load JSON file and replace placeholders with actual data.
 
@@ -199,6 +174,9 @@ def load_and_replace_json(file_path: str, update_existing: bool, process_images:
         update_existing (bool): Whether to update existing entries.
         process_images (bool): Whether to process images.
         db (firestore.Client): The Firestore client.
+        index (DocumentIndex): The run-wide document existence cache.
+        pipeline (Optional[ImagePipeline]): The image pipeline, required when processing images.
+        journal (Optional[RunJournal]): The run journal, to skip and record finished work.
 
     Returns:
         dict: The loaded and processed JSON data.
@@ -209,29 +187,9 @@ def load_and_replace_json(file_path: str, update_existing: bool, process_images:
     # Process images only if the user opted in
     if process_images:
         print("Processing images...")
-        for profile in data["UserProfile"]:
-            doc_id = profile["id"]
-            if not document_exists("UserProfile", doc_id, db) or update_existing:
-                image_content = download_image(profile["avatarURL"])
-                if image_content:
-                    fileName = f"{uuid.uuid4()}"
-                    profile["avatarURL"] = upload_image_to_storage(image_content, ImageFolder.AVATAR, fileName)
-                else:
-                    print(f"Skipping profile {doc_id} due to image download error.")
-            else:
-                print(f"Skipping image processing for existing UserProfile: {doc_id}")
-
-        for deal in data["Deals"]:
-            doc_id = deal["id"]
-            if not document_exists("Deals", doc_id, db) or update_existing:
-                image_content = download_image(deal["photoURL"])
-                if image_content:
-                    fileName = f"{uuid.uuid4()}"
-                    deal["photoURL"] = upload_image_to_storage(image_content, ImageFolder.DEAL_IMAGE, fileName)
-                else:
-                    print(f"Skipping deal {doc_id} due to image download error.")
-            else:
-                print(f"Skipping image processing for existing Deal: {doc_id}")
+        index.prefetch("UserProfile", [profile["id"] for profile in data["UserProfile"]])
+        index.prefetch("Deals", [deal["id"] for deal in data["Deals"]])
+        process_record_images(data["UserProfile"], data["Deals"], update_existing, index, pipeline, journal)
     else:
         print("Skipping image processing as per user choice.")
 
@@ -246,6 +204,81 @@ def load_and_replace_json(file_path: str, update_existing: bool, process_images:
 
     return data
 
+def create_image_pipeline(local_resize: bool) -> ImagePipeline:
+    """
+    Create the image pipeline shared by all image processing of a run.
+
+    Args:
+        local_resize (bool): Whether to resize images locally and upload only the 1080x1080 variant.
+
+    Returns:
+        ImagePipeline: The image pipeline, backed by the on-disk image cache.
+    """
+    return ImagePipeline(
+        storage.bucket(),
+        download_workers=IMAGE_DOWNLOAD_WORKERS,
+        upload_workers=IMAGE_UPLOAD_WORKERS,
+        resize_workers=IMAGE_RESIZE_WORKERS,
+        local_resize=local_resize,
+        resize_processes=IMAGE_RESIZE_PROCESSES,
+        cache=ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES),
+    )
+
+def finish_image_pipeline(pipeline: ImagePipeline) -> None:
+    """
+    Persist the image cache manifest and print the pipeline statistics.
+
+    Args:
+        pipeline (ImagePipeline): The image pipeline of the run.
+    """
+    pipeline.cache.save()
+    pipeline.print_stats()
+
+def process_record_images(profiles: list[dict], deals: list[dict], update_existing: bool, index: DocumentIndex, pipeline: ImagePipeline, journal: Optional[RunJournal] = None) -> None:
+    """
+    Download and upload the avatar and deal images through the concurrent image pipeline.
+
+    Records are updated in place with the URLs of the uploaded images. Images already processed by
+    an interrupted run are taken from the journal.
+
+    Args:
+        profiles (list[dict]): The user profiles whose `avatarURL` should be processed.
+        deals (list[dict]): The deals whose `photoURL` should be processed.
+        update_existing (bool): Whether to process images of documents that already exist.
+        index (DocumentIndex): The run-wide document existence cache.
+        pipeline (ImagePipeline): The image pipeline to run the images through.
+        journal (Optional[RunJournal]): The run journal, to skip and record finished work.
+    """
+    targets = [
+        ("UserProfile", "UserProfile", profiles, "avatarURL", ImageFolder.AVATAR),
+        ("Deals", "Deal", deals, "photoURL", ImageFolder.DEAL_IMAGE),
+    ]
+    jobs = []
+    records = {}
+    for collection, label, records_list, url_field, folder in targets:
+        for record in records_list:
+            doc_id = record["id"]
+            if not index.exists(collection, doc_id) or update_existing:
+                journaled_url = journal.get("image", f"{collection}/{doc_id}") if journal else None
+                if journaled_url:
+                    record[url_field] = journaled_url
+                    continue
+                key = (collection, doc_id)
+                records[key] = (record, url_field, label)
+                jobs.append(ImageJob(key, record[url_field], folder, f"{uuid.uuid4()}"))
+            else:
+                print(f"Skipping image processing for existing {label}: {doc_id}")
+
+    results = pipeline.run(jobs)
+    for key, url in results.items():
+        record, url_field, label = records[key]
+        if url:
+            record[url_field] = url
+            if journal:
+                journal.record("image", f"{key[0]}/{key[1]}", url)
+        else:
+            print(f"Skipping {label.lower()} {record['id']} due to image download error.")
+
 def replace_timestamps(deals: list[dict]) -> list[dict]:
     """
     Recursively replace `__SERVER_TIMESTAMP__` with generated dates.
@@ -318,6 +351,167 @@ def replace_comment_timestamps(data: dict, deal_timestamps: dict[str, datetime])
 
     return data
 
+def stream_ndjson(file_path: str) -> Iterator[dict]:
+    """
+    Stream the records of an NDJSON file, one JSON object per line.
+
+    Args:
+        file_path (str): The path to the NDJSON file.
+
+    Returns:
+        Iterator[dict]: The records, read lazily.
+    """
+    with open(file_path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def stream_record_images(records: Iterable[dict], collection: str, update_existing: bool, index: DocumentIndex, pipeline: ImagePipeline, journal: Optional[RunJournal] = None) -> Iterator[dict]:
+    """
+    Run the images of streamed records through the image pipeline, one chunk at a time.
+
+    Args:
+        records (Iterable[dict]): The UserProfile or Deals records.
+        collection (str): The collection of the records, `UserProfile` or `Deals`.
+        update_existing (bool): Whether to process images of documents that already exist.
+        index (DocumentIndex): The run-wide document existence cache.
+        pipeline (ImagePipeline): The image pipeline.
+        journal (Optional[RunJournal]): The run journal, to skip and record finished work.
+
+    Returns:
+        Iterator[dict]: The records with their image URLs replaced.
+    """
+    for chunk in chunked(records, STREAM_IMAGE_CHUNK_SIZE):
+        index.prefetch(collection, [record["id"] for record in chunk])
+        if collection == "UserProfile":
+            process_record_images(chunk, [], update_existing, index, pipeline, journal)
+        else:
+            process_record_images([], chunk, update_existing, index, pipeline, journal)
+        yield from chunk
+
+def stream_deal_timestamps(deals: Iterable[dict], deal_timestamps: dict[str, datetime]) -> Iterator[dict]:
+    """
+    Replace deal timestamps on the fly, like `replace_timestamps`, and index them by deal ID.
+
+    `__SERVER_TIMESTAMP__` placeholders get the dates of the last week in order; ISO strings are parsed.
+
+    Args:
+        deals (Iterable[dict]): The deals.
+        deal_timestamps (dict[str, datetime]): The index to record every deal's timestamp in.
+
+    Returns:
+        Iterator[dict]: The deals with their `dateTime` set.
+    """
+    date_range = generate_date_range()
+    date_index = 0
+    for deal in deals:
+        value = deal.get("dateTime")
+        if value == "__SERVER_TIMESTAMP__":
+            if date_index < len(date_range):
+                value = datetime.fromisoformat(date_range[date_index])
+                date_index += 1
+            else:
+                value = datetime.now()
+        elif isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        deal["dateTime"] = value
+        deal_timestamps[deal["id"]] = value
+        yield deal
+
+def stream_comment_timestamps(comments: Iterable[dict], deal_timestamps: dict[str, datetime]) -> Iterator[dict]:
+    """
+    Replace comment timestamps on the fly, like `replace_comment_timestamps`.
+
+    Placeholders become 1-12 hours after the commented deal; ISO strings are parsed.
+
+    Args:
+        comments (Iterable[dict]): The comments, streamed after all deals.
+        deal_timestamps (dict[str, datetime]): The deal timestamps recorded by `stream_deal_timestamps`.
+
+    Returns:
+        Iterator[dict]: The comments with their `dateTime` set.
+    """
+    for comment in comments:
+        value = comment.get("dateTime")
+        if value == "__SERVER_TIMESTAMP__":
+            deal_timestamp = deal_timestamps.get(comment["itemID"])
+            if deal_timestamp:
+                value = deal_timestamp + timedelta(hours=random.randint(1, 12))
+            else:
+                # Fallback if no deal timestamp exists
+                value = datetime.now()
+        elif isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        comment["dateTime"] = value
+        yield comment
+
+def load_ndjson_collections(dir_path: str, update_existing: bool, process_images: bool, db: firestore.Client, index: DocumentIndex, pipeline: Optional[ImagePipeline] = None, deal_channel: Optional[RecordChannel] = None, journal: Optional[RunJournal] = None) -> dict[str, Iterator[dict]]:
+    """
+    Open a directory of per-collection NDJSON files as lazy record streams.
+
+    The directory holds `UserProfile.ndjson`, `Stores.ndjson`, `Deals.ndjson`, `UserComments.ndjson` and
+    optionally `Votes.ndjson`. Records are read, have their images and timestamps replaced and are
+    handed to the populate steps one by one; only the deal → timestamp index is kept in memory.
+    Deals must be consumed before comments, unless a deal channel is passed: comments then wait
+    for their deal to be published before their timestamp is derived from it.
+
+    Args:
+        dir_path (str): The directory with the NDJSON files.
+        update_existing (bool): Whether to update existing entries.
+        process_images (bool): Whether to process images.
+        db (firestore.Client): The Firestore client.
+        index (DocumentIndex): The run-wide document existence cache.
+        pipeline (Optional[ImagePipeline]): The image pipeline, required when processing images.
+        deal_channel (Optional[RecordChannel]): The channel the deals are published to while they are written.
+        journal (Optional[RunJournal]): The run journal, to skip and record finished work.
+
+    Returns:
+        dict[str, Iterator[dict]]: The record stream of every collection found.
+    """
+    def path(collection: str) -> str:
+        return os.path.join(dir_path, f"{collection}.ndjson")
+
+    deal_timestamps: dict[str, datetime] = {}
+    comments = stream_ndjson(path("UserComments"))
+    if deal_channel:
+        comments = deal_channel.gate(comments, key=lambda comment: comment["itemID"])
+    profiles = stream_ndjson(path("UserProfile"))
+    deals = stream_ndjson(path("Deals"))
+    if process_images:
+        profiles = stream_record_images(profiles, "UserProfile", update_existing, index, pipeline, journal)
+        deals = stream_record_images(deals, "Deals", update_existing, index, pipeline, journal)
+    else:
+        print("Skipping image processing as per user choice.")
+
+    collections = {
+        "UserProfile": profiles,
+        "Stores": stream_ndjson(path("Stores")),
+        "Deals": stream_deal_timestamps(deals, deal_timestamps),
+        "UserComments": stream_comment_timestamps(comments, deal_timestamps),
+    }
+    if os.path.exists(path("Votes")):
+        collections["Votes"] = stream_ndjson(path("Votes"))
+    return collections
+
+def collect_vote_items(records: Iterable[dict], item_type: str, items: list[tuple[str, str, int, int, str]]) -> Iterator[dict]:
+    """
+    Pass records through while recording what vote generation needs from each of them.
+
+    The owner is recorded as it appears in the input; pass the username map to
+    `generate_votes_from_items` to resolve usernames to user IDs.
+
+    Args:
+        records (Iterable[dict]): The deals or comments.
+        item_type (str): The item type, `deal` or `comment`.
+        items (list[tuple[str, str, int, int, str]]): The list to append (id, type, upvotes, downvotes, owner) to.
+
+    Returns:
+        Iterator[dict]: The unchanged records.
+    """
+    for record in records:
+        items.append((record["id"], item_type, record.get("upvote", 0), record.get("downvote", 0), record.get("userID", "")))
+        yield record
+
 def document_exists(collection: str, doc_id: str, db: firestore.Client) -> bool:
     """
     Check if a document already exists in a Firestore collection.
@@ -358,136 +552,178 @@ def update_collection(collection_name: str, data_list: list[dict], db: firestore
         else:
             print(f"Skipped {collection_name}: {doc_id} (does not exist)")
 
-def populate_user_profiles(user_profiles: list[dict], db: firestore.Client) -> tuple[dict[str, str], dict[str, str]]:
+def preload_index(index: DocumentIndex) -> None:
+    """
+    Preload the collections every deal, comment and vote refers to.
+
+    Stores are loaded by ID and UserProfile with the usernames, one query each, so resolving and
+    validating references costs no reads per record and also finds documents of earlier runs.
+
+    Args:
+        index (DocumentIndex): The run-wide document existence cache.
+    """
+    index.load("Stores")
+    index.load("UserProfile", ["username"])
+
+def populate_user_profiles(user_profiles: Iterable[dict], db: firestore.Client, writer: BatchWriter, index: DocumentIndex) -> tuple[dict[str, str], dict[str, str], list[str]]:
     """
     Populate UserProfile collection and create a mapping of usernames to IDs.
 
     Args:
-        user_profiles (list[dict]): The list of user profiles to populate.
+        user_profiles (Iterable[dict]): The user profiles to populate.
         db (firestore.Client): The Firestore client.
+        writer (BatchWriter): The batched write pipeline to queue the writes on.
+        index (DocumentIndex): The run-wide document existence cache.
 
     Returns:
-        tuple[dict[str, str], dict[str, str]]: Mappings of usernames to IDs and IDs to IDs.
+        tuple[dict[str, str], dict[str, str], list[str]]: Mappings of usernames to IDs and IDs to
+            IDs, including the profiles that already existed when the index was preloaded, and the
+            sorted IDs of the given profiles that exist after the run.
     """
-    user_profile_map_username = {}
-    user_profile_map_id = {}
+    # Profiles from earlier runs keep resolving, so re-seeding doesn't orphan their deals
+    user_profile_map_username = {
+        fields["username"]: doc_id for doc_id, fields in index.fields("UserProfile").items() if fields.get("username")
+    }
+    user_profile_map_id = {doc_id: doc_id for doc_id in index.fields("UserProfile")}
+    queued = []
+    seed_ids = set()
     print("Populating UserProfile collection...")
-    for profile in user_profiles:
-        doc_id = profile["id"]
-        if not document_exists("UserProfile", doc_id, db):
-            try:
-                db.collection("UserProfile").document(doc_id).set(profile)
-                user_profile_map_username[profile["username"]] = doc_id
-                user_profile_map_id[doc_id] = doc_id
-                print(f"Added UserProfile: {doc_id}")
-            except Exception as e:
-                print(f"Error adding UserProfile: {e}")
-        else:
-            print(f"Skipped UserProfile: {doc_id} (already exists)")
-    return user_profile_map_username, user_profile_map_id
+    for chunk in chunked(user_profiles, READ_CHUNK_SIZE):
+        index.prefetch("UserProfile", [profile["id"] for profile in chunk])
+        for profile in chunk:
+            doc_id = profile["id"]
+            if not index.exists("UserProfile", doc_id):
+                writer.set("UserProfile", doc_id, profile)
+                queued.append((profile["username"], doc_id))
+            else:
+                print(f"Skipped UserProfile: {doc_id} (already exists)")
+                seed_ids.add(doc_id)
+
+    # Only map the profiles that were actually written
+    failed_ids = {error.doc_id for error in writer.flush() if error.collection == "UserProfile"}
+    for username, doc_id in queued:
+        if doc_id in failed_ids:
+            print(f"Error adding UserProfile: {doc_id}")
+            continue
+        user_profile_map_username[username] = doc_id
+        user_profile_map_id[doc_id] = doc_id
+        seed_ids.add(doc_id)
+    print(f"Added {len(queued) - len(failed_ids)} UserProfiles.")
+    return user_profile_map_username, user_profile_map_id, sorted(seed_ids)
 
-def populate_stores(stores: list[dict], db: firestore.Client) -> None:
+def populate_stores(stores: Iterable[dict], db: firestore.Client, writer: BatchWriter, index: DocumentIndex) -> None:
     """
     Populate Stores collection.
 
     Args:
-        stores (list[dict]): The list of stores to populate.
+        stores (Iterable[dict]): The stores to populate.
         db (firestore.Client): The Firestore client.
+        writer (BatchWriter): The batched write pipeline to queue the writes on.
+        index (DocumentIndex): The run-wide document existence cache.
     """
     print("Populating Stores collection...")
-    for store in stores:
-        doc_id = store["id"]
-        if not document_exists("Stores", doc_id, db):
-            try:
-                db.collection("Stores").document(doc_id).set(store)
-                print(f"Added Store: {doc_id} - {store['name']}")
-            except Exception as e:
-                print(f"Error adding Store {doc_id}: {e}")
-        else:
-            print(f"Skipped Store: {doc_id} (already exists)")
+    queued = 0
+    for chunk in chunked(stores, READ_CHUNK_SIZE):
+        index.prefetch("Stores", [store["id"] for store in chunk])
+        for store in chunk:
+            doc_id = store["id"]
+            if not index.exists("Stores", doc_id):
+                writer.set("Stores", doc_id, store)
+                queued += 1
+            else:
+                print(f"Skipped Store: {doc_id} (already exists)")
+    failed = writer.flush()
+    print(f"Added {queued - len(failed)} Stores.")
 
-def populate_deals(deals: list[dict], db: firestore.Client, user_profile_map: dict[str, str]) -> None:
+def populate_deals(deals: Iterable[dict], db: firestore.Client, user_profile_map: dict[str, str], writer: BatchWriter, index: DocumentIndex) -> None:
     """
     Populate Deals collection.
 
     Args:
-        deals (list[dict]): The list of deals to populate.
+        deals (Iterable[dict]): The deals to populate.
         db (firestore.Client): The Firestore client.
         user_profile_map (dict[str, str]): The mapping of usernames to IDs.
+        writer (BatchWriter): The batched write pipeline to queue the writes on.
+        index (DocumentIndex): The run-wide document existence cache.
     """
     print("Populating Deals collection...")
-    for deal in deals:
-        doc_id = deal["id"]
-        if not document_exists("Deals", doc_id, db):
-            username = deal["userID"]
-            resolved_id = user_profile_map.get(username)
-            if resolved_id:
-                deal["userID"] = resolved_id
-                deal["username"] = username
-            else:
-                print(f"Warning: No UserProfile found for userID {username}")
-                deal["userID"] = "unknown"
-                deal["username"] = "Unknown User"
+    queued = 0
+    for chunk in chunked(deals, READ_CHUNK_SIZE):
+        index.prefetch("Deals", [deal["id"] for deal in chunk])
+        for deal in chunk:
+            doc_id = deal["id"]
+            if not index.exists("Deals", doc_id):
+                username = deal["userID"]
+                resolved_id = user_profile_map.get(username)
+                if resolved_id:
+                    deal["userID"] = resolved_id
+                    deal["username"] = username
+                else:
+                    print(f"Warning: No UserProfile found for userID {username}")
+                    deal["userID"] = "unknown"
+                    deal["username"] = "Unknown User"
 
-            # Validate locationId
-            store_ref = db.collection("Stores").document(deal["locationId"]).get()
-            if not store_ref.exists:
-                print(f"Error: Store {deal['locationId']} for deal {doc_id} does not exist.")
-                continue
+                # Validate locationId against the preloaded Stores index
+                if not index.exists("Stores", deal["locationId"]):
+                    print(f"Error: Store {deal['locationId']} for deal {doc_id} does not exist.")
+                    continue
 
-            # Ensure date field is valid
-            deal["date"] = deal.get("date", datetime.now().isoformat())
+                # Ensure date field is valid
+                deal["date"] = deal.get("date", datetime.now().isoformat())
 
-            try:
-                db.collection("Deals").document(doc_id).set(deal)
-                print(f"Added Deal: {doc_id} with userID {deal['userID']}")
-            except Exception as e:
-                print(f"Error adding Deal {doc_id}: {e}")
-        else:
-            print(f"Skipped Deal: {doc_id} (already exists)")
+                writer.set("Deals", doc_id, deal)
+                queued += 1
+            else:
+                print(f"Skipped Deal: {doc_id} (already exists)")
+    failed = writer.flush()
+    print(f"Added {queued - len(failed)} Deals.")
 
-def populate_user_comments(comments: list[dict], db: firestore.Client, user_profile_map: dict[str, str]) -> None:
+def populate_user_comments(comments: Iterable[dict], db: firestore.Client, user_profile_map: dict[str, str], writer: BatchWriter, index: DocumentIndex) -> None:
     """
     Populate UserComments collection.
 
     Args:
-        comments (list[dict]): The list of comments to populate.
+        comments (Iterable[dict]): The comments to populate.
         db (firestore.Client): The Firestore client.
         user_profile_map (dict[str, str]): The mapping of usernames to IDs.
+        writer (BatchWriter): The batched write pipeline to queue the writes on.
+        index (DocumentIndex): The run-wide document existence cache.
     """
     print("Populating UserComments collection...")
-    for comment in comments:
-        doc_id = comment["id"]
-        if not document_exists("UserComments", doc_id, db):
-            username = comment["userID"]
-            resolved_id = user_profile_map.get(username)
-            if resolved_id:
-                comment["userID"] = resolved_id
-            else:
-                print(f"Warning: No UserProfile found for userID {username}")
-                comment["userID"] = "unknown"
-
-            # Print the dateTime for debugging
-            print(f"Comment {doc_id} dateTime: {comment['dateTime']}")
+    queued = 0
+    for chunk in chunked(comments, READ_CHUNK_SIZE):
+        index.prefetch("UserComments", [comment["id"] for comment in chunk])
+        for comment in chunk:
+            doc_id = comment["id"]
+            if not index.exists("UserComments", doc_id):
+                username = comment["userID"]
+                resolved_id = user_profile_map.get(username)
+                if resolved_id:
+                    comment["userID"] = resolved_id
+                else:
+                    print(f"Warning: No UserProfile found for userID {username}")
+                    comment["userID"] = "unknown"
 
-            try:
-                db.collection("UserComments").document(doc_id).set(comment)
-                print(f"Added UserComment: {doc_id} with userID {comment['userID']}")
-            except Exception as e:
-                print(f"Error adding UserComment {doc_id}: {e}")
-        else:
-            print(f"Skipped UserComment: {doc_id} (already exists)")
+                writer.set("UserComments", doc_id, comment)
+                queued += 1
+            else:
+                print(f"Skipped UserComment: {doc_id} (already exists)")
+    failed = writer.flush()
+    print(f"Added {queued - len(failed)} UserComments.")
 
-def populate_votes(votes: list[dict], db: firestore.Client, user_profile_map_id: dict[str, str]) -> None:
+def populate_votes(votes: Iterable[dict], db: firestore.Client, user_profile_map_id: dict[str, str], writer: BatchWriter, journal: Optional[RunJournal] = None) -> None:
     """
     Populate Votes collection.
 
     Args:
-        votes (list[dict]): The list of votes to populate.
+        votes (Iterable[dict]): The votes to populate.
         db (firestore.Client): The Firestore client.
         user_profile_map_id (dict[str, str]): The mapping of user IDs to IDs.
+        writer (BatchWriter): The batched write pipeline to queue the writes on.
+        journal (Optional[RunJournal]): The run journal, to skip votes written by an interrupted run.
     """
     print("Populating Votes collection...")
+    queued = 0
 
     # Mapping from 'itemType' strings to integers
     item_type_mapping = {
@@ -511,6 +747,8 @@ def populate_votes(votes: list[dict], db: firestore.Client, user_profile_map_id:
 
         # Construct document ID
         doc_id = f"{user_id}_{item_id}_{item_type_int}"
+        if journal and journal.done("doc", f"Votes/{doc_id}"):
+            continue
 
         # Prepare vote data without 'id'
         vote_data = {
@@ -529,118 +767,96 @@ def populate_votes(votes: list[dict], db: firestore.Client, user_profile_map_id:
             print(f"Warning: No UserProfile found for userId {user_id}")
             vote_data["userId"] = "unknown"
 
-        try:
-            db.collection("Votes").document(doc_id).set(vote_data)
-            print(f"Added Vote: {doc_id} with userId {vote_data['userId']}")
-        except Exception as e:
-            print(f"Error adding Vote: {doc_id}: {e}")
+        writer.set("Votes", doc_id, vote_data)
+        queued += 1
+    failed = writer.flush()
+    print(f"Added {queued - len(failed)} Votes.")
 
-def create_dummy_users(user_profiles: list[dict]) -> None:
+def create_dummy_users(user_profiles: Iterable[dict], journal: Optional[RunJournal] = None) -> None:
     """
-    Create dummy users in Firebase Authentication.
+    Create dummy users in Firebase Authentication, imported in bulk.
+
+    Existing users with the same UID are overwritten.
 
     Args:
-        user_profiles (list[dict]): The list of user profiles to create.
-    """
-    for profile in user_profiles:
-        try:
-            user = auth.create_user(
-                uid=profile["id"],
-                email=profile["email"],
-                email_verified=False,
-                password='dummy_password',
-                display_name=f"{profile['displayName']}_dummy",  # Append '_dummy' to the display name
-                disabled=False
-            )
-            print(f"Created user: {user.uid}")
-        except Exception as e:
-            print(f"Error creating user {profile['id']}: {e}")
-
-def generate_votes_from_counts(deals: list[dict], comments: list[dict], all_user_ids: list[str]) -> list[dict]:
+        user_profiles (Iterable[dict]): The user profiles to create.
+        journal (Optional[RunJournal]): The run journal, to skip users created by an interrupted run.
+    """
+    password_hash = hash_password('dummy_password')
+    users = (
+        auth.ImportUserRecord(
+            uid=profile["id"],
+            email=profile["email"],
+            email_verified=False,
+            password_hash=password_hash,
+            display_name=f"{profile['displayName']}_dummy",  # Append '_dummy' to the display name
+            disabled=False
+        )
+        for profile in user_profiles
+        if not (journal and journal.done("auth", profile["id"]))
+    )
+    on_imported = (lambda uid: journal.record("auth", uid)) if journal else None
+    imported, errors = import_users(users, hash_alg=password_import_hash(), on_imported=on_imported)
+    print(f"Created {imported} users, {len(errors)} failed.")
+
+def generate_votes_from_counts(deals: list[dict], comments: list[dict], all_user_ids: list[str], seed: Optional[int] = None, owner_map: Optional[dict[str, str]] = None) -> SampledVotes:
     """
     Generate votes based on upvote/downvote counts.
 
+    Voters are drawn in a single vectorized pass; every item gets distinct voters and never a vote
+    from its own author.
+
     Args:
         deals (list[dict]): The list of deals.
         comments (list[dict]): The list of comments.
         all_user_ids (list[str]): The list of all user IDs.
+        seed (Optional[int]): The random seed, so a resumed run draws the same voters.
+        owner_map (Optional[dict[str, str]]): The mapping of usernames to IDs, for records that were
+            skipped and still hold their author's username.
 
     Returns:
-        list[dict]: The list of generated votes.
+        SampledVotes: The generated votes, iterable as vote dictionaries.
     """
-    print("Generating Votes based on upvote/downvote counts...")
-    votes = []
-    used_votes = set()  # To prevent duplicate votes from the same user on the same item
-
-    # Helper function to generate votes for an item
-    def generate_votes_for_item(item_id: str, item_type: str, upvote_count: int, downvote_count: int, exclude_user_id: str) -> None:
-        item_votes = []
-        total_votes = upvote_count + downvote_count
-        available_user_ids = [uid for uid in all_user_ids if uid != exclude_user_id]
-
-        if total_votes > len(available_user_ids):
-            print(f"Warning: Not enough unique users to generate votes for {item_type} {item_id}.")
-            total_votes = len(available_user_ids)
-            upvote_count = min(upvote_count, total_votes)
-            downvote_count = total_votes - upvote_count
-
-        random.shuffle(available_user_ids)
-        vote_user_ids = available_user_ids[:total_votes]
-
-        # Assign upvotes
-        for uid in vote_user_ids[:upvote_count]:
-            vote_key = (uid, item_id)
-            if vote_key not in used_votes:
-                used_votes.add(vote_key)
-                votes.append({
-                    "userId": uid,
-                    "itemId": item_id,
-                    "itemType": item_type,
-                    "voteType": "upvote",
-                    "isDummy": True
-                })
-
-        # Assign downvotes
-        for uid in vote_user_ids[upvote_count:]:
-            vote_key = (uid, item_id)
-            if vote_key not in used_votes:
-                used_votes.add(vote_key)
-                votes.append({
-                    "userId": uid,
-                    "itemId": item_id,
-                    "itemType": item_type,
-                    "voteType": "downvote",
-                    "isDummy": True
-                })
-
-    # Generate votes for Deals
-    for deal in deals:
-        item_id = deal["id"]
-        upvote_count = deal.get("upvote", 0)
-        downvote_count = deal.get("downvote", 0)
-        exclude_user_id = deal.get("userID", "")
-        generate_votes_for_item(item_id, "deal", upvote_count, downvote_count, exclude_user_id)
+    items = []
+    for _ in collect_vote_items(deals, "deal", items):
+        pass
+    for _ in collect_vote_items(comments, "comment", items):
+        pass
+    return generate_votes_from_items(items, all_user_ids, owner_map, seed)
+
+def generate_votes_from_items(items: list[tuple[str, str, int, int, str]], all_user_ids: list[str], owner_map: Optional[dict[str, str]] = None, seed: Optional[int] = None) -> SampledVotes:
+    """
+    Generate votes from the upvote/downvote counts recorded by `collect_vote_items`.
 
-    # Generate votes for UserComments
-    for comment in comments:
-        item_id = comment["id"]
-        upvote_count = comment.get("upvote", 0)
-        downvote_count = comment.get("downvote", 0)
-        exclude_user_id = comment.get("userID", "")
-        generate_votes_for_item(item_id, "comment", upvote_count, downvote_count, exclude_user_id)
+    Args:
+        items (list[tuple[str, str, int, int, str]]): The (id, type, upvotes, downvotes, owner) of every item.
+        all_user_ids (list[str]): The list of all user IDs.
+        owner_map (Optional[dict[str, str]]): The mapping of usernames to IDs, if owners are usernames.
+        seed (Optional[int]): The random seed, so a resumed run draws the same voters.
+
+    Returns:
+        SampledVotes: The generated votes, iterable as vote dictionaries.
+    """
+    print("Generating Votes based on upvote/downvote counts...")
+    if owner_map:
+        items = [(item_id, item_type, up, down, owner_map.get(owner, owner)) for item_id, item_type, up, down, owner in items]
+    votes = sample_votes(items, all_user_ids, seed)
 
     print(f"Generated {len(votes)} votes.")
     return votes
 
-def populate_generated_votes(votes: list[dict], db: firestore.Client) -> None:
+def populate_generated_votes(votes: Iterable[dict], db: firestore.Client, writer: BatchWriter, journal: Optional[RunJournal] = None) -> None:
     """
     Populate generated votes into Firestore.
 
     Args:
-        votes (list[dict]): The list of votes to populate.
+        votes (Iterable[dict]): The votes to populate.
         db (firestore.Client): The Firestore client.
+        writer (BatchWriter): The batched write pipeline to queue the writes on.
+        journal (Optional[RunJournal]): The run journal, to skip votes written by an interrupted run.
     """
     print("Populating Votes collection...")
+    queued = 0
     item_type_mapping = {
         "comment": 0,
         "deal": 1,
@@ -661,6 +877,8 @@ def populate_generated_votes(votes: list[dict], db: firestore.Client) -> None:
 
         # Construct document ID
         doc_id = f"{user_id}_{item_id}_{item_type_int}"
+        if journal and journal.done("doc", f"Votes/{doc_id}"):
+            continue
 
         vote_data = {
             "userId": user_id,
@@ -670,19 +888,28 @@ def populate_generated_votes(votes: list[dict], db: firestore.Client) -> None:
             "isDummy": True
         }
 
-        try:
-            db.collection("Votes").document(doc_id).set(vote_data)
-            print(f"Added Vote: {doc_id}")
-        except Exception as e:
-            print(f"Error adding Vote: {doc_id}: {e}")
+        writer.set("Votes", doc_id, vote_data)
+        queued += 1
+    failed = writer.flush()
+    print(f"Added {queued - len(failed)} Votes.")
 
 def initialize_data(json_file_path: str) -> None:
     """
     Main function to initialize data.
 
     Args:
-        json_file_path (str): The path to the JSON file.
+        json_file_path (str): The path to the JSON file, or to a directory of per-collection NDJSON files.
     """
+    streaming = os.path.isdir(json_file_path)
+
+    # Reject broken seed data before any read or write is spent on it
+    report = validate_seed(json_file_path)
+    if not report.valid:
+        report.print_summary()
+        write_report(report, VALIDATION_REPORT_PATH)
+        print("Seed data is invalid. Fix the errors above and run the script again.")
+        return
+
     # Ask the user if they want to update existing entries
     update_existing = input("Do you want to update existing entries from the JSON file? (yes/no): ").strip().lower()
     update_existing = update_existing == "yes"
@@ -691,38 +918,147 @@ def initialize_data(json_file_path: str) -> None:
     process_images = input("Do you want to process images (download and upload to Firebase)? (yes/no): ").strip().lower()
     process_images = process_images == "yes"
 
-    # Load JSON data
-    collections = load_and_replace_json(json_file_path, update_existing, process_images, db)
-
-    # Create dummy users in Firebase Authentication
-    create_dummy_users(collections["UserProfile"])
-
-    # Create a mapping of usernames to IDs
-    user_profile_map_username, user_profile_map_id = populate_user_profiles(collections["UserProfile"], db)
-
-    # Collect all user IDs
-    all_user_ids = list(user_profile_map_id.keys())
-
-    # Populate Stores collection
-    populate_stores(collections["Stores"], db)
-
-    # Populate Deals collection
-    populate_deals(collections["Deals"], db, user_profile_map_username)
-
-    # Populate UserComments collection
-    populate_user_comments(collections["UserComments"], db, user_profile_map_username)
+    # Ask the user if images should be resized locally instead of by the Resize Images extension
+    local_resize = False
+    if process_images:
+        local_resize = input("Do you want to resize images locally instead of waiting for the Resize Images extension? (yes/no): ").strip().lower()
+        local_resize = local_resize == "yes"
+
+    # Existence checks are shared by the image step and the populate steps
+    index = DocumentIndex(db)
+    preload_index(index)
+
+    # Work finished by an interrupted run is skipped
+    journal = RunJournal(journal_path("set_dummy"))
+    for key in journal.keys("doc"):
+        collection, doc_id = key.split("/", 1)
+        index.add(collection, doc_id)
+
+    pipeline = create_image_pipeline(local_resize) if process_images else None
+    # Comments are written as soon as their deal has been published here
+    deal_channel = RecordChannel("Deals")
+    try:
+        if streaming:
+            # Records are read lazily while the populate steps consume them
+            collections = load_ndjson_collections(json_file_path, update_existing, process_images, db, index, pipeline, deal_channel, journal)
+
+            # Authentication users are created from their own pass over the profiles
+            auth_profiles = stream_ndjson(os.path.join(json_file_path, "UserProfile.ndjson"))
+        else:
+            # Load JSON data
+            collections = load_and_replace_json(json_file_path, update_existing, process_images, db, index, pipeline, journal)
+            auth_profiles = collections["UserProfile"]
+
+        run_phases(collections, auth_profiles, streaming, deal_channel, db, index, journal)
+    finally:
+        journal.flush()
+        if pipeline:
+            finish_image_pipeline(pipeline)
+
+    # Nothing left to resume
+    journal.clear()
+    print("Data initialization completed.")
 
-    # Generate Votes based on upvote/downvote counts
-    generated_votes = generate_votes_from_counts(
-        collections["Deals"],
-        collections["UserComments"],
-        all_user_ids
-    )
+def run_phases(collections: dict[str, Iterable[dict]], auth_profiles: Iterable[dict], streaming: bool, deal_channel: RecordChannel, db: firestore.Client, index: DocumentIndex, journal: RunJournal) -> None:
+    """
+    Run the seeding phases concurrently, each as soon as the phases it depends on allow.
 
-    # Populate Votes collection
-    populate_generated_votes(generated_votes, db)
+    Auth users, UserProfile and Stores are independent. Deals need the username map of the
+    profiles and the written stores to validate against; comments need the username map too and
+    stream behind the deals, each comment waiting only for its own deal. Votes need the user IDs,
+    and generated votes need every deal and comment. Every phase writes through its own
+    `BatchWriter`, so its flush only waits for its own writes.
 
-    print("Data initialization completed.")
+    Args:
+        collections (dict[str, Iterable[dict]]): The records of every collection, as lists or streams.
+        auth_profiles (Iterable[dict]): The profiles to create Authentication users for.
+        streaming (bool): Whether the collections are single-pass streams.
+        deal_channel (RecordChannel): The channel deals are published to as the deals phase takes them.
+        db (firestore.Client): The Firestore client.
+        index (DocumentIndex): The run-wide document existence cache.
+        journal (RunJournal): The run journal every committed write is recorded in.
+    """
+    def on_committed(collection: str, doc_id: str) -> None:
+        index.add(collection, doc_id)
+        journal.record("doc", f"{collection}/{doc_id}")
+
+    def writer() -> BatchWriter:
+        return BatchWriter(db, batch_size=WRITE_BATCH_SIZE, max_in_flight=WRITE_MAX_IN_FLIGHT, on_committed=on_committed)
+
+    # Generated votes must be drawn the same way when an interrupted run is resumed
+    vote_seed = journal.get("seed", "votes")
+    if vote_seed is None:
+        vote_seed = str(random.getrandbits(63))
+        journal.record("seed", "votes", vote_seed)
+
+    vote_items = []
+    deals = collections["Deals"]
+    comments = collections["UserComments"]
+    if streaming and "Votes" not in collections:
+        # Streams can't be read twice, so keep what vote generation needs while they are written
+        deals = collect_vote_items(deals, "deal", vote_items)
+        comments = collect_vote_items(comments, "comment", vote_items)
+    deals = deal_channel.publish_all(deals, key=lambda deal: deal["id"])
+    if not streaming:
+        # Streamed comments are gated before their timestamps are derived from the deals
+        comments = deal_channel.gate(comments, key=lambda comment: comment["itemID"])
+
+    def auth_phase() -> None:
+        # Create dummy users in Firebase Authentication
+        create_dummy_users(auth_profiles, journal)
+
+    def profiles_phase() -> tuple[dict[str, str], dict[str, str], list[str]]:
+        # Create a mapping of usernames to IDs
+        with writer() as phase_writer:
+            return populate_user_profiles(collections["UserProfile"], db, phase_writer, index)
+
+    def stores_phase() -> None:
+        with writer() as phase_writer:
+            populate_stores(collections["Stores"], db, phase_writer, index)
+
+    def deals_phase(user_maps: tuple[dict[str, str], dict[str, str], list[str]], _) -> None:
+        with writer() as phase_writer:
+            populate_deals(deals, db, user_maps[0], phase_writer, index)
+
+    def comments_phase(user_maps: tuple[dict[str, str], dict[str, str], list[str]]) -> None:
+        with writer() as phase_writer:
+            populate_user_comments(comments, db, user_maps[0], phase_writer, index)
+
+    def votes_phase(user_maps: tuple[dict[str, str], dict[str, str], list[str]], *_) -> None:
+        user_profile_map_username, user_profile_map_id, seed_user_ids = user_maps
+        with writer() as phase_writer:
+            if "Votes" in collections:
+                # Populate Votes collection from the provided votes
+                populate_votes(collections["Votes"], db, user_profile_map_id, phase_writer, journal)
+                return
+
+            # Generate Votes based on upvote/downvote counts
+            # Only the dataset's profiles vote, never real users that already had a profile; sorted, so
+            # the seed draws the same voters whichever run wrote the profiles
+            if streaming:
+                generated_votes = generate_votes_from_items(vote_items, seed_user_ids, user_profile_map_username, int(vote_seed))
+            else:
+                generated_votes = generate_votes_from_counts(collections["Deals"], collections["UserComments"], seed_user_ids, int(vote_seed), user_profile_map_username)
+
+            # Populate Votes collection
+            populate_generated_votes(generated_votes, db, phase_writer, journal)
+
+    scheduler = PhaseScheduler()
+    scheduler.add("auth", auth_phase)
+    scheduler.add("profiles", profiles_phase)
+    scheduler.add("stores", stores_phase)
+    # Closed even if the deals phase fails or is skipped, so comments never wait for a missing deal
+    scheduler.add("deals", deals_phase, after=["profiles", "stores"], channels=[deal_channel])
+    scheduler.add("comments", comments_phase, after=["profiles"], streams_from=["deals"])
+    if "Votes" in collections:
+        scheduler.add("votes", votes_phase, after=["profiles"])
+    else:
+        scheduler.add("votes", votes_phase, after=["profiles", "deals", "comments"])
+    try:
+        scheduler.run()
+    finally:
+        scheduler.print_timeline()
 
 # Run the initialization
-initialize_data(JSON_FILE_PATH)
+if __name__ == "__main__":
+    initialize_data(sys.argv[1] if len(sys.argv) > 1 else JSON_FILE_PATH)
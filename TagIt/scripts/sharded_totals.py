@@ -0,0 +1,194 @@
+"""
+Sharded UserProfile Totals
+
+Process-pool version of the aggregation in `update.py`'s `update_user_profile_totals`, for
+databases where one thread streaming Votes is the bottleneck.
+
+Deals, UserComments and Votes are split into document-name ranges with partition queries
+(`get_partitions`). Every range is streamed by a worker process, which only keeps partial counters:
+
+- Deals / UserComments: the owner of every document and the number of documents per owner.
+- Votes: the number of votes per (itemType, itemId, voteType), so the partial stays as small as the
+  number of voted items instead of the number of votes.
+
+The partials are merged in the parent process and the votes are resolved to the owners of their
+items, with exactly the same rules as the single-process path. Wall time scales with the number of
+workers until Firestore read throughput becomes the limit.
+
+Run `python update.py --totals --workers 8 --verify` to compare both paths on the same database
+(e.g. the emulator, with `FIRESTORE_EMULATOR_HOST` set) before writing. With the emulator running,
+`python -m pytest tests/test_sharded_totals.py` compares them on a small dataset that also has
+subcollections named like the root collections.
+
+Dependencies:
+- Firebase Admin SDK (`pip install firebase-admin`).
+"""
+
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+# Ranges per worker; more, smaller ranges even out workers that get a dense range
+PARTITIONS_PER_WORKER = 4
+
+# Fields each worker projects, by collection
+PROJECTIONS = {
+    "Deals": ["userID"],
+    "UserComments": ["userID"],
+    "Votes": ["voteType", "itemType", "itemId"],
+}
+
+# Vote itemType values the totals count
+ITEM_TYPE_COMMENT = 0
+ITEM_TYPE_DEAL = 1
+
+TOTAL_FIELDS = ("totalDeals", "totalComments", "totalUpvotes", "totalDownvotes")
+
+# Firestore client of a worker process
+_worker_db: Optional[firestore.Client] = None
+
+def _init_worker(service_account_path: Optional[str], project: str) -> None:
+    # Every spawned process needs its own Firebase app and gRPC channel
+    global _worker_db
+    if service_account_path is None:
+        # No key, e.g. against the emulator: a plain client of the parent's project
+        _worker_db = firestore.Client(project=project)
+        return
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        firebase_admin.initialize_app(credentials.Certificate(service_account_path))
+    _worker_db = firestore.client()
+
+def plan_partitions(db: firestore.Client, collection: str, count: int) -> list[tuple[str, Optional[str], Optional[str]]]:
+    """
+    Split a collection into document-name ranges with a partition query.
+
+    Args:
+        db (firestore.Client): The Firestore client.
+        collection (str): The name of the collection.
+        count (int): The desired number of ranges; Firestore may return fewer.
+
+    Returns:
+        list[tuple[str, Optional[str], Optional[str]]]: The collection, the path of the first
+            document of the range and the path of the first document after it, None meaning
+            unbounded.
+    """
+    if count <= 1:
+        return [(collection, None, None)]
+    ranges = []
+    for partition in db.collection_group(collection).get_partitions(count):
+        start = partition.start_at.path if partition.start_at else None
+        end = partition.end_at.path if partition.end_at else None
+        ranges.append((collection, start, end))
+    return ranges or [(collection, None, None)]
+
+def aggregate_partition(task: tuple[str, Optional[str], Optional[str]]) -> tuple[str, Counter, dict, int]:
+    """
+    Stream one document range and aggregate it into partial counters. Runs in a worker process.
+
+    Args:
+        task (tuple[str, Optional[str], Optional[str]]): A range from `plan_partitions`.
+
+    Returns:
+        tuple[str, Counter, dict, int]: The collection, the partial counters, the owner of every
+            document (empty for Votes) and the number of documents read.
+    """
+    collection, start, end = task
+    db = _worker_db
+    query = db.collection_group(collection).select(PROJECTIONS[collection]).order_by("__name__")
+    if start:
+        query = query.start_at([db.document(start)])
+    if end:
+        query = query.end_before([db.document(end)])
+
+    counts = Counter()
+    owners = {}
+    documents = 0
+    for doc in query.stream():
+        # A collection group also matches subcollections with the same name
+        if doc.reference.parent.parent is not None:
+            continue
+        documents += 1
+        data = doc.to_dict()
+        if collection == "Votes":
+            item_type = data.get("itemType")
+            vote_type = data.get("voteType")
+            if item_type in (ITEM_TYPE_COMMENT, ITEM_TYPE_DEAL) and vote_type in ("upvote", "downvote"):
+                counts[(item_type, data.get("itemId"), vote_type)] += 1
+        else:
+            owner = data.get("userID")
+            owners[doc.id] = owner
+            counts[owner] += 1
+    return collection, counts, owners, documents
+
+def aggregate_totals_sharded(db: firestore.Client, user_ids: list[str], workers: int,
+                             service_account_path: Optional[str]) -> dict[str, dict[str, int]]:
+    """
+    Compute the totals of every user with a pool of worker processes.
+
+    Args:
+        db (firestore.Client): The Firestore client of the parent process, used to plan the ranges.
+        user_ids (list[str]): The UserProfile IDs; documents of other users are not counted.
+        workers (int): The number of worker processes.
+        service_account_path (Optional[str]): The service account key file the workers initialize
+            Firebase with, or None to give them a plain client of the project of `db` (e.g. with
+            `FIRESTORE_EMULATOR_HOST` set).
+
+    Returns:
+        dict[str, dict[str, int]]: The totals by user ID, in the same shape as the single-process path.
+    """
+    started = time.perf_counter()
+    tasks = []
+    for collection in PROJECTIONS:
+        ranges = plan_partitions(db, collection, workers * PARTITIONS_PER_WORKER)
+        print(f"Split {collection} into {len(ranges)} ranges.")
+        tasks.extend(ranges)
+
+    item_counts = {collection: Counter() for collection in PROJECTIONS}
+    owners = {"Deals": {}, "UserComments": {}}
+    documents = Counter()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(service_account_path, db.project)) as pool:
+        for collection, counts, partial_owners, read in pool.map(aggregate_partition, tasks):
+            item_counts[collection].update(counts)
+            if collection in owners:
+                owners[collection].update(partial_owners)
+            documents[collection] += read
+
+    user_totals = {user_id: dict.fromkeys(TOTAL_FIELDS, 0) for user_id in user_ids}
+    for collection, field in (("Deals", "totalDeals"), ("UserComments", "totalComments")):
+        for user_id, count in item_counts[collection].items():
+            if user_id in user_totals:
+                user_totals[user_id][field] += count
+
+    item_owners = {ITEM_TYPE_DEAL: owners["Deals"], ITEM_TYPE_COMMENT: owners["UserComments"]}
+    for (item_type, item_id, vote_type), count in item_counts["Votes"].items():
+        owner_user_id = item_owners[item_type].get(item_id)
+        if owner_user_id in user_totals:
+            field = "totalUpvotes" if vote_type == "upvote" else "totalDownvotes"
+            user_totals[owner_user_id][field] += count
+
+    elapsed = time.perf_counter() - started
+    read = sum(documents.values())
+    print(f"Aggregated {read} documents ({', '.join(f'{c}: {n}' for c, n in documents.items())}) "
+          f"with {workers} workers in {elapsed:.2f}s ({read / elapsed if elapsed else 0:.0f} docs/s).")
+    return user_totals
+
+def default_workers() -> int:
+    """
+    Get the default number of worker processes.
+
+    Returns:
+        int: The number of CPUs available to this process.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
@@ -0,0 +1,132 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import pytest
+
+from image_pipeline import ImageJob, ImagePipeline, public_url
+
+# Seconds the fake Resize Images extension takes to write the resized variant
+RESIZE_DELAY = 0.2
+
+# Images served by the local HTTP server, by path
+IMAGES = {
+    "/deal.jpg": b"deal image bytes",
+    "/avatar.jpg": b"avatar image bytes",
+    "/slow.jpg": b"image the extension never resizes",
+}
+
+class ImageHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        content = IMAGES.get(self.path)
+        if content is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+class FakeBlob:
+    def __init__(self, bucket: "FakeBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+        self.metadata = None
+
+    def upload_from_string(self, content: bytes, content_type: str) -> None:
+        self.bucket.store(self.name, content)
+        original = self.name.endswith(".jpg")
+        if original and not any(marker in self.name for marker in self.bucket.never_resized):
+            # Like the extension, write the resized variant a little after the upload
+            resized_name = f"{self.name[:-len('.jpg')]}_1080x1080.jpeg"
+            timer = threading.Timer(RESIZE_DELAY, self.bucket.store, (resized_name, b"resized"))
+            timer.daemon = True
+            timer.start()
+
+    def exists(self) -> bool:
+        with self.bucket.lock:
+            return self.name in self.bucket.blobs
+
+    def generate_signed_url(self, expiration) -> str:
+        return f"https://signed.example/{self.name}"
+
+class FakeBucket:
+    """
+    In-memory stand-in for the part of `google.cloud.storage.Bucket` the pipeline uses.
+    """
+
+    name = "test-bucket"
+
+    def __init__(self, never_resized: tuple[str, ...] = ()):
+        self.never_resized = never_resized
+        self.blobs: dict[str, bytes] = {}
+        self.lock = threading.Lock()
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+    def store(self, name: str, content: bytes) -> None:
+        with self.lock:
+            self.blobs[name] = content
+
+@pytest.fixture(scope="module")
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def test_pipeline_downloads_uploads_and_waits_for_resize(server_url):
+    bucket = FakeBucket(never_resized=("slow",))
+    pipeline = ImagePipeline(bucket, download_workers=2, upload_workers=2, resize_workers=4,
+                             resize_timeout=1, poll_interval=0.05)
+    jobs = [
+        ImageJob("deal", f"{server_url}/deal.jpg", "deals", "deal"),
+        ImageJob("avatar", f"{server_url}/avatar.jpg", "avatars", "avatar"),
+        ImageJob("missing", f"{server_url}/missing.jpg", "deals", "missing"),
+        ImageJob("slow", f"{server_url}/slow.jpg", "deals", "slow"),
+    ]
+    results = pipeline.run(jobs)
+
+    # Downloaded, uploaded, and resolved to the resized variant once the extension wrote it
+    assert results["deal"] == public_url(bucket.name, "deals/deal_1080x1080.jpeg")
+    assert results["avatar"] == public_url(bucket.name, "avatars/avatar_1080x1080.jpeg")
+    assert bucket.blobs["deals/deal.jpg"] == IMAGES["/deal.jpg"]
+    assert bucket.blobs["avatars/avatar.jpg"] == IMAGES["/avatar.jpg"]
+    # A 404 fails only its own job
+    assert results["missing"] is None
+    assert "deals/missing.jpg" not in bucket.blobs
+    # A resize that never shows up falls back to a signed URL of the original
+    assert results["slow"] == "https://signed.example/deals/slow.jpg"
+
+    stats = pipeline.stats
+    assert (stats["download"].count, stats["download"].failures) == (4, 1)
+    assert stats["download"].bytes == sum(len(IMAGES[path]) for path in ("/deal.jpg", "/avatar.jpg", "/slow.jpg"))
+    assert (stats["upload"].count, stats["upload"].failures) == (3, 0)
+    assert (stats["resize"].count, stats["resize"].failures) == (3, 0)
+    assert stats["resize"].max_seconds >= 1
+    assert stats["cache"].count == 0
+    assert "4 items (1 failed)" in stats["download"].summary()
+
+def test_pipeline_resizes_locally(server_url):
+    Image = pytest.importorskip("PIL.Image")
+    output = BytesIO()
+    Image.new("RGB", (2160, 1080), "red").save(output, format="PNG")
+    IMAGES["/large.png"] = output.getvalue()
+
+    bucket = FakeBucket()
+    pipeline = ImagePipeline(bucket, local_resize=True, resize_processes=1)
+    results = pipeline.run([ImageJob("large", f"{server_url}/large.png", "deals", "large")])
+
+    assert results["large"] == public_url(bucket.name, "deals/large_1080x1080.jpeg")
+    # Only the final variant is uploaded, resized to fit the 1080x1080 box
+    assert list(bucket.blobs) == ["deals/large_1080x1080.jpeg"]
+    with Image.open(BytesIO(bucket.blobs["deals/large_1080x1080.jpeg"])) as resized:
+        assert resized.size == (1080, 540)
+    assert (pipeline.stats["resize"].count, pipeline.stats["upload"].count) == (1, 1)
@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from phase_scheduler import PhaseScheduler, RecordChannel
+
+# Seconds a run may take before it is considered hung
+RUN_TIMEOUT = 5
+
+def run_with_timeout(scheduler: PhaseScheduler) -> dict:
+    outcome = {}
+
+    def run() -> None:
+        try:
+            outcome["result"] = scheduler.run()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(RUN_TIMEOUT)
+    assert not thread.is_alive(), "the scheduler hung"
+    return outcome
+
+def test_failed_producer_closes_its_channel():
+    channel = RecordChannel("deals")
+    consumer_started = threading.Event()
+    consumed = []
+
+    def producer() -> None:
+        channel.publish("deal-1")
+        # Fail only once the consumer is already streaming behind this phase
+        consumer_started.wait(RUN_TIMEOUT)
+        raise RuntimeError("deals failed")
+
+    def consumer() -> None:
+        consumer_started.set()
+        records = [{"dealID": "deal-1"}, {"dealID": "deal-2"}]
+        consumed.extend(channel.gate(records, key=lambda record: record["dealID"]))
+
+    scheduler = PhaseScheduler()
+    scheduler.add("deals", producer, channels=[channel])
+    scheduler.add("comments", consumer, streams_from=["deals"])
+    outcome = run_with_timeout(scheduler)
+
+    assert isinstance(outcome.get("error"), RuntimeError)
+    assert [record["dealID"] for record in consumed] == ["deal-1", "deal-2"]
+
+def test_skipped_producer_closes_its_channel():
+    channel = RecordChannel("deals")
+
+    def failing() -> None:
+        raise RuntimeError("profiles failed")
+
+    scheduler = PhaseScheduler()
+    scheduler.add("profiles", failing)
+    scheduler.add("deals", lambda _: None, after=["profiles"], channels=[channel])
+    outcome = run_with_timeout(scheduler)
+
+    assert isinstance(outcome.get("error"), RuntimeError)
+    assert scheduler.phases["deals"].skipped
+    assert channel.wait_for("deal-1") is None
+
+def test_channels_are_closed_when_the_producer_finishes():
+    channel = RecordChannel("deals")
+    scheduler = PhaseScheduler()
+    scheduler.add("deals", lambda: channel.publish("deal-1"), channels=[channel])
+    outcome = run_with_timeout(scheduler)
+
+    assert "error" not in outcome
+    assert channel.wait_for("deal-1") is True
+    assert channel.wait_for("deal-2") is None
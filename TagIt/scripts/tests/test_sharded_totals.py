@@ -0,0 +1,66 @@
+import os
+import urllib.request
+
+import pytest
+
+# Runs against the Firestore emulator only, e.g. `firebase emulators:start --only firestore` and
+# FIRESTORE_EMULATOR_HOST=localhost:8080
+pytestmark = pytest.mark.skipif(not os.environ.get("FIRESTORE_EMULATOR_HOST"),
+                                reason="FIRESTORE_EMULATOR_HOST is not set")
+
+PROJECT = "demo-sharded-totals"
+
+DOCUMENTS = {
+    "UserProfile/alice": {"username": "alice"},
+    "UserProfile/bob": {"username": "bob"},
+    "Deals/deal1": {"userID": "alice"},
+    "Deals/deal2": {"userID": "bob"},
+    "Deals/deal3": {"userID": "alice"},
+    "UserComments/comment1": {"userID": "bob", "itemID": "deal1"},
+    "Votes/bob_deal1_1": {"itemId": "deal1", "itemType": 1, "voteType": "upvote"},
+    "Votes/bob_deal3_1": {"itemId": "deal3", "itemType": 1, "voteType": "downvote"},
+    "Votes/alice_comment1_0": {"itemId": "comment1", "itemType": 0, "voteType": "upvote"},
+    # Subcollections named like the root collections must not be counted by either path
+    "Deals/deal1/Votes/alice_deal2_1": {"itemId": "deal2", "itemType": 1, "voteType": "upvote"},
+    "UserProfile/bob/Deals/draft": {"userID": "bob"},
+    "Deals/deal2/UserComments/reply": {"userID": "alice", "itemID": "deal2"},
+}
+
+@pytest.fixture(scope="module")
+def db():
+    firestore = pytest.importorskip("google.cloud.firestore")
+    host = os.environ["FIRESTORE_EMULATOR_HOST"]
+    request = urllib.request.Request(
+        f"http://{host}/emulator/v1/projects/{PROJECT}/databases/(default)/documents", method="DELETE")
+    urllib.request.urlopen(request).close()
+    client = firestore.Client(project=PROJECT)
+    batch = client.batch()
+    for path, data in DOCUMENTS.items():
+        batch.set(client.document(path), data)
+    batch.commit()
+    return client
+
+@pytest.fixture(scope="module")
+def update(db):
+    # update.py initializes Firebase with a service account key on import; the emulator needs none
+    firebase_admin = pytest.importorskip("firebase_admin")
+    pytest.importorskip("firebase_admin.firestore")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(firebase_admin.credentials, "Certificate", lambda path: None)
+        patch.setattr(firebase_admin, "initialize_app", lambda *args, **kwargs: None)
+        patch.setattr(firebase_admin.firestore, "client", lambda *args, **kwargs: db)
+        import update
+    return update
+
+def test_sharded_totals_match_single_process(db, update):
+    from sharded_totals import aggregate_totals_sharded
+
+    current_totals = update.read_current_totals(db)
+    expected = update.compute_user_profile_totals(db, current_totals)[0]
+    actual = aggregate_totals_sharded(db, list(current_totals), 2, None)
+
+    assert actual == expected
+    assert expected == {
+        "alice": {"totalDeals": 2, "totalComments": 0, "totalUpvotes": 1, "totalDownvotes": 1},
+        "bob": {"totalDeals": 1, "totalComments": 1, "totalUpvotes": 1, "totalDownvotes": 0},
+    }
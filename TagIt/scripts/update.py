@@ -1,13 +1,47 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
+import argparse
+import json
+import os
 import random
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from firestore_batch import READ_CHUNK_SIZE, BatchWriter, chunked
+from sharded_totals import aggregate_totals_sharded, default_workers
+
+SERVICE_ACCOUNT_PATH = "tagit-39035-firebase-adminsdk-hugo8-9c33455468.json"
 
 # Initialize Firebase Admin SDK
-cred = credentials.Certificate("tagit-39035-firebase-adminsdk-hugo8-9c33455468.json")
+cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
 firebase_admin.initialize_app(cred)
 
 db = firestore.client()
 
+# State of the last totals run, used by the incremental mode
+TOTALS_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".totals_state.json")
+
+# Bumped when the state layout changes; a state of another version triggers a full rebuild.
+# Version 2 keeps the item of every vote, [owner, voteType, itemType, itemId].
+TOTALS_STATE_VERSION = 2
+
+# Documents written up to this long before a run started are looked at again by the next one,
+# so server timestamps and slow commits around the watermark are not missed
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+TOTAL_FIELDS = ('totalDeals', 'totalComments', 'totalUpvotes', 'totalDownvotes')
+
+# A count() query is billed one read per 1000 matched index entries (at least one per query),
+# streaming a projection one read per document
+COUNT_ENTRIES_PER_READ = 1000
+
+# Count per user only when that needs this many times fewer reads than streaming userID,
+# since it is one RPC per user
+COUNT_MODE_MIN_SAVING = 4
+
+# Per-user count() queries in flight
+COUNT_WORKERS = 16
+
 def generate_votes_for_specific_deals(deals, all_user_ids):
     print("Generating Votes for specific deals...")
     votes = []
@@ -100,17 +134,84 @@ def populate_votes(votes, db):
             print(f"Error adding Vote: {doc_id}: {e}")
 
 # Your provided function to update UserProfile totals
-def update_user_profile_totals(db):
+def update_user_profile_totals(db, workers=1, count_mode='auto'):
     print("Updating UserProfile totals...")
+    started = datetime.now(timezone.utc)
+    current_totals = read_current_totals(db)
+
+    if workers > 1:
+        user_totals = aggregate_totals_sharded(db, list(current_totals), workers, os.path.abspath(SERVICE_ACCOUNT_PATH))
+        write_changed_totals(db, user_totals, current_totals)
+        # The workers keep no per-vote state, so the incremental mode has to start over
+        if os.path.exists(TOTALS_STATE_PATH):
+            os.remove(TOTALS_STATE_PATH)
+            print("Removed the totals state; the next incremental run will do a full rebuild.")
+        return
+
+    user_totals, deal_owners, comment_owners, vote_state = compute_user_profile_totals(db, current_totals, count_mode)
+    failed = write_changed_totals(db, user_totals, current_totals)
+    if vote_state is None:
+        # Counted collections leave the owner indexes incomplete, so the incremental mode has to start over
+        if os.path.exists(TOTALS_STATE_PATH):
+            os.remove(TOTALS_STATE_PATH)
+            print("Removed the totals state; the next incremental run will do a full rebuild.")
+        return
+    if failed:
+        # Stored totals must match Firestore for the incremental mode; an older state would be applied to the new totals
+        if os.path.exists(TOTALS_STATE_PATH):
+            os.remove(TOTALS_STATE_PATH)
+        print("Some updates failed; the next incremental run will do a full rebuild.")
+        return
 
+    save_totals_state({
+        'version': TOTALS_STATE_VERSION,
+        'watermark': started.isoformat(),
+        'totals': user_totals,
+        'dealOwners': deal_owners,
+        'commentOwners': comment_owners,
+        'votes': vote_state,
+    })
+
+# Keep the stored totals, so only profiles whose totals change are written
+def read_current_totals(db):
+    current_totals = {}
+    users_ref = db.collection('UserProfile')
+    users_docs = users_ref.select(list(TOTAL_FIELDS)).stream()
+    for user_doc in users_docs:
+        user_data = user_doc.to_dict()
+        current_totals[user_doc.id] = {field: user_data.get(field) for field in TOTAL_FIELDS}
+    return current_totals
+
+# Pick count() queries per user or a userID projection for Deals/UserComments, by collection size versus user count.
+# Counting leaves the owners of voted items unknown, so they are read afterwards: one read per distinct voted
+# item, estimated by its upper bound, the smaller of the collection size and its number of votes.
+def choose_count_mode(db, collection, item_type, user_count):
+    size = db.collection(collection).count().get()[0][0].value
+    votes_query = db.collection('Votes').where(filter=firestore.FieldFilter('itemType', '==', item_type))
+    vote_count = votes_query.count().get()[0][0].value
+    count_reads = user_count + (size + vote_count) // COUNT_ENTRIES_PER_READ + min(size, vote_count)
+    use_count = size >= count_reads * COUNT_MODE_MIN_SAVING
+    print(f"{collection}: {size} documents, {vote_count} votes, {user_count} users -> "
+          f"{'count() per user' if use_count else 'userID projection'} (~{count_reads if use_count else size} reads).")
+    return use_count
+
+def count_per_user(db, collection, user_ids):
+    def count(user_id):
+        query = db.collection(collection).where(filter=firestore.FieldFilter('userID', '==', user_id)).count()
+        return user_id, query.get()[0][0].value
+
+    with ThreadPoolExecutor(max_workers=COUNT_WORKERS) as pool:
+        return dict(pool.map(count, user_ids))
+
+# Recompute the totals of every user on one thread.
+# count_mode is 'projection', 'count' or 'auto'; without projections the owners of voted items are read
+# with get_all, and vote_state is None because the owner indexes are incomplete.
+def compute_user_profile_totals(db, current_totals, count_mode='projection'):
     # Initialize a dictionary to store totals for each user
     user_totals = {}
 
     # Initialize totals to zero for all users
-    users_ref = db.collection('UserProfile')
-    users_docs = users_ref.stream()
-    for user_doc in users_docs:
-        user_id = user_doc.id
+    for user_id in current_totals:
         user_totals[user_id] = {
             'totalDeals': 0,
             'totalComments': 0,
@@ -118,58 +219,277 @@ def update_user_profile_totals(db):
             'totalDownvotes': 0
         }
 
-    # Calculate totalDeals for each user
-    deals_ref = db.collection('Deals')
-    deals_docs = deals_ref.stream()
-    for deal_doc in deals_docs:
-        deal_data = deal_doc.to_dict()
-        user_id = deal_data.get('userID')
-        if user_id in user_totals:
-            user_totals[user_id]['totalDeals'] += 1
-
-    # Calculate totalComments for each user
-    comments_ref = db.collection('UserComments')
-    comments_docs = comments_ref.stream()
-    for comment_doc in comments_docs:
-        comment_data = comment_doc.to_dict()
-        user_id = comment_data.get('userID')
-        if user_id in user_totals:
-            user_totals[user_id]['totalComments'] += 1
+    # Owner of every deal and comment, so votes are resolved without reading their items again
+    deal_owners = {}
+    comment_owners = {}
+
+    # Calculate totalDeals and totalComments for each user
+    counted = set()
+    for collection, owners, field, item_type in (('Deals', deal_owners, 'totalDeals', 1), ('UserComments', comment_owners, 'totalComments', 0)):
+        if count_mode == 'count' or (count_mode == 'auto' and choose_count_mode(db, collection, item_type, len(user_totals))):
+            for user_id, count in count_per_user(db, collection, list(user_totals)).items():
+                user_totals[user_id][field] = count
+            counted.add(collection)
+            continue
+        docs = db.collection(collection).select(['userID']).stream()
+        for doc in docs:
+            user_id = doc.to_dict().get('userID')
+            owners[doc.id] = user_id
+            if user_id in user_totals:
+                user_totals[user_id][field] += 1
 
     # Calculate totalUpvotes and totalDownvotes for each user based on Votes
     votes_ref = db.collection('Votes')
-    votes_docs = votes_ref.stream()
+    votes_docs = votes_ref.select(['voteType', 'itemType', 'itemId']).stream()
+    vote_state = {}
+    # Votes on items whose owners were counted instead of streamed, resolved after the pass
+    pending_votes = Counter()
     for vote_doc in votes_docs:
         vote_data = vote_doc.to_dict()
         vote_type = vote_data.get('voteType')
         item_type = vote_data.get('itemType')
         item_id = vote_data.get('itemId')
 
-        # Get the owner of the item (Deal or Comment)
+        if (item_type == 1 and 'Deals' in counted) or (item_type == 0 and 'UserComments' in counted):
+            pending_votes[(item_type, item_id, vote_type)] += 1
+            continue
+
+        # Get the owner of the item (Deal or Comment) from the owner index
         if item_type == 1:  # Deal
-            item_ref = db.collection('Deals').document(item_id)
+            owner_user_id = deal_owners.get(item_id)
         elif item_type == 0:  # Comment
-            item_ref = db.collection('UserComments').document(item_id)
+            owner_user_id = comment_owners.get(item_id)
         else:
             continue  # Skip if itemType is not 'deal' or 'comment'
 
-        item_doc = item_ref.get()
-        if item_doc.exists:
-            item_data = item_doc.to_dict()
-            owner_user_id = item_data.get('userID')
-            if owner_user_id in user_totals:
-                if vote_type == 'upvote':
-                    user_totals[owner_user_id]['totalUpvotes'] += 1
-                elif vote_type == 'downvote':
-                    user_totals[owner_user_id]['totalDownvotes'] += 1
-
-    # Update UserProfile documents with the calculated totals
-    for user_id, totals in user_totals.items():
-        try:
-            users_ref.document(user_id).update(totals)
-            print(f"Updated UserProfile {user_id} with totals {totals}")
-        except Exception as e:
-            print(f"Error updating UserProfile {user_id}: {e}")
+        vote_state[vote_doc.id] = [owner_user_id, vote_type, item_type, item_id]
+        if owner_user_id in user_totals:
+            if vote_type == 'upvote':
+                user_totals[owner_user_id]['totalUpvotes'] += 1
+            elif vote_type == 'downvote':
+                user_totals[owner_user_id]['totalDownvotes'] += 1
+
+    if not counted:
+        return user_totals, deal_owners, comment_owners, vote_state
+
+    # Read the owners of the voted items only
+    for collection, owners, item_type in (('Deals', deal_owners, 1), ('UserComments', comment_owners, 0)):
+        item_ids = sorted({item_id for (vote_item_type, item_id, _) in pending_votes if vote_item_type == item_type and item_id})
+        items_ref = db.collection(collection)
+        for chunk in chunked(item_ids, READ_CHUNK_SIZE):
+            for item_doc in db.get_all([items_ref.document(item_id) for item_id in chunk], field_paths=['userID']):
+                if item_doc.exists:
+                    owners[item_doc.id] = item_doc.to_dict().get('userID')
+    for (item_type, item_id, vote_type), count in pending_votes.items():
+        owner_user_id = (deal_owners if item_type == 1 else comment_owners).get(item_id)
+        if owner_user_id in user_totals:
+            if vote_type == 'upvote':
+                user_totals[owner_user_id]['totalUpvotes'] += count
+            elif vote_type == 'downvote':
+                user_totals[owner_user_id]['totalDownvotes'] += count
+    return user_totals, deal_owners, comment_owners, None
+
+# Update UserProfile documents whose totals changed, in batches
+def write_changed_totals(db, user_totals, current_totals):
+    skipped = 0
+    with BatchWriter(db) as writer:
+        for user_id, totals in user_totals.items():
+            if totals == current_totals[user_id]:
+                skipped += 1
+                continue
+            writer.update('UserProfile', user_id, totals)
+        failed = writer.flush()
+    print(f"Updated {len(user_totals) - skipped - len(failed)} UserProfiles, skipped {skipped} unchanged, {len(failed)} failed.")
+    return failed
+
+# Compare the sharded aggregation with the single-process one without writing anything
+def verify_sharded_totals(db, workers):
+    current_totals = read_current_totals(db)
+    expected = compute_user_profile_totals(db, current_totals)[0]
+    actual = aggregate_totals_sharded(db, list(current_totals), workers, os.path.abspath(SERVICE_ACCOUNT_PATH))
+    mismatches = [user_id for user_id in expected if expected[user_id] != actual.get(user_id)]
+    for user_id in mismatches[:20]:
+        print(f"Mismatch for {user_id}: single-process {expected[user_id]}, sharded {actual.get(user_id)}")
+    if mismatches:
+        print(f"{len(mismatches)} of {len(expected)} users differ between the two paths.")
+        return False
+    print(f"Sharded totals match the single-process totals for all {len(expected)} users.")
+    return True
+
+def load_totals_state():
+    if not os.path.exists(TOTALS_STATE_PATH):
+        return None
+    try:
+        with open(TOTALS_STATE_PATH, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable totals state {TOTALS_STATE_PATH}: {e}")
+        return None
+
+def save_totals_state(state):
+    tmp_path = f"{TOTALS_STATE_PATH}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, TOTALS_STATE_PATH)
+    print(f"Saved totals state ({len(state['votes'])} votes) to {TOTALS_STATE_PATH}")
+
+# Apply only the changes since the last run to the UserProfile totals.
+# Firestore cannot query on update_time, so every run still lists the names of all deals, comments and votes
+# (one billed read per document, like the projections of a full rebuild) and only reads and writes what changed:
+# it saves the writes and the field reads of a full rebuild, not the listing reads.
+def update_user_profile_totals_incremental(db, full=False):
+    state = None if full else load_totals_state()
+    if state is not None and state.get('version') != TOTALS_STATE_VERSION:
+        print(f"Totals state has version {state.get('version')}, expected {TOTALS_STATE_VERSION}.")
+        state = None
+    if state is None:
+        print("No usable totals state found, running a full rebuild.")
+        # The incremental mode needs the complete owner indexes of the projection passes
+        update_user_profile_totals(db, count_mode='projection')
+        return
+
+    print("Updating UserProfile totals incrementally...")
+    started = datetime.now(timezone.utc)
+    since = datetime.fromisoformat(state['watermark']) - WATERMARK_OVERLAP
+    totals = state['totals']
+    deal_owners = state['dealOwners']
+    comment_owners = state['commentOwners']
+    vote_state = state['votes']
+    deltas = {}
+
+    def add_delta(user_id, field, amount):
+        if user_id is None:
+            return
+        user_delta = deltas.setdefault(user_id, dict.fromkeys(TOTAL_FIELDS, 0))
+        user_delta[field] += amount
+
+    # Deals and comments: list their names and update times, read the new or changed ones and diff the
+    # listing against the owner index for deletions. Their dateTime is a business field that can be
+    # backdated (e.g. seeded data), so it cannot tell which ones the last run missed.
+    item_changes = Counter()
+    for collection, owners, field in (('Deals', deal_owners, 'totalDeals'), ('UserComments', comment_owners, 'totalComments')):
+        changed_item_ids = []
+        seen_item_ids = set()
+        for doc in db.collection(collection).select(['__name__']).stream():
+            seen_item_ids.add(doc.id)
+            if doc.id not in owners or doc.update_time > since:
+                changed_item_ids.append(doc.id)
+
+        items_ref = db.collection(collection)
+        for chunk in chunked(changed_item_ids, READ_CHUNK_SIZE):
+            for doc in db.get_all([items_ref.document(item_id) for item_id in chunk], field_paths=['userID']):
+                if not doc.exists:
+                    # Deleted since it was listed
+                    seen_item_ids.discard(doc.id)
+                    continue
+                owner_user_id = doc.to_dict().get('userID')
+                if doc.id not in owners:
+                    item_changes['new'] += 1
+                elif owners[doc.id] != owner_user_id:
+                    add_delta(owners[doc.id], field, -1)
+                    item_changes['reassigned'] += 1
+                else:
+                    continue
+                owners[doc.id] = owner_user_id
+                add_delta(owner_user_id, field, 1)
+
+        for item_id in [item_id for item_id in owners if item_id not in seen_item_ids]:
+            add_delta(owners.pop(item_id), field, -1)
+            item_changes['deleted'] += 1
+
+    # Votes have no timestamp field: list their names and update times only, then read the changed ones
+    changed_ids = []
+    seen_ids = set()
+    for vote_doc in db.collection('Votes').select(['__name__']).stream():
+        seen_ids.add(vote_doc.id)
+        if vote_doc.id not in vote_state or vote_doc.update_time > since:
+            changed_ids.append(vote_doc.id)
+
+    def item_owner(item_type, item_id):
+        if item_type == 1:
+            return deal_owners.get(item_id)
+        return comment_owners.get(item_id)
+
+    def apply_vote(vote, sign):
+        owner_user_id, vote_type = vote[:2]
+        if vote_type == 'upvote':
+            add_delta(owner_user_id, 'totalUpvotes', sign)
+        elif vote_type == 'downvote':
+            add_delta(owner_user_id, 'totalDownvotes', sign)
+
+    votes_ref = db.collection('Votes')
+    for chunk in chunked(changed_ids, READ_CHUNK_SIZE):
+        refs = [votes_ref.document(vote_id) for vote_id in chunk]
+        for vote_doc in db.get_all(refs, field_paths=['voteType', 'itemType', 'itemId']):
+            if not vote_doc.exists:
+                continue
+            vote_data = vote_doc.to_dict()
+            item_type = vote_data.get('itemType')
+            if item_type not in (0, 1):
+                continue
+            item_id = vote_data.get('itemId')
+            vote = [item_owner(item_type, item_id), vote_data.get('voteType'), item_type, item_id]
+            previous = vote_state.get(vote_doc.id)
+            if previous == vote:
+                continue
+            if previous:
+                apply_vote(previous, -1)
+            apply_vote(vote, 1)
+            vote_state[vote_doc.id] = vote
+
+    # Votes that disappeared since the last run
+    deleted_ids = [vote_id for vote_id in vote_state if vote_id not in seen_ids]
+    for vote_id in deleted_ids:
+        apply_vote(vote_state.pop(vote_id), -1)
+
+    # Unchanged votes follow their item: to its new owner, to nobody once it is deleted, or to the owner
+    # of an item that was not known yet
+    moved = 0
+    for vote in vote_state.values():
+        owner_user_id = item_owner(vote[2], vote[3])
+        if owner_user_id != vote[0]:
+            apply_vote(vote, -1)
+            vote[0] = owner_user_id
+            apply_vote(vote, 1)
+            moved += 1
+    print(f"Found {item_changes['new']} new, {item_changes['reassigned']} reassigned and {item_changes['deleted']} "
+          f"deleted deals/comments, {len(changed_ids)} new or changed votes, {len(deleted_ids)} deleted votes "
+          f"and {moved} votes whose item changed owner.")
+
+    # Owners that were not known to the last run must be existing profiles
+    unknown = [user_id for user_id in deltas if user_id not in totals]
+    users_ref = db.collection('UserProfile')
+    for chunk in chunked(unknown, READ_CHUNK_SIZE):
+        refs = [users_ref.document(user_id) for user_id in chunk]
+        for user_doc in db.get_all(refs, field_paths=[]):
+            if user_doc.exists:
+                totals[user_doc.id] = dict.fromkeys(TOTAL_FIELDS, 0)
+
+    # Write the new totals of the affected users only
+    with BatchWriter(db) as writer:
+        updated = 0
+        skipped = 0
+        for user_id, user_delta in deltas.items():
+            if user_id not in totals:
+                continue
+            if not any(user_delta.values()):
+                # e.g. a vote removed and cast again since the last run
+                skipped += 1
+                continue
+            for field, amount in user_delta.items():
+                totals[user_id][field] += amount
+            writer.update('UserProfile', user_id, dict(totals[user_id]))
+            updated += 1
+        failed = writer.flush()
+    print(f"Updated totals of {updated - len(failed)} UserProfiles, skipped {skipped} unchanged, {len(failed)} failed.")
+    if failed:
+        # The stored totals no longer match Firestore for these users; rebuild next time
+        print("Some updates failed; the next run will do a full rebuild.")
+        os.remove(TOTALS_STATE_PATH)
+        return
+
+    state['watermark'] = started.isoformat()
+    save_totals_state(state)
 
 # Main function to generate votes and update totals
 def main():
@@ -203,4 +523,23 @@ def main():
     update_user_profile_totals(db)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Generate votes for deal10/deal11 and update UserProfile totals.")
+    parser.add_argument("--totals", action="store_true", help="Only update the UserProfile totals, incrementally when possible.")
+    parser.add_argument("--full", action="store_true", help="With --totals, rebuild the totals from scratch.")
+    parser.add_argument("--workers", type=int, nargs="?", const=default_workers(), default=1,
+                        help="With --totals, rebuild the totals with this many worker processes (default: one per CPU).")
+    parser.add_argument("--count-mode", choices=["auto", "count", "projection"], default="auto",
+                        help="With --totals --full, count deals/comments with count() per user or a userID projection (default: by collection size).")
+    parser.add_argument("--verify", action="store_true", help="With --workers, only check that both aggregation paths agree.")
+    args = parser.parse_args()
+
+    if args.totals and args.verify:
+        raise SystemExit(0 if verify_sharded_totals(db, max(args.workers, 2)) else 1)
+    elif args.totals and args.workers > 1:
+        update_user_profile_totals(db, workers=args.workers)
+    elif args.totals and args.full:
+        update_user_profile_totals(db, count_mode=args.count_mode)
+    elif args.totals:
+        update_user_profile_totals_incremental(db)
+    else:
+        main()
@@ -0,0 +1,178 @@
+"""
+Ranking Points and Leaderboard Job
+
+Computes every user's ranking points on the server, with the same weights as `RankingWeights` in the
+app (5 points per deal posted, 1 per upvote received, 3 per unique deal commented on), instead of
+the app reading every profile and running one comments query per user on each leaderboard view.
+
+The job makes a single pass over Deals, UserComments and Votes (projecting only the fields it needs),
+then:
+1. Writes `rankingPoints` and `rank` to every UserProfile whose values changed, in batches.
+2. Writes the top-N users to `Leaderboard/top`, so the leaderboard can be shown with one read.
+
+Usage:
+
+    python update_rankings.py [--top 100]
+
+Dependencies:
+- Firebase Admin SDK service account JSON file.
+- Permissions to access Firestore.
+"""
+
+import argparse
+import os
+from collections import defaultdict
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+
+from firestore_batch import BatchWriter
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_ACCOUNT_PATH = os.path.join(SCRIPT_DIR, "tagit-39035-firebase-adminsdk-hugo8-9c33455468.json")
+
+# Initialize Firebase Admin SDK
+cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
+firebase_admin.initialize_app(cred)
+
+# Firestore database reference
+db: firestore.Client = firestore.client()
+
+# Same weights as RankingWeights.defaultWeights in the app
+DEAL_WEIGHT = 5
+UPVOTE_WEIGHT = 1
+COMMENT_WEIGHT = 3
+
+# Leaderboard document read by the app
+LEADERBOARD_COLLECTION = "Leaderboard"
+LEADERBOARD_DOC_ID = "top"
+DEFAULT_TOP_N = 100
+
+# Vote itemType values
+ITEM_TYPE_COMMENT = 0
+ITEM_TYPE_DEAL = 1
+
+def compute_ranking_points(db: firestore.Client) -> tuple[dict[str, int], dict[str, dict]]:
+    """
+    Compute the ranking points of every user in one pass over the collections.
+
+    Args:
+        db (firestore.Client): The Firestore client.
+
+    Returns:
+        tuple[dict[str, int], dict[str, dict]]: The ranking points by user ID, and the profile fields
+            used by the leaderboard and the diff (display name, avatar, points and rank) by user ID.
+    """
+    profiles = {}
+    for doc in db.collection("UserProfile").select(["displayName", "avatarURL", "rankingPoints", "rank"]).stream():
+        profiles[doc.id] = doc.to_dict()
+    print(f"Read {len(profiles)} UserProfiles.")
+
+    deals_posted = defaultdict(int)
+    deal_owners = {}
+    for doc in db.collection("Deals").select(["userID"]).stream():
+        owner = doc.to_dict().get("userID")
+        deal_owners[doc.id] = owner
+        deals_posted[owner] += 1
+    print(f"Read {len(deal_owners)} Deals.")
+
+    # Like CommentService.getUniqueDealsCommentedByUser, only one comment per deal counts
+    commented_deals = defaultdict(set)
+    comment_owners = {}
+    for doc in db.collection("UserComments").select(["userID", "itemID"]).stream():
+        comment = doc.to_dict()
+        owner = comment.get("userID")
+        comment_owners[doc.id] = owner
+        if comment.get("itemID"):
+            commented_deals[owner].add(comment["itemID"])
+    print(f"Read {len(comment_owners)} UserComments.")
+
+    # Upvotes received on the user's deals and comments, like `totalUpvotes`
+    upvotes = defaultdict(int)
+    vote_count = 0
+    for doc in db.collection("Votes").select(["voteType", "itemType", "itemId"]).stream():
+        vote = doc.to_dict()
+        vote_count += 1
+        if vote.get("voteType") != "upvote":
+            continue
+        if vote.get("itemType") == ITEM_TYPE_DEAL:
+            owner = deal_owners.get(vote.get("itemId"))
+        elif vote.get("itemType") == ITEM_TYPE_COMMENT:
+            owner = comment_owners.get(vote.get("itemId"))
+        else:
+            continue
+        upvotes[owner] += 1
+    print(f"Read {vote_count} Votes.")
+
+    points = {
+        user_id: deals_posted[user_id] * DEAL_WEIGHT
+        + upvotes[user_id] * UPVOTE_WEIGHT
+        + len(commented_deals[user_id]) * COMMENT_WEIGHT
+        for user_id in profiles
+    }
+    return points, profiles
+
+def rank_users(points: dict[str, int]) -> list[str]:
+    """
+    Order users by ranking points, highest first; ties are ordered by user ID so ranks are stable.
+
+    Args:
+        points (dict[str, int]): The ranking points by user ID.
+
+    Returns:
+        list[str]: The user IDs, the user at index `i` having rank `i + 1`.
+    """
+    return sorted(points, key=lambda user_id: (-points[user_id], user_id))
+
+def update_rankings(db: firestore.Client, top_n: int = DEFAULT_TOP_N) -> None:
+    """
+    Recompute ranking points, write changed points and ranks, and refresh the leaderboard document.
+
+    Args:
+        db (firestore.Client): The Firestore client.
+        top_n (int): The number of users on the leaderboard.
+    """
+    points, profiles = compute_ranking_points(db)
+    ranking = rank_users(points)
+
+    skipped = 0
+    with BatchWriter(db) as writer:
+        for position, user_id in enumerate(ranking):
+            values = {"rankingPoints": points[user_id], "rank": position + 1}
+            profile = profiles[user_id]
+            if profile.get("rankingPoints") == values["rankingPoints"] and profile.get("rank") == values["rank"]:
+                skipped += 1
+                continue
+            writer.update("UserProfile", user_id, values)
+
+        leaderboard = [
+            {
+                "userId": user_id,
+                "displayName": profiles[user_id].get("displayName", ""),
+                "avatarURL": profiles[user_id].get("avatarURL", ""),
+                "rankingPoints": points[user_id],
+                "rank": position + 1,
+            }
+            for position, user_id in enumerate(ranking[:top_n])
+        ]
+        writer.set(LEADERBOARD_COLLECTION, LEADERBOARD_DOC_ID, {
+            "users": leaderboard,
+            "userCount": len(ranking),
+            "updatedAt": SERVER_TIMESTAMP,
+        })
+        failed = writer.flush()
+
+    failed_profiles = sum(1 for error in failed if error.collection == "UserProfile")
+    print(f"Updated rankings of {len(ranking) - skipped - failed_profiles} UserProfiles, "
+          f"skipped {skipped} unchanged, {failed_profiles} failed.")
+    if len(failed) > failed_profiles:
+        print(f"Error writing {LEADERBOARD_COLLECTION}/{LEADERBOARD_DOC_ID}.")
+    else:
+        print(f"Wrote the top {len(leaderboard)} users to {LEADERBOARD_COLLECTION}/{LEADERBOARD_DOC_ID}.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute ranking points and the leaderboard.")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_N, help="Number of users on the leaderboard.")
+    args = parser.parse_args()
+    update_rankings(db, args.top)
@@ -0,0 +1,452 @@
+"""
+Seed Data Validator
+
+Checks a seed dataset offline, before `set_dummy.py` spends any reads or writes on it. The dataset
+can be a single JSON file shaped like `dummy_data.json` or a directory of per-collection NDJSON files
+(`UserProfile.ndjson`, `Stores.ndjson`, `Deals.ndjson`, `UserComments.ndjson` and optionally
+`Votes.ndjson`), as written by `generate_dataset.py`.
+
+Collections are read once, in dependency order, while hash indexes of the IDs and usernames seen so
+far are built, so every reference is checked with a set lookup in a single linear pass:
+
+- Schema: required fields, field types and unknown fields, following the structure documented at the
+  top of `set_dummy.py`; collection names must be those of `FirestoreCollections.swift`.
+- Values: non-negative vote counts, coordinates in range, known `commentType`, `itemType` and
+  `voteType` values, and `dateTime` being `__SERVER_TIMESTAMP__` or an ISO 8601 string.
+- Uniqueness: document IDs, usernames and vote document IDs (`{userId}_{itemId}_{itemType}`).
+- References: deal and comment `userID` (a username), deal `locationId`, deal `commentIDs`,
+  comment `itemID`, and vote `userId` / `itemId`.
+
+Usage:
+
+    python validate_seed.py                          # validates dummy_data.json
+    python validate_seed.py generated/ --report report.json
+
+The report is JSON: whether the dataset is valid, record counts, error counts by code and the first
+errors with their collection, position (list index or line number), document ID, field and message.
+The exit code is 1 if any error was found.
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Any, Iterable, Iterator, Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+JSON_FILE_PATH = os.path.join(SCRIPT_DIR, "dummy_data.json")
+
+# Collection names used by the app (FirestoreCollections.swift)
+FIRESTORE_COLLECTIONS = {"UserProfile", "Deals", "Votes", "BarcodeItemReview", "ReviewStars", "UserComments", "Stores"}
+
+# Seeded collections, in the order their references depend on each other
+COLLECTION_ORDER = ("UserProfile", "Stores", "Deals", "UserComments", "Votes")
+
+# Number of errors listed in the report; all of them are counted
+MAX_REPORTED_ERRORS = 1000
+
+STRING = (str,)
+INTEGER = (int,)
+NUMBER = (int, float)
+BOOLEAN = (bool,)
+LIST = (list,)
+
+# Field types of every seeded collection, as documented in set_dummy.py. Types are matched exactly,
+# so a boolean is not accepted where an integer is expected.
+SCHEMAS = {
+    "UserProfile": {
+        "id": STRING, "username": STRING, "email": STRING, "displayName": STRING, "avatarURL": STRING,
+        "score": INTEGER, "savedDeals": LIST, "totalUpvotes": INTEGER, "totalDownvotes": INTEGER,
+        "totalDeals": INTEGER, "totalComments": INTEGER, "rankingPoints": INTEGER, "isDummy": BOOLEAN,
+    },
+    "Stores": {
+        "id": STRING, "latitude": NUMBER, "longitude": NUMBER, "name": STRING, "isDummy": BOOLEAN,
+    },
+    "Deals": {
+        "id": STRING, "userID": STRING, "photoURL": STRING, "productText": STRING, "postText": STRING,
+        "price": NUMBER, "location": STRING, "locationId": STRING, "date": STRING, "commentIDs": LIST,
+        "upvote": INTEGER, "downvote": INTEGER, "dateTime": STRING, "isDummy": BOOLEAN,
+    },
+    "UserComments": {
+        "id": STRING, "commentText": STRING, "downvote": INTEGER, "commentType": STRING, "upvote": INTEGER,
+        "date": STRING, "dateTime": STRING, "itemID": STRING, "userID": STRING, "isDummy": BOOLEAN,
+    },
+    "Votes": {
+        "userId": STRING, "itemId": STRING, "itemType": STRING, "voteType": STRING, "isDummy": BOOLEAN,
+    },
+}
+
+# Fields `set_dummy.py` fills in when they are missing
+OPTIONAL_FIELDS = {"Deals": {"date"}}
+
+# Values accepted by the app and by `populate_votes`
+COMMENT_TYPES = {"deal", "barcodeItemReview"}
+VOTE_ITEM_TYPES = {"comment": 0, "deal": 1, "review": 2}
+VOTE_TYPES = {"upvote", "downvote"}
+
+class ValidationReport:
+    """
+    Errors and record counts collected while validating a dataset.
+
+    Args:
+        max_errors (int): The number of errors kept in the report.
+    """
+
+    def __init__(self, max_errors: int = MAX_REPORTED_ERRORS):
+        self.max_errors = max_errors
+        self.records: dict[str, int] = {}
+        self.error_counts: dict[str, int] = {}
+        self.errors: list[dict] = []
+        self.total_errors = 0
+
+    @property
+    def valid(self) -> bool:
+        return self.total_errors == 0
+
+    def add(self, code: str, collection: str, position: int, doc_id: Optional[str], field: Optional[str],
+            message: str) -> None:
+        """
+        Record an error.
+
+        Args:
+            code (str): The kind of error, e.g. `missing_field` or `unknown_reference`.
+            collection (str): The collection of the record.
+            position (int): The list index (JSON) or line number (NDJSON) of the record.
+            doc_id (Optional[str]): The document ID of the record, if known.
+            field (Optional[str]): The offending field, if any.
+            message (str): A description of the error.
+        """
+        self.total_errors += 1
+        self.error_counts[code] = self.error_counts.get(code, 0) + 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({
+                "code": code, "collection": collection, "position": position,
+                "id": doc_id, "field": field, "message": message,
+            })
+
+    def to_dict(self) -> dict:
+        """
+        Get the machine-readable report.
+
+        Returns:
+            dict: The report.
+        """
+        return {
+            "valid": self.valid,
+            "records": self.records,
+            "errorCount": self.total_errors,
+            "errorCounts": self.error_counts,
+            "errors": self.errors,
+            "truncated": self.total_errors > len(self.errors),
+        }
+
+    def print_summary(self, limit: int = 10) -> None:
+        """
+        Print the record counts and the first errors.
+
+        Args:
+            limit (int): The number of errors to print.
+        """
+        counts = ", ".join(f"{count} {collection}" for collection, count in self.records.items())
+        print(f"Validated {counts}: {self.total_errors} errors.")
+        for code, count in sorted(self.error_counts.items()):
+            print(f"  {code}: {count}")
+        for error in self.errors[:limit]:
+            print(f"  {error['collection']}[{error['position']}] {error['id']}: {error['message']}")
+
+def stream_ndjson_records(file_path: str) -> Iterator[tuple[int, Any]]:
+    """
+    Stream the records of an NDJSON file; unparsable lines are yielded as None.
+
+    Args:
+        file_path (str): The path to the NDJSON file.
+
+    Returns:
+        Iterator[tuple[int, Any]]: The line number and parsed record of every non-blank line.
+    """
+    with open(file_path, "r") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except ValueError:
+                yield line_no, None
+
+def enumerate_records(records: Iterable[Any]) -> Iterator[tuple[int, Any]]:
+    """
+    Pair the records of a JSON collection with their list index, lazily.
+
+    Args:
+        records (Iterable[Any]): The records.
+
+    Returns:
+        Iterator[tuple[int, Any]]: The list index and record of every record.
+    """
+    yield from enumerate(records)
+
+def open_seed(path: str) -> Any:
+    """
+    Open a JSON seed file or a directory of NDJSON files.
+
+    Args:
+        path (str): The JSON file or NDJSON directory.
+
+    Returns:
+        Any: The records of every collection found with their position (list index or line
+            number), or the parsed JSON if it is not an object.
+    """
+    if os.path.isdir(path):
+        collections = {}
+        for file_name in sorted(os.listdir(path)):
+            if file_name.endswith(".ndjson"):
+                collections[file_name[:-len(".ndjson")]] = stream_ndjson_records(os.path.join(path, file_name))
+        return collections
+    with open(path, "r") as f:
+        data = json.load(f)
+    if type(data) is not dict:
+        return data
+    return {name: enumerate_records(records) for name, records in data.items()}
+
+class SeedValidator:
+    """
+    Single-pass schema and referential integrity checker for seed datasets.
+
+    Args:
+        max_errors (int): The number of errors kept in the report.
+    """
+
+    def __init__(self, max_errors: int = MAX_REPORTED_ERRORS):
+        self.report = ValidationReport(max_errors)
+        self.user_ids: set[str] = set()
+        self.usernames: set[str] = set()
+        self.store_ids: set[str] = set()
+        self.deal_ids: set[str] = set()
+        self.comment_ids: set[str] = set()
+        self.vote_ids: set[str] = set()
+        # Comment IDs listed by deals, checked once every comment has been seen
+        self.listed_comments: dict[str, str] = {}
+
+    def validate(self, collections: dict[str, Iterable[tuple[int, Any]]]) -> ValidationReport:
+        """
+        Validate every collection of a dataset.
+
+        Args:
+            collections (dict[str, Iterable[tuple[int, Any]]]): The records of every collection with
+                their position reported in errors, e.g. list index or line number.
+
+        Returns:
+            ValidationReport: The errors found.
+        """
+        for name in collections:
+            if name not in COLLECTION_ORDER:
+                known = "a FirestoreCollections name" if name in FIRESTORE_COLLECTIONS else "not a FirestoreCollections name"
+                self.report.add("unknown_collection", name, 0, None, None,
+                                f"Collection {name} is not seeded ({known}).")
+        for name in ("UserProfile", "Stores", "Deals", "UserComments"):
+            if name not in collections:
+                self.report.add("missing_collection", name, 0, None, None, f"Collection {name} is missing.")
+
+        checks = {
+            "UserProfile": self._check_user_profile,
+            "Stores": self._check_store,
+            "Deals": self._check_deal,
+            "UserComments": self._check_comment,
+            "Votes": self._check_vote,
+        }
+        for name in COLLECTION_ORDER:
+            if name not in collections:
+                continue
+            schema = SCHEMAS[name]
+            check = checks[name]
+            count = 0
+            for position, record in collections[name]:
+                count += 1
+                if type(record) is not dict:
+                    self.report.add("invalid_record", name, position, None, None, "Record is not a JSON object.")
+                    continue
+                valid = self._check_schema(name, schema, record, position)
+                # IDs are indexed even for broken records, so one bad record doesn't cascade
+                self._register(name, record, position)
+                if valid:
+                    check(record, position)
+            self.report.records[name] = count
+            if name == "UserComments":
+                self._check_listed_comments()
+        if "UserComments" not in collections:
+            self._check_listed_comments()
+        return self.report
+
+    def _check_schema(self, collection: str, schema: dict[str, tuple], record: dict, position: int) -> bool:
+        # Returns False if the record is too broken for the reference checks
+        doc_id = record.get("id")
+        valid = True
+        optional = OPTIONAL_FIELDS.get(collection, ())
+        for field, types in schema.items():
+            value = record.get(field)
+            if value is None and field in optional:
+                continue
+            if value is None:
+                self.report.add("missing_field", collection, position, doc_id, field, f"Missing field {field}.")
+                valid = False
+            elif type(value) not in types:
+                expected = " or ".join(t.__name__ for t in types)
+                self.report.add("wrong_type", collection, position, doc_id, field,
+                                f"Field {field} is {type(value).__name__}, expected {expected}.")
+                valid = False
+        for field in record.keys() - schema.keys():
+            self.report.add("unknown_field", collection, position, doc_id, field, f"Unknown field {field}.")
+        return valid
+
+    def _register(self, collection: str, record: dict, position: int) -> None:
+        ids = {
+            "UserProfile": self.user_ids,
+            "Stores": self.store_ids,
+            "Deals": self.deal_ids,
+            "UserComments": self.comment_ids,
+        }.get(collection)
+        if ids is not None and type(record.get("id")) is str:
+            self._unique(ids, record["id"], collection, position, "id")
+        if collection == "UserProfile" and type(record.get("username")) is str:
+            self._unique(self.usernames, record["username"], collection, position, "username")
+
+    def _unique(self, ids: set[str], value: str, collection: str, position: int, field: str) -> None:
+        if value in ids:
+            self.report.add("duplicate_id", collection, position, value, field, f"Duplicate {field} {value}.")
+        ids.add(value)
+
+    def _check_counts(self, collection: str, record: dict, position: int) -> None:
+        for field in ("upvote", "downvote"):
+            if record[field] < 0:
+                self.report.add("invalid_value", collection, position, record["id"], field, f"Negative {field} count.")
+
+    def _check_date_time(self, collection: str, record: dict, position: int) -> None:
+        value = record["dateTime"]
+        if value == "__SERVER_TIMESTAMP__":
+            return
+        try:
+            datetime.fromisoformat(value)
+        except ValueError:
+            self.report.add("invalid_value", collection, position, record["id"], "dateTime",
+                            f"dateTime {value!r} is neither __SERVER_TIMESTAMP__ nor an ISO 8601 timestamp.")
+
+    def _check_user(self, collection: str, record: dict, position: int) -> None:
+        # Deals and comments reference their author by username, resolved to an ID when populating
+        if record["userID"] not in self.usernames:
+            self.report.add("unknown_reference", collection, position, record["id"], "userID",
+                            f"No UserProfile with username {record['userID']}.")
+
+    def _check_user_profile(self, record: dict, position: int) -> None:
+        if "@" not in record["email"]:
+            self.report.add("invalid_value", "UserProfile", position, record["id"], "email",
+                            f"Invalid email {record['email']}.")
+
+    def _check_store(self, record: dict, position: int) -> None:
+        if not -90 <= record["latitude"] <= 90:
+            self.report.add("invalid_value", "Stores", position, record["id"], "latitude", "Latitude out of range.")
+        if not -180 <= record["longitude"] <= 180:
+            self.report.add("invalid_value", "Stores", position, record["id"], "longitude", "Longitude out of range.")
+
+    def _check_deal(self, record: dict, position: int) -> None:
+        doc_id = record["id"]
+        self._check_user("Deals", record, position)
+        if record["locationId"] not in self.store_ids:
+            self.report.add("unknown_reference", "Deals", position, doc_id, "locationId",
+                            f"No Store with ID {record['locationId']}.")
+        self._check_counts("Deals", record, position)
+        self._check_date_time("Deals", record, position)
+        for comment_id in record["commentIDs"]:
+            if type(comment_id) is not str:
+                self.report.add("wrong_type", "Deals", position, doc_id, "commentIDs",
+                                f"Entry of commentIDs is {type(comment_id).__name__}, expected str.")
+                continue
+            self.listed_comments[comment_id] = doc_id
+
+    def _check_comment(self, record: dict, position: int) -> None:
+        doc_id = record["id"]
+        self._check_user("UserComments", record, position)
+        if record["commentType"] not in COMMENT_TYPES:
+            self.report.add("invalid_value", "UserComments", position, doc_id, "commentType",
+                            f"Unknown commentType {record['commentType']}.")
+        if record["commentType"] == "deal" and record["itemID"] not in self.deal_ids:
+            self.report.add("unknown_reference", "UserComments", position, doc_id, "itemID",
+                            f"No Deal with ID {record['itemID']}.")
+        self._check_counts("UserComments", record, position)
+        self._check_date_time("UserComments", record, position)
+        self.listed_comments.pop(doc_id, None)
+
+    def _check_listed_comments(self) -> None:
+        for comment_id, deal_id in self.listed_comments.items():
+            self.report.add("unknown_reference", "Deals", 0, deal_id, "commentIDs",
+                            f"Listed comment {comment_id} does not exist.")
+        self.listed_comments.clear()
+
+    def _check_vote(self, record: dict, position: int) -> None:
+        item_type = VOTE_ITEM_TYPES.get(record["itemType"])
+        doc_id = f"{record['userId']}_{record['itemId']}_{item_type}"
+        if item_type is None:
+            self.report.add("invalid_value", "Votes", position, doc_id, "itemType",
+                            f"Unknown itemType {record['itemType']}.")
+        if record["voteType"] not in VOTE_TYPES:
+            self.report.add("invalid_value", "Votes", position, doc_id, "voteType",
+                            f"Unknown voteType {record['voteType']}.")
+        if record["userId"] not in self.user_ids:
+            self.report.add("unknown_reference", "Votes", position, doc_id, "userId",
+                            f"No UserProfile with ID {record['userId']}.")
+        # Reviews are not part of the seed data, so only deal and comment votes can be resolved
+        items = {0: self.comment_ids, 1: self.deal_ids}.get(item_type)
+        if items is not None and record["itemId"] not in items:
+            self.report.add("unknown_reference", "Votes", position, doc_id, "itemId",
+                            f"No {record['itemType']} with ID {record['itemId']}.")
+        self._unique(self.vote_ids, doc_id, "Votes", position, "vote ID")
+
+def validate_seed(path: str, max_errors: int = MAX_REPORTED_ERRORS) -> ValidationReport:
+    """
+    Validate a JSON seed file or a directory of NDJSON files.
+
+    Args:
+        path (str): The JSON file or NDJSON directory.
+        max_errors (int): The number of errors kept in the report.
+
+    Returns:
+        ValidationReport: The errors found.
+    """
+    report = ValidationReport(max_errors)
+    try:
+        collections = open_seed(path)
+    except (OSError, ValueError) as e:
+        report.add("unreadable", os.path.basename(path), 0, None, None, f"Cannot read {path}: {e}")
+        return report
+    if type(collections) is not dict:
+        report.add("invalid_record", os.path.basename(path), 0, None, None, "Seed file is not a JSON object.")
+        return report
+    return SeedValidator(max_errors).validate(collections)
+
+def write_report(report: ValidationReport, report_path: str) -> None:
+    """
+    Write the machine-readable report to a JSON file.
+
+    Args:
+        report (ValidationReport): The validation report.
+        report_path (str): The path of the report file.
+    """
+    with open(report_path, "w") as f:
+        json.dump(report.to_dict(), f, indent=4)
+    print(f"Validation report written to {report_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate seed data before writing it to Firestore.")
+    parser.add_argument("path", nargs="?", default=JSON_FILE_PATH, help="JSON seed file or NDJSON directory.")
+    parser.add_argument("--report", help="Write the JSON report to this file instead of stdout.")
+    parser.add_argument("--max-errors", type=int, default=MAX_REPORTED_ERRORS, help="Number of errors listed in the report.")
+    args = parser.parse_args()
+
+    report = validate_seed(args.path, args.max_errors)
+    if args.report:
+        report.print_summary()
+        write_report(report, args.report)
+    else:
+        json.dump(report.to_dict(), sys.stdout, indent=4)
+        print()
+    sys.exit(0 if report.valid else 1)
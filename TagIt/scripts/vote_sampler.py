@@ -0,0 +1,184 @@
+"""
+Vectorized Vote Sampler
+
+Draws the voters for every deal and comment in one NumPy pass, used by `set_dummy.py` to turn the
+`upvote`/`downvote` counts of the seed data into individual `Votes` documents.
+
+For every item, `upvotes + downvotes` distinct users are drawn, never including the item's owner.
+Users are referenced by their index in the user list, so nothing is copied or shuffled per item, and
+the result is kept as compact integer arrays until the votes are written.
+
+Running this file directly benchmarks the sampler at increasing scales:
+
+    python vote_sampler.py
+
+Dependencies:
+- NumPy (`pip install numpy`).
+"""
+
+import time
+from typing import Iterator, Optional
+
+import numpy as np
+
+# Items asking for more than this share of the available users are sampled one by one;
+# rejection sampling is only efficient while duplicates are unlikely
+DENSE_ITEM_RATIO = 0.5
+
+def sample_voters(owner_index: np.ndarray, upvotes: np.ndarray, downvotes: np.ndarray, n_users: int,
+                  rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Draw distinct voters for every item, excluding the item's owner.
+
+    Args:
+        owner_index (np.ndarray): The user index of each item's owner, or -1 if the owner is not a known user.
+        upvotes (np.ndarray): The number of upvotes requested for each item.
+        downvotes (np.ndarray): The number of downvotes requested for each item.
+        n_users (int): The number of users voters are drawn from.
+        rng (np.random.Generator): The random generator.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: The item index, user index and upvote flag
+            of every vote, and the indexes of the items whose counts had to be reduced.
+    """
+    owner_index = np.asarray(owner_index, dtype=np.int64)
+    upvotes = np.maximum(np.asarray(upvotes, dtype=np.int64), 0)
+    downvotes = np.maximum(np.asarray(downvotes, dtype=np.int64), 0)
+
+    # Clip items that ask for more votes than there are eligible users
+    available = n_users - (owner_index >= 0)
+    totals = upvotes + downvotes
+    clipped = np.flatnonzero(totals > available)
+    totals = np.minimum(totals, available)
+    upvotes = np.minimum(upvotes, totals)
+
+    n_votes = int(totals.sum())
+    starts = np.concatenate(([0], np.cumsum(totals)[:-1]))
+    item_of = np.repeat(np.arange(len(totals), dtype=np.int64), totals)
+    draws = np.empty(n_votes, dtype=np.int64)
+
+    # Sparse items: draw with replacement, then redraw duplicates until every voter is distinct
+    dense = totals > available * DENSE_ITEM_RATIO
+    sparse_votes = ~dense[item_of]
+    pending = np.flatnonzero(sparse_votes)
+    draws[pending] = rng.integers(0, available[item_of[pending]])
+    while pending.size:
+        positions = np.flatnonzero(sparse_votes)
+        keys = item_of[positions] * n_users + draws[positions]
+        order = np.argsort(keys, kind="stable")
+        duplicate = np.zeros(positions.size, dtype=bool)
+        duplicate[order[1:]] = keys[order[1:]] == keys[order[:-1]]
+        pending = positions[duplicate]
+        if pending.size:
+            draws[pending] = rng.integers(0, available[item_of[pending]])
+
+    # Dense items: a permutation of the eligible users is cheaper than many rejections
+    for item in np.flatnonzero(dense & (totals > 0)):
+        start = starts[item]
+        draws[start:start + totals[item]] = rng.choice(available[item], totals[item], replace=False)
+
+    # Draws index the eligible users; shift past the owner to get real user indexes
+    owners = owner_index[item_of]
+    user_of = draws + ((owners >= 0) & (draws >= owners))
+
+    # Draws are random, so the first `upvotes` slots of an item can simply be the upvotes
+    position_in_item = np.arange(n_votes, dtype=np.int64) - starts[item_of]
+    is_upvote = position_in_item < upvotes[item_of]
+    return item_of.astype(np.int32), user_of.astype(np.int32), is_upvote, clipped
+
+class SampledVotes:
+    """
+    Compact, integer-indexed set of generated votes.
+
+    Iterating yields one vote dictionary at a time in the format expected by `populate_generated_votes`.
+
+    Args:
+        user_ids (list[str]): The user IDs referenced by `user_index`.
+        item_ids (list[str]): The item IDs referenced by `item_index`.
+        item_types (list[str]): The item type (`"deal"` or `"comment"`) of every item.
+        item_index (np.ndarray): The item of every vote.
+        user_index (np.ndarray): The voter of every vote.
+        is_upvote (np.ndarray): Whether every vote is an upvote.
+    """
+
+    def __init__(self, user_ids: list[str], item_ids: list[str], item_types: list[str],
+                 item_index: np.ndarray, user_index: np.ndarray, is_upvote: np.ndarray):
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.item_types = item_types
+        self.item_index = item_index
+        self.user_index = user_index
+        self.is_upvote = is_upvote
+
+    def __len__(self) -> int:
+        return len(self.item_index)
+
+    def __iter__(self) -> Iterator[dict]:
+        for item, user, upvote in zip(self.item_index.tolist(), self.user_index.tolist(), self.is_upvote.tolist()):
+            yield {
+                "userId": self.user_ids[user],
+                "itemId": self.item_ids[item],
+                "itemType": self.item_types[item],
+                "voteType": "upvote" if upvote else "downvote",
+                "isDummy": True
+            }
+
+def sample_votes(items: list[tuple[str, str, int, int, str]], all_user_ids: list[str],
+                 seed: Optional[int] = None) -> SampledVotes:
+    """
+    Generate votes for items from their upvote/downvote counts.
+
+    Args:
+        items (list[tuple[str, str, int, int, str]]): The item ID, item type, upvote count, downvote count
+            and owner user ID of every item.
+        all_user_ids (list[str]): The IDs of the users who can vote.
+        seed (Optional[int]): The random seed, for reproducible output.
+
+    Returns:
+        SampledVotes: The generated votes.
+    """
+    user_position = {uid: index for index, uid in enumerate(all_user_ids)}
+    item_ids = [item[0] for item in items]
+    item_types = [item[1] for item in items]
+    upvotes = np.fromiter((item[2] for item in items), dtype=np.int64, count=len(items))
+    downvotes = np.fromiter((item[3] for item in items), dtype=np.int64, count=len(items))
+    owners = np.fromiter((user_position.get(item[4], -1) for item in items), dtype=np.int64, count=len(items))
+
+    item_index, user_index, is_upvote, clipped = sample_voters(
+        owners, upvotes, downvotes, len(all_user_ids), np.random.default_rng(seed)
+    )
+    for item in clipped.tolist():
+        print(f"Warning: Not enough unique users to generate votes for {item_types[item]} {item_ids[item]}.")
+    return SampledVotes(all_user_ids, item_ids, item_types, item_index, user_index, is_upvote)
+
+def benchmark(scales: list[tuple[int, int]] = [(1_000, 500), (10_000, 5_000), (100_000, 50_000), (1_000_000, 200_000)],
+              mean_votes: float = 20.0, seed: int = 0) -> None:
+    """
+    Time the sampler at increasing numbers of users and items and check its guarantees.
+
+    Vote counts per item are drawn from a geometric distribution, so a few items are very popular.
+
+    Args:
+        scales (list[tuple[int, int]]): The (users, items) pairs to benchmark.
+        mean_votes (float): The mean number of votes per item.
+        seed (int): The random seed.
+    """
+    rng = np.random.default_rng(seed)
+    print(f"{'users':>10} {'items':>10} {'votes':>12} {'seconds':>9} {'votes/s':>12}")
+    for n_users, n_items in scales:
+        owners = rng.integers(0, n_users, n_items)
+        totals = np.minimum(rng.geometric(1 / mean_votes, n_items), n_users - 1)
+        upvotes = rng.binomial(totals, 0.8)
+        downvotes = totals - upvotes
+
+        started = time.perf_counter()
+        item_index, user_index, _, _ = sample_voters(owners, upvotes, downvotes, n_users, rng)
+        elapsed = time.perf_counter() - started
+
+        keys = item_index.astype(np.int64) * n_users + user_index
+        assert np.unique(keys).size == keys.size, "duplicate voter on an item"
+        assert not np.any(user_index == owners[item_index]), "owner voted on their own item"
+        print(f"{n_users:>10} {n_items:>10} {len(item_index):>12} {elapsed:>9.3f} {len(item_index) / elapsed:>12.0f}")
+
+if __name__ == "__main__":
+    benchmark()